@@ -27,6 +27,8 @@ DEFAULT_PROFILE = {
 
 AUTO_STATUS = "auto"
 MANUAL_STATUS = "manual"
+# El CSV se lee en streaming; los inserts se agrupan en lotes de executemany.
+IMPORT_BATCH_SIZE = 1000
 
 
 def _normalize_date(value: str) -> str:
@@ -50,6 +52,23 @@ def compute_tx_hash(row: Dict[str, Any], tenant: str) -> str:
     return hashlib.sha256(raw).hexdigest()
 
 
+def _insert_bank_rows(conn: sqlite3.Connection, batch: List[Tuple[Any, ...]]) -> int:
+    if batch:
+        conn.executemany(
+            """
+            INSERT OR REPLACE INTO bank_tx(
+                tx_id, tenant, date, amount, currency, description, account_id, direction, raw, matched_doc_id, tx_hash
+            )
+            VALUES(
+                ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
+                COALESCE((SELECT matched_doc_id FROM bank_tx WHERE tx_id = ?), NULL)
+            )
+            """,
+            batch,
+        )
+    return len(batch)
+
+
 def import_bank_csv(
     csv_path: Path,
     tenant: str,
@@ -64,6 +83,7 @@ def import_bank_csv(
     direction_column = profile.get("direction")
     positive_sign = (profile.get("positive_sign") or positive_sign or "credit").lower()
 
+    batch: List[Tuple[Any, ...]] = []
     with csv_path.open("r", encoding="utf-8-sig") as fh, utils.get_connection() as conn:
         reader = csv.DictReader(fh)
         for row in reader:
@@ -92,16 +112,7 @@ def import_bank_csv(
                 else:
                     direction = "DEBIT" if is_positive else "CREDIT"
 
-            conn.execute(
-                """
-                INSERT OR REPLACE INTO bank_tx(
-                    tx_id, tenant, date, amount, currency, description, account_id, direction, raw, matched_doc_id, tx_hash
-                )
-                VALUES(
-                    ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
-                    COALESCE((SELECT matched_doc_id FROM bank_tx WHERE tx_id = ?), NULL)
-                )
-                """,
+            batch.append(
                 (
                     tx_id,
                     tenant,
@@ -114,9 +125,12 @@ def import_bank_csv(
                     json.dumps(row, ensure_ascii=False),
                     tx_id,
                     tx_hash,
-                ),
+                )
             )
-            inserted += 1
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                inserted += _insert_bank_rows(conn, batch)
+                batch = []
+        inserted += _insert_bank_rows(conn, batch)
     return inserted
 
 
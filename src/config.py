@@ -52,6 +52,7 @@ class Settings(BaseSettings):
     azure_ocr_read_timeout_sec: int = Field(default=120, alias="AZURE_OCR_READ_TIMEOUT_SEC")
     azure_ocr_cache_dir: str = Field(default=str(BASE_DIR / "OUT" / "ocr_cache"), alias="AZURE_OCR_CACHE_DIR")
     azure_ocr_enable_cache: bool = Field(default=True, alias="AZURE_OCR_ENABLE_CACHE")
+    azure_probe_ttl_sec: int = Field(default=600, alias="AZURE_PROBE_TTL_SEC")
 
     gcp_credentials: Optional[str] = Field(alias="GOOGLE_APPLICATION_CREDENTIALS", default=None)
     gcp_project_id: Optional[str] = Field(alias="GCP_PROJECT_ID", default=None)
@@ -69,7 +70,19 @@ class Settings(BaseSettings):
     llm_provider_type: Literal["dummy", "openai"] = Field(default="dummy", alias="LLM_PROVIDER_TYPE")
     llm_strategy: Literal["mini_only", "dual_cascade"] = Field(default="mini_only", alias="LLM_STRATEGY")
     llm_premium_threshold_gross: float = Field(default=1000.0, alias="LLM_PREMIUM_THRESHOLD_GROSS")
+    # dual_cascade: lanza mini y premium a la vez cuando la escalada es casi segura.
+    llm_speculative_escalation: bool = Field(default=False, alias="LLM_SPECULATIVE_ESCALATION")
+    # Peticiones en vuelo a la vez en propose_mapping_batch (cliente async).
+    openai_batch_concurrency: int = Field(default=20, alias="OPENAI_BATCH_CONCURRENCY")
+    # Caché en memoria de respuestas por payload de factura (0 la desactiva).
+    openai_response_cache_size: int = Field(default=10_000, alias="OPENAI_RESPONSE_CACHE_SIZE")
+    openai_response_cache_ttl_sec: float = Field(default=3600.0, alias="OPENAI_RESPONSE_CACHE_TTL_SEC")
+    # Días que se conservan las respuestas en la BD (tabla llm_response_cache); 0 la desactiva.
+    openai_response_cache_persist_days: float = Field(default=30.0, alias="OPENAI_RESPONSE_CACHE_PERSIST_DAYS")
+    # Coseno mínimo para reutilizar la respuesta de una factura parecida (0 = desactivada).
+    openai_semantic_cache_threshold: float = Field(default=0.0, alias="OPENAI_SEMANTIC_CACHE_THRESHOLD")
     debug_llm: bool = Field(default=False, alias="DEBUG_LLM")
+    debug_llm_pretty: bool = Field(default=False, alias="DEBUG_LLM_PRETTY")
     llm_debug_redact_pii: bool = Field(default=True, alias="LLM_DEBUG_REDACT_PII")
     confidence_min_ok: float = Field(default=0.8, alias="CONFIDENCE_MIN_OK")
     watch_batch_size: int = Field(default=50, alias="WATCH_BATCH_SIZE")
@@ -127,6 +140,7 @@ class Settings(BaseSettings):
     alert_webhook_format: str = Field(default="slack", alias="ALERT_WEBHOOK_FORMAT")
     prometheus_target: str = Field(default="http://localhost:8000/metrics", alias="PROMETHEUS_TARGET")
     out_retention_days: int = Field(default=30, alias="OUT_RETENTION_DAYS")
+    readiness_cache_ttl: float = Field(default=2.0, alias="READINESS_CACHE_TTL")
 
     @model_validator(mode="after")
     def apply_profile_defaults(self) -> "Settings":
@@ -298,12 +312,22 @@ def _build_llm_provider() -> LLMProvider:
                     model_premium=premium_model,
                     threshold_gross=settings.llm_premium_threshold_gross,
                     pricing=pricing,
+                    cache_size=settings.openai_response_cache_size,
+                    cache_ttl=settings.openai_response_cache_ttl_sec,
+                    semantic_threshold=settings.openai_semantic_cache_threshold,
+                    persist_ttl=settings.openai_response_cache_persist_days * 86400,
+                    speculative_escalation=settings.llm_speculative_escalation,
                 )
             return OpenAILLMProvider(
                 settings.openai_api_key,
                 mini_model,
                 settings.openai_api_base,
                 pricing={"mini": pricing["mini"]},
+                batch_concurrency=settings.openai_batch_concurrency,
+                cache_size=settings.openai_response_cache_size,
+                cache_ttl=settings.openai_response_cache_ttl_sec,
+                semantic_threshold=settings.openai_semantic_cache_threshold,
+                persist_ttl=settings.openai_response_cache_persist_days * 86400,
             )
         except RuntimeError as exc:
             logger.warning("Falling back to DummyLLMProvider: %s", exc)
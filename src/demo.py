@@ -12,7 +12,7 @@ GOLDEN_DIR = Path(__file__).resolve().parents[1] / "tests" / "golden"
 
 def _reset_state() -> None:
     with utils.get_connection() as conn:
-        for table in ("docs", "review_queue", "audit", "dedupe"):
+        for table in ("docs", "review_queue", "queue_issues", "audit", "dedupe"):
             conn.execute(f"DELETE FROM {table}")
     # Opcional: limpiar outputs antiguos para que la demo sea más clara
     for sub in ("json", "csv"):
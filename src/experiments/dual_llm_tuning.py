@@ -15,6 +15,7 @@ logger = logging.getLogger(__name__)
 SUGGESTION_FILENAME = "LLM_TUNING_SUGGESTIONS.txt"
 TARGET_MIN_RATIO = 0.05
 TARGET_MAX_RATIO = 0.30
+DOC_IDS_CHUNK_SIZE = 500
 
 
 def _validate_dual_setup() -> None:
@@ -53,18 +54,23 @@ def _fetch_doc_rows(doc_ids: Iterable[str]) -> List[Dict[str, Any]]:
     doc_ids = list(doc_ids)
     if not doc_ids:
         return []
-    placeholders = ",".join("?" for _ in doc_ids)
+    rows: List[Dict[str, Any]] = []
     with utils.get_connection() as conn:
-        rows = conn.execute(
-            f"""
-            SELECT doc_id, filename, tenant, status, issues,
-                   llm_provider, llm_model_used, ocr_provider
-            FROM docs
-            WHERE doc_id IN ({placeholders})
-            """,
-            doc_ids,
-        ).fetchall()
-    return [dict(row) for row in rows]
+        # Troceamos el IN para no superar el límite de parámetros de SQLite (999 en builds antiguos).
+        for start in range(0, len(doc_ids), DOC_IDS_CHUNK_SIZE):
+            chunk = doc_ids[start : start + DOC_IDS_CHUNK_SIZE]
+            placeholders = ",".join("?" for _ in chunk)
+            cur = conn.execute(
+                f"""
+                SELECT doc_id, filename, tenant, status, issues,
+                       llm_provider, llm_model_used, ocr_provider
+                FROM docs
+                WHERE doc_id IN ({placeholders})
+                """,
+                chunk,
+            )
+            rows.extend(dict(row) for row in cur)
+    return rows
 
 
 def _read_gross(doc_id: str) -> float | None:
@@ -91,9 +97,9 @@ def _collect_doc_stats(doc_ids: List[str]) -> Dict[str, Any]:
     premium_gross: List[float] = []
     for row in rows:
         model = (row.get("llm_model_used") or "unknown").lower()
-        llm_counts.update([model])
+        llm_counts[model] += 1
         status = (row.get("status") or "UNKNOWN").upper()
-        status_counts.update([status])
+        status_counts[status] += 1
         gross_value = _read_gross(row["doc_id"])
         if gross_value is None:
             continue
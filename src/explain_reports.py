@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 import logging
-from typing import Dict, Optional
+from typing import Dict, Iterator, List, Optional, Tuple
 
 from . import llm_router
 
@@ -28,25 +28,31 @@ def _serialize_pnl(report: Dict) -> str:
 
 
 def _serialize_vat(report: Dict) -> str:
-    soportado = report.get("soportado", {})
-    repercutido = report.get("repercutido", {})
-    total_soportado = sum(bucket["vat"] for bucket in soportado.values())
-    total_repercutido = sum(bucket["vat"] for bucket in repercutido.values())
+    total_soportado, soportado_lines = _vat_breakdown(report.get("soportado", {}))
+    total_repercutido, repercutido_lines = _vat_breakdown(report.get("repercutido", {}))
     lines = [
         f"IVA soportado total: {_fmt(total_soportado)}",
         f"IVA repercutido total: {_fmt(total_repercutido)}",
         f"Saldo (repercutido - soportado): {_fmt(total_repercutido - total_soportado)}",
         "",
         "Desglose soportado:",
+        *soportado_lines,
+        "Desglose repercutido:",
+        *repercutido_lines,
     ]
-    for key, bucket in sorted(soportado.items()):
-        lines.append(f"- {key}: base {_fmt(bucket['base'])}, IVA {_fmt(bucket['vat'])}")
-    lines.append("Desglose repercutido:")
-    for key, bucket in sorted(repercutido.items()):
-        lines.append(f"- {key}: base {_fmt(bucket['base'])}, IVA {_fmt(bucket['vat'])}")
     return "\n".join(lines)
 
 
+def _vat_breakdown(buckets: Dict) -> Tuple[float, List[str]]:
+    """Suma el IVA y formatea el desglose en una única pasada ordenada."""
+    total = 0.0
+    lines: List[str] = []
+    for key, bucket in sorted(buckets.items()):
+        total += bucket["vat"]
+        lines.append(f"- {key}: base {_fmt(bucket['base'])}, IVA {_fmt(bucket['vat'])}")
+    return total, lines
+
+
 def _serialize_cashflow(report: Dict) -> str:
     buckets = report.get("buckets", [])
     lines = []
@@ -57,18 +63,35 @@ def _serialize_cashflow(report: Dict) -> str:
     return "\n".join(lines)
 
 
+_PNL_SYSTEM_PROMPT = (
+    "Eres un analista financiero que prepara resúmenes para pymes. "
+    "Debes resaltar insights accionables (márgenes, crecimiento, gastos anómalos) y usar un tono cercano."
+)
+_PNL_USER_PROMPT = "Redacta un análisis breve (3-5 párrafos) del P&L resumido en el contexto."
+_CASHFLOW_SYSTEM_PROMPT = (
+    "Eres un controller financiero. Identifica tensiones de caja, periodos con falta de cobros y necesidad de financiación."
+)
+_CASHFLOW_USER_PROMPT = "Analiza el forecast de cashflow y sugiere acciones para estabilizar la caja."
+
+
 def explain_pnl(report: Dict, tenant: Optional[str] = None, user: Optional[str] = None) -> str:
-    context = _serialize_pnl(report)
-    system_prompt = (
-        "Eres un analista financiero que prepara resúmenes para pymes. "
-        "Debes resaltar insights accionables (márgenes, crecimiento, gastos anómalos) y usar un tono cercano."
-    )
-    user_prompt = "Redacta un análisis breve (3-5 párrafos) del P&L resumido en el contexto."
     return llm_router.call_llm(
         llm_router.LLMTask.EXPLICAR_PNL,
-        system_prompt,
-        user_prompt,
-        context=context,
+        _PNL_SYSTEM_PROMPT,
+        _PNL_USER_PROMPT,
+        context=_serialize_pnl(report),
+        tenant=tenant,
+        user=user,
+    )
+
+
+def stream_pnl(report: Dict, tenant: Optional[str] = None, user: Optional[str] = None) -> Iterator[str]:
+    """Igual que explain_pnl pero entregando el texto por fragmentos."""
+    return llm_router.stream_llm(
+        llm_router.LLMTask.EXPLICAR_PNL,
+        _PNL_SYSTEM_PROMPT,
+        _PNL_USER_PROMPT,
+        context=_serialize_pnl(report),
         tenant=tenant,
         user=user,
     )
@@ -92,16 +115,23 @@ def explain_vat(report: Dict, tenant: Optional[str] = None, user: Optional[str]
 
 
 def explain_cashflow(report: Dict, tenant: Optional[str] = None, user: Optional[str] = None) -> str:
-    context = _serialize_cashflow(report)
-    system_prompt = (
-        "Eres un controller financiero. Identifica tensiones de caja, periodos con falta de cobros y necesidad de financiación."
-    )
-    user_prompt = "Analiza el forecast de cashflow y sugiere acciones para estabilizar la caja."
     return llm_router.call_llm(
         llm_router.LLMTask.EXPLICAR_CASHFLOW,
-        system_prompt,
-        user_prompt,
-        context=context,
+        _CASHFLOW_SYSTEM_PROMPT,
+        _CASHFLOW_USER_PROMPT,
+        context=_serialize_cashflow(report),
+        tenant=tenant,
+        user=user,
+    )
+
+
+def stream_cashflow(report: Dict, tenant: Optional[str] = None, user: Optional[str] = None) -> Iterator[str]:
+    """Igual que explain_cashflow pero entregando el texto por fragmentos."""
+    return llm_router.stream_llm(
+        llm_router.LLMTask.EXPLICAR_CASHFLOW,
+        _CASHFLOW_SYSTEM_PROMPT,
+        _CASHFLOW_USER_PROMPT,
+        context=_serialize_cashflow(report),
         tenant=tenant,
         user=user,
     )
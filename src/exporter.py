@@ -5,13 +5,15 @@ import argparse
 import csv
 import logging
 from pathlib import Path
-from typing import Dict, Protocol, Type
+from typing import Dict, Iterator, Protocol, Type
 
 from . import utils, erp_validators
 from .config import get_tenant_config, settings
 
 logger = logging.getLogger(__name__)
 
+_MONEY = "{:.2f}".format
+
 A3_CSV_COLUMNS = [
     "Fecha",
     "Diario",
@@ -45,16 +47,32 @@ class BaseERPAdapter:
 class A3InnuvaAdapter(BaseERPAdapter):
     name = "a3innuva"
 
-    def _prepare_lines(self, entry: Dict) -> list[Dict]:
+    def _prepare_lines(self, entry: Dict) -> Iterator[Dict]:
         lines = entry.get("lines", [])
         supplier_account = self.config.get("supplier_account", "410000")
-        prepared: list[Dict] = []
+        last_idx = len(lines) - 1
         for idx, line in enumerate(lines):
-            current = dict(line)
-            if idx == len(lines) - 1 and supplier_account:
-                current.setdefault("account", supplier_account)
-            prepared.append(current)
-        return prepared
+            # Solo la última línea puede necesitar la cuenta de proveedor: el resto se emite sin copiar.
+            if idx == last_idx and supplier_account and "account" not in line:
+                yield {**line, "account": supplier_account}
+            else:
+                yield line
+
+    def _row_iter(self, entry: Dict, journal: str) -> Iterator[tuple]:
+        date = entry.get("date")
+        invoice_number = entry.get("invoice_number")
+        supplier = entry.get("supplier", {})
+        for line in self._prepare_lines(entry):
+            yield (
+                date,
+                journal,
+                invoice_number,
+                line.get("account"),
+                _MONEY(float(line.get("debit", 0.0))),
+                _MONEY(float(line.get("credit", 0.0))),
+                line.get("concept") or supplier.get("name"),
+                line.get("nif") or supplier.get("nif"),
+            )
 
     def export_entry(self, doc_id: str, entry: Dict) -> Path:
         csv_dir = utils.BASE_DIR / "OUT" / "csv"
@@ -63,24 +81,11 @@ class A3InnuvaAdapter(BaseERPAdapter):
 
         journal = entry.get("journal") or self.config.get("default_journal", "COMPRAS")
         entry["journal"] = journal
-        lines = self._prepare_lines(entry)
 
         with csv_path.open("w", encoding="utf-8", newline="") as fh:
             writer = csv.writer(fh)
             writer.writerow(A3_CSV_COLUMNS)
-            for line in lines:
-                writer.writerow(
-                    [
-                        entry.get("date"),
-                        journal,
-                        entry.get("invoice_number"),
-                        line.get("account"),
-                        f"{float(line.get('debit', 0.0)):.2f}",
-                        f"{float(line.get('credit', 0.0)):.2f}",
-                        line.get("concept") or entry.get("supplier", {}).get("name"),
-                        line.get("nif") or entry.get("supplier", {}).get("nif"),
-                    ]
-                )
+            writer.writerows(self._row_iter(entry, journal))
         return csv_path
 
 
@@ -101,16 +106,16 @@ class HoldedAdapter(BaseERPAdapter):
         holded_dir.mkdir(parents=True, exist_ok=True)
         target = holded_dir / f"{doc_id}.json"
         contact = entry.get("customer") or entry.get("supplier") or {}
-        lines_payload = []
-        for line in entry.get("lines", []):
-            lines_payload.append(
-                {
-                    "account": line.get("account"),
-                    "description": line.get("concept") or entry.get("concept"),
-                    "debit": float(line.get("debit", 0.0)),
-                    "credit": float(line.get("credit", 0.0)),
-                }
-            )
+        default_concept = entry.get("concept")
+        lines_payload = [
+            {
+                "account": line.get("account"),
+                "description": line.get("concept") or default_concept,
+                "debit": float(line.get("debit", 0.0)),
+                "credit": float(line.get("credit", 0.0)),
+            }
+            for line in entry.get("lines", [])
+        ]
         payload = {
             "date": entry.get("date"),
             "dueDate": entry.get("due") or entry.get("due_date"),
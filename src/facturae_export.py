@@ -15,6 +15,7 @@ FACTURAE_DIR = utils.BASE_DIR / "OUT" / "facturae"
 FACTURAE_DIR.mkdir(parents=True, exist_ok=True)
 FACTURAE_XSD_PATH = utils.BASE_DIR / "data" / "xsd" / "facturae_3_2_2.xsd"
 _FACTURAE_SCHEMA: Optional[etree.XMLSchema] = None
+_MONEY = "{:.2f}".format
 
 
 def _load_doc(doc_id: str) -> Dict:
@@ -109,24 +110,24 @@ def build_facturae_xml(doc_id: str) -> str:
         it = ET.SubElement(items, "Item")
         ET.SubElement(it, "Description").text = line.get("desc") or "Concepto"
         ET.SubElement(it, "Quantity").text = str(line.get("qty") or 1)
-        ET.SubElement(it, "UnitPriceWithoutTax").text = f"{float(line.get('amount', 0.0)):.2f}"
-        ET.SubElement(it, "TaxRate").text = f"{float(line.get('vat_rate', 21.0)):.2f}"
+        ET.SubElement(it, "UnitPriceWithoutTax").text = _MONEY(float(line.get("amount", 0.0)))
+        ET.SubElement(it, "TaxRate").text = _MONEY(float(line.get("vat_rate", 21.0)))
 
     taxes = ET.SubElement(invoice_node, "TaxesOutputs")
     tax = ET.SubElement(taxes, "Tax")
-    ET.SubElement(tax, "TaxRate").text = f"{float(totals.get('vat_rate', 21.0)):.2f}"
-    ET.SubElement(tax, "TaxableBase").text = f"{float(totals.get('base', 0.0)):.2f}"
-    ET.SubElement(tax, "TaxAmount").text = f"{float(totals.get('vat', 0.0)):.2f}"
+    ET.SubElement(tax, "TaxRate").text = _MONEY(float(totals.get("vat_rate", 21.0)))
+    ET.SubElement(tax, "TaxableBase").text = _MONEY(float(totals.get("base", 0.0)))
+    ET.SubElement(tax, "TaxAmount").text = _MONEY(float(totals.get("vat", 0.0)))
 
     totals_node = ET.SubElement(invoice_node, "InvoiceTotals")
-    ET.SubElement(totals_node, "TotalGrossAmount").text = f"{float(totals.get('base', 0.0)):.2f}"
-    ET.SubElement(totals_node, "TotalTaxOutputs").text = f"{float(totals.get('vat', 0.0)):.2f}"
-    ET.SubElement(totals_node, "TotalInvoiceAmount").text = f"{float(totals.get('gross', 0.0)):.2f}"
+    ET.SubElement(totals_node, "TotalGrossAmount").text = _MONEY(float(totals.get("base", 0.0)))
+    ET.SubElement(totals_node, "TotalTaxOutputs").text = _MONEY(float(totals.get("vat", 0.0)))
+    ET.SubElement(totals_node, "TotalInvoiceAmount").text = _MONEY(float(totals.get("gross", 0.0)))
 
     payments = ET.SubElement(invoice_node, "PaymentDetails")
     payment = ET.SubElement(payments, "PaymentDetail")
     ET.SubElement(payment, "PaymentMeans").text = "31"  # transferencia
-    ET.SubElement(payment, "PaymentAmount").text = f"{float(totals.get('gross', 0.0)):.2f}"
+    ET.SubElement(payment, "PaymentAmount").text = _MONEY(float(totals.get("gross", 0.0)))
     ET.SubElement(payment, "PaymentDueDate").text = invoice.get("due") or invoice.get("date")
 
     # Serialize pretty
@@ -2,33 +2,45 @@
 from __future__ import annotations
 
 import argparse
+from functools import lru_cache
 
-from . import efactura_payloads, facturae_export, sii_export
 from .config import settings
 
+# Los módulos de exportación (lxml, XSD...) se importan dentro de cada comando
+# para que `--help` o un subcomando concreto no paguen la carga de todos.
+
 
 def cmd_export_sii(args: argparse.Namespace) -> None:
+    from . import sii_export
+
     path = sii_export.write_sii_file(args.tenant, args.date_from, args.date_to)
     print(f"SII export generado en {path}")
 
 
 def cmd_export_facturae(args: argparse.Namespace) -> None:
+    from . import facturae_export
+
     path = facturae_export.write_facturae_file(args.doc_id)
     print(f"Facturae XML generado en {path}")
 
 
 def cmd_export_face(args: argparse.Namespace) -> None:
+    from . import efactura_payloads
+
     payload = efactura_payloads.build_face_payload(args.doc_id)
     path = efactura_payloads.write_payload(payload, f"face_{args.doc_id}.json")
     print(f"Payload FACe escrito en {path}")
 
 
 def cmd_export_verifactu(args: argparse.Namespace) -> None:
+    from . import efactura_payloads
+
     payload = efactura_payloads.build_verifactu_record(args.doc_id, args.action)
     path = efactura_payloads.write_payload(payload, f"verifactu_{args.doc_id}_{args.action}.json")
     print(f"Registro VeriFactu escrito en {path}")
 
 
+@lru_cache(maxsize=1)
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="Herramientas fiscales offline")
     sub = parser.add_subparsers(dest="command", required=True)
@@ -1,11 +1,15 @@
 """Readiness utilities for FastAPI endpoints."""
 from __future__ import annotations
 
+import os
 import tempfile
+import threading
+import time
 from pathlib import Path
-from typing import Dict
+from typing import Any, Dict, Set
 
 from . import utils
+from .config import settings
 
 CHECK_DIRS = [
     ("inbox", Path(utils.BASE_DIR / "IN")),
@@ -15,6 +19,11 @@ CHECK_DIRS = [
 ]
 
 
+_CACHE_LOCK = threading.Lock()
+_CACHE: Dict[str, Any] = {"ts": 0.0, "key": None, "details": None}
+_deep_checked: Set[Path] = set()
+
+
 class ReadinessError(Exception):
     def __init__(self, details: Dict[str, str]):
         super().__init__("Readiness checks failed")
@@ -23,8 +32,8 @@ class ReadinessError(Exception):
 
 def _check_db(details: Dict[str, str]) -> None:
     try:
+        # La conexión es la reutilizada por el hilo (utils.get_connection); la tabla la crea init_db.
         with utils.get_connection() as conn:
-            conn.execute("CREATE TABLE IF NOT EXISTS readiness_probe(ts TEXT)")
             conn.execute("DELETE FROM readiness_probe")
             conn.execute("INSERT INTO readiness_probe(ts) VALUES (?)", (utils.iso_now(),))
         details["db"] = "ok"
@@ -33,21 +42,55 @@ def _check_db(details: Dict[str, str]) -> None:
         raise ReadinessError(details)
 
 
-def _check_directory(path: Path) -> None:
-    path.mkdir(parents=True, exist_ok=True)
-    with tempfile.NamedTemporaryFile(dir=path, delete=True) as tmp:
-        tmp.write(b"ready")
-        tmp.flush()
+def warmup() -> None:
+    """Crea los directorios vigilados una vez al arrancar; el probe después solo hace stat."""
+    for _, path in CHECK_DIRS:
+        path.mkdir(parents=True, exist_ok=True)
+
+
+def _check_directory(path: Path, deep: bool = False) -> None:
+    try:
+        os.stat(path)
+    except FileNotFoundError:
+        # Solo si alguien borró el directorio tras warmup(); no es el camino habitual.
+        path.mkdir(parents=True, exist_ok=True)
+    if not os.access(path, os.W_OK):
+        raise PermissionError(f"Sin permiso de escritura en {path}")
+    # La escritura real solo se prueba la primera vez por proceso (o si se pide deep).
+    if deep or path not in _deep_checked:
+        with tempfile.NamedTemporaryFile(dir=path, delete=True) as tmp:
+            tmp.write(b"ready")
+            tmp.flush()
+        _deep_checked.add(path)
+
+
+def invalidate_readiness_cache() -> None:
+    with _CACHE_LOCK:
+        _CACHE.update(ts=0.0, key=None, details=None)
+
 
+def check_readiness(deep: bool = False) -> Dict[str, str]:
+    """Ejecuta los checks; un resultado OK se reutiliza durante READINESS_CACHE_TTL segundos.
 
-def check_readiness() -> Dict[str, str]:
+    Con ``deep=True`` se ignora la caché y se repite la escritura de prueba en cada directorio.
+    """
+    key = str(utils.DB_PATH)
+    ttl = settings.readiness_cache_ttl
+    now = time.monotonic()
+    with _CACHE_LOCK:
+        cached = _CACHE["details"]
+        if not deep and ttl > 0 and cached is not None and _CACHE["key"] == key and now - _CACHE["ts"] < ttl:
+            return dict(cached)
     details: Dict[str, str] = {}
     _check_db(details)
     for label, path in CHECK_DIRS:
         try:
-            _check_directory(path)
+            _check_directory(path, deep=deep)
             details[label] = "ok"
         except Exception as exc:
             details[label] = f"error: {exc}"
             raise ReadinessError(details)
+    # Solo se cachean los resultados correctos: un fallo se vuelve a comprobar en la siguiente llamada.
+    with _CACHE_LOCK:
+        _CACHE.update(ts=now, key=key, details=dict(details))
     return details
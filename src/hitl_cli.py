@@ -1,38 +1,44 @@
 import argparse
-import getpass
+import sys
 
-from . import hitl_service, utils
-from . import rules_engine
+# hitl_service/utils arrastran pipeline, proveedores y SQLite: se importan dentro de cada
+# comando para que `--help` no pague ese coste.
 
 
 def list_queue(doc_type: str | None = None) -> None:
+    from . import hitl_service
+
     items = hitl_service.fetch_review_items(doc_type_prefix=doc_type)
     if not items:
         print("No hay documentos pendientes de revisión.")
         return
-    print(f"Pendientes: {len(items)}")
+    out = [f"Pendientes: {len(items)}"]
     for item in items:
         supplier = item.supplier
         invoice = item.invoice
         totals = item.totals
-        print(
+        out.append(
             f"- {item.doc_id[:8]} | {supplier.get('name')} | {invoice.get('number')} | "
             f"Total {totals.get('gross')} | Tipo {item.doc_type} | Conc {item.reconciled_pct*100:.1f}% | Issues: {', '.join(item.issues_text)} | "
             f"Conf OCR {item.confidences['ocr'] or '-'} / Entry {item.confidences['entry'] or '-'} / "
             f"Global {item.confidences['global'] or '-'}"
         )
         if item.suggestion:
-            print(
+            out.append(
                 f"    Sugerencia → cuenta {item.suggestion.get('account')} / IVA {item.suggestion.get('iva_type')} "
                 f"(conf {item.suggestion.get('confidence_llm', '-')})"
             )
+    sys.stdout.write("\n".join(out) + "\n")
 
 
 def interactive(doc_id: str | None = None, doc_type: str | None = None) -> None:
+    from . import hitl_service
+
     queue = hitl_service.fetch_review_items(doc_type_prefix=doc_type)
     if not queue:
         print("No hay documentos pendientes.")
         return
+    actor = hitl_service.DEFAULT_ACTOR
     for item in queue:
         if doc_id and item.doc_id != doc_id:
             continue
@@ -40,30 +46,28 @@ def interactive(doc_id: str | None = None, doc_type: str | None = None) -> None:
         supplier = detail["normalized"].get("supplier", {})
         invoice = detail["normalized"].get("invoice", {})
         totals = detail["normalized"].get("totals", {})
-        print("\n=== Documento", item.doc_id)
-        print("Proveedor:", supplier.get("name"), supplier.get("nif"))
-        print("Factura:", invoice.get("number"), "Fecha:", invoice.get("date"))
-        print("Importe total:", totals.get("gross"))
-        print("Tipo de documento:", detail.get("doc_type"))
-        print("Issues:", ", ".join(detail["issues_text"]))
         recon = detail.get("reconciliation") or {}
-        print(
-            "Conciliación:",
-            f"{recon.get('amount', 0):.2f} EUR ({(recon.get('pct') or 0)*100:.1f}%)"
-        )
         confidences = detail["confidences"]
-        print(
+        out = [
+            f"\n=== Documento {item.doc_id}",
+            f"Proveedor: {supplier.get('name')} {supplier.get('nif')}",
+            f"Factura: {invoice.get('number')} Fecha: {invoice.get('date')}",
+            f"Importe total: {totals.get('gross')}",
+            f"Tipo de documento: {detail.get('doc_type')}",
+            f"Issues: {', '.join(detail['issues_text'])}",
+            f"Conciliación: {recon.get('amount', 0):.2f} EUR ({(recon.get('pct') or 0)*100:.1f}%)",
             f"Confianzas → OCR: {confidences['ocr'] or '-'}  Entry: {confidences['entry'] or '-'}  "
-            f"Global: {confidences['global'] or '-'}"
-        )
+            f"Global: {confidences['global'] or '-'}",
+        ]
         suggestion = detail["suggestion"]
         if suggestion:
-            print(
+            out.append(
                 f"Sugerencia LLM: cuenta {suggestion.get('account')} / IVA {suggestion.get('iva_type')} "
                 f"(conf {suggestion.get('confidence_llm', '-')}, motivo: {suggestion.get('rationale', '')})"
             )
+        sys.stdout.write("\n".join(out) + "\n")
+        sys.stdout.flush()
         action = input("[A]ceptar, [E]ditar, [D]uplicado, [R]eprocesar, [S]altar, [Q]uitar: ").strip().lower()
-        actor = getpass.getuser()
         if action in ("a", ""):
             learn = "NO_RULE" in detail["issues"]
             apply_bulk = False
@@ -103,13 +107,26 @@ def parse_args() -> argparse.Namespace:
     return parser.parse_args()
 
 
+def _cmd_list(args: argparse.Namespace) -> None:
+    list_queue(getattr(args, "doc_type", None))
+
+
+def _cmd_review(args: argparse.Namespace) -> None:
+    interactive(getattr(args, "doc", None), getattr(args, "doc_type", None))
+
+
+COMMANDS = {
+    "list": _cmd_list,
+    "review": _cmd_review,
+}
+
+
 def main() -> None:
-    utils.configure_logging()
     args = parse_args()
-    if args.command == "list":
-        list_queue(getattr(args, "doc_type", None))
-    else:
-        interactive(getattr(args, "doc", None), getattr(args, "doc_type", None))
+    from . import utils
+
+    utils.configure_logging()
+    COMMANDS[args.command](args)
 
 
 if __name__ == "__main__":
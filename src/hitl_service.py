@@ -1,9 +1,15 @@
 """Reusable helpers for HITL actions (shared by CLI and web)."""
 from __future__ import annotations
 
+import copy
 import json
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from functools import lru_cache, wraps
+from pathlib import Path
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
 
 import getpass
 
@@ -11,8 +17,70 @@ from . import pipeline, utils
 from .config import settings
 from . import rules_engine
 
+logger = logging.getLogger(__name__)
 
-@dataclass
+JSON_LOAD_WORKERS = 8
+
+
+def _process_user() -> str:
+    try:
+        return getpass.getuser()
+    except (KeyError, OSError):
+        return "unknown"
+
+
+# Usuario del proceso resuelto una sola vez (getuser puede leer /etc/passwd en cada llamada).
+DEFAULT_ACTOR = _process_user()
+
+_T = TypeVar("_T")
+
+
+@dataclass(slots=True)
+class _Flight:
+    future: Future = field(default_factory=Future)
+    waiters: int = 0
+
+
+_inflight: Dict[Tuple[Any, ...], _Flight] = {}
+_inflight_lock = threading.Lock()
+
+
+def _single_flight(func: Callable[..., _T]) -> Callable[..., _T]:
+    """
+    Comparte el resultado entre llamadas concurrentes idénticas (mismos argumentos):
+    solo la primera ejecuta la lectura y el resto espera su Future. El resultado es mutable,
+    así que si se ha compartido cada llamada se lleva su propia copia.
+    """
+
+    @wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> _T:
+        key = (func.__name__, args, tuple(sorted(kwargs.items())))
+        with _inflight_lock:
+            flight = _inflight.get(key)
+            owner = flight is None
+            if owner:
+                flight = _inflight[key] = _Flight()
+            else:
+                flight.waiters += 1
+        if not owner:
+            return copy.deepcopy(flight.future.result())
+        try:
+            result = func(*args, **kwargs)
+        except BaseException as exc:
+            with _inflight_lock:
+                _inflight.pop(key, None)
+            flight.future.set_exception(exc)
+            raise
+        with _inflight_lock:
+            _inflight.pop(key, None)
+            shared = flight.waiters > 0
+        flight.future.set_result(result)
+        return copy.deepcopy(result) if shared else result
+
+    return wrapper
+
+
+@dataclass(slots=True)
 class ReviewDoc:
     doc_id: str
     supplier: Dict[str, Any]
@@ -29,12 +97,34 @@ class ReviewDoc:
     metadata: Dict[str, Any]
 
 
+@lru_cache(maxsize=512)
+def _read_json_cached(path_str: str, mtime_ns: int, size: int) -> Dict[str, Any]:
+    return utils.read_json(Path(path_str))
+
+
+def _read_json_versioned(path: Path) -> Dict[str, Any]:
+    """
+    Lee un JSON reutilizando el parseo mientras el fichero no cambie (mtime_ns + tamaño).
+    El dict devuelto es compartido: quien necesite modificarlo debe usar utils.read_json.
+    """
+    stat = path.stat()
+    return _read_json_cached(str(path), stat.st_mtime_ns, stat.st_size)
+
+
 def _load_json(doc_id: str) -> Dict[str, Any]:
-    return utils.read_json(utils.BASE_DIR / "OUT" / "json" / f"{doc_id}.json")
+    return _read_json_versioned(utils.BASE_DIR / "OUT" / "json" / f"{doc_id}.json")
+
+
+def _load_json_many(doc_ids: List[str]) -> List[Dict[str, Any]]:
+    """Carga varios JSON normalizados en paralelo, conservando el orden de entrada."""
+    if len(doc_ids) <= 1:
+        return [_load_json(doc_id) for doc_id in doc_ids]
+    with ThreadPoolExecutor(max_workers=min(JSON_LOAD_WORKERS, len(doc_ids))) as pool:
+        return list(pool.map(_load_json, doc_ids))
 
 
 def _load_entry(doc_id: str) -> Dict[str, Any]:
-    return utils.read_json(utils.BASE_DIR / "OUT" / "json" / f"{doc_id}.entry.json")
+    return _read_json_versioned(utils.BASE_DIR / "OUT" / "json" / f"{doc_id}.entry.json")
 
 
 def _ensure_tenant(doc_id: str, tenant: Optional[str]) -> None:
@@ -53,7 +143,7 @@ def _ensure_tenant(doc_id: str, tenant: Optional[str]) -> None:
 
 def _parse_queue_payload(row: Any) -> Dict[str, Any]:
     try:
-        return json.loads(row["suggested"] or "{}")
+        return utils.json_loads(row["suggested"] or "{}")
     except (KeyError, json.JSONDecodeError, TypeError):
         return {}
 
@@ -79,6 +169,7 @@ def _suggestion_from_row(row: Any) -> Dict[str, Any]:
     return suggestion if isinstance(suggestion, dict) else {}
 
 
+@_single_flight
 def fetch_review_items(
     limit: Optional[int] = None,
     offset: int = 0,
@@ -87,34 +178,35 @@ def fetch_review_items(
     issue_filter: Optional[str] = None,
     sort_by_issues: bool = True,
 ) -> List[ReviewDoc]:
-    queue = utils.fetch_review_queue(limit=limit, offset=offset, tenant=tenant)
+    # Tenant y prefijo de doc_type los filtra SQLite: no se leen JSON de filas descartadas.
+    queue = utils.fetch_review_queue(limit=limit, offset=offset, tenant=tenant, doc_type_prefix=doc_type_prefix)
     docs: List[ReviewDoc] = []
     issue_filter_norm = (issue_filter or "").strip().upper()
+    # El filtro por issue solo necesita la fila de la cola: se aplica antes de leer ningún JSON.
+    candidates = []
     for row in queue:
-        doc_id = row["doc_id"]
-        normalized = _load_json(doc_id)
         issues = _issues_from_row(row)
+        if issue_filter_norm and issue_filter_norm not in {code.upper() for code in issues}:
+            continue
+        candidates.append((row, issues))
+    doc_ids = [row["doc_id"] for row, _ in candidates]
+    doc_rows = utils.get_docs_bulk(doc_ids)
+    normalized_docs = _load_json_many(doc_ids)
+    for (row, issues), normalized in zip(candidates, normalized_docs):
+        doc_id = row["doc_id"]
         suggestion = _suggestion_from_row(row)
-        doc_row = utils.get_doc(doc_id)
+        doc_row = doc_rows.get(doc_id)
         metadata_payload = normalized.get("metadata", {})
         doc_type = (
             metadata_payload.get("doc_type")
             or (doc_row["doc_type"] if doc_row and doc_row["doc_type"] else None)
             or "invoice"
         )
-        if doc_type_prefix and not doc_type.lower().startswith(doc_type_prefix.lower()):
-            continue
-        if issue_filter_norm:
-            issue_upper = [code.upper() for code in issues]
-            if issue_filter_norm not in issue_upper:
-                continue
         confidences = {
             "ocr": doc_row["ocr_conf"] if doc_row else None,
             "entry": doc_row["entry_conf"] if doc_row else None,
             "global": doc_row["global_conf"] if doc_row else None,
         }
-        if tenant and doc_row and doc_row["tenant"] != tenant:
-            continue
         docs.append(
             ReviewDoc(
                 doc_id=doc_id,
@@ -133,31 +225,18 @@ def fetch_review_items(
             )
         )
     if sort_by_issues:
-        docs.sort(key=lambda d: (len(d.issues) if isinstance(d.issues, list) else 0, -(d.confidences.get("global") or 0)), reverse=True)
+        # _issues_from_row siempre devuelve lista, así que la clave no necesita isinstance.
+        docs.sort(key=lambda d: (len(d.issues), -(d.confidences["global"] or 0)), reverse=True)
     return docs
 
 
 def summarize_review_queue(limit_per_issue: int = 5, tenant: Optional[str] = None) -> Dict[str, Any]:
     """Agrupa la cola HITL por código de issue y devuelve una muestra de doc_ids."""
-    queue = utils.fetch_review_queue(tenant=tenant)
-    counter: Dict[str, int] = {}
-    samples: Dict[str, List[str]] = {}
-    for row in queue:
-        issues = _issues_from_row(row)
-        doc_id = row["doc_id"]
-        for code in issues or ["NO_ISSUE"]:
-            counter[code] = counter.get(code, 0) + 1
-            bucket = samples.setdefault(code, [])
-            if len(bucket) < limit_per_issue:
-                bucket.append(doc_id)
-    summary = sorted(counter.items(), key=lambda kv: kv[1], reverse=True)
-    return {
-        "counts": summary,
-        "samples": samples,
-        "total": len(queue),
-    }
+    # Se agrega en SQLite sobre queue_issues: no se parsea el JSON de cada fila.
+    return utils.summarize_queue_issues(limit_per_issue, tenant=tenant)
 
 
+@_single_flight
 def get_review_detail(doc_id: str, tenant: Optional[str] = None) -> Dict[str, Any]:
     _ensure_tenant(doc_id, tenant)
     normalized = _load_json(doc_id)
@@ -165,9 +244,9 @@ def get_review_detail(doc_id: str, tenant: Optional[str] = None) -> Dict[str, An
     doc_row = utils.get_doc(doc_id)
     if tenant and doc_row and doc_row["tenant"] != tenant:
         raise ValueError("Documento fuera del tenant actual")
-    queue_rows = [row for row in utils.fetch_review_queue(tenant=tenant) if row["doc_id"] == doc_id]
-    issues = _issues_from_row(queue_rows[0]) if queue_rows else []
-    suggestion = _suggestion_from_row(queue_rows[0]) if queue_rows else {}
+    queue_row = utils.fetch_review_row(doc_id, tenant=tenant)
+    issues = _issues_from_row(queue_row) if queue_row else []
+    suggestion = _suggestion_from_row(queue_row) if queue_row else {}
     metadata_payload = normalized.get("metadata", {})
     doc_type = metadata_payload.get("doc_type") or (doc_row["doc_type"] if doc_row else None) or "invoice"
     matches = utils.fetch_matches_for_doc(doc_id)
@@ -195,6 +274,7 @@ def get_review_detail(doc_id: str, tenant: Optional[str] = None) -> Dict[str, An
 
 
 def _append_rule(normalized: Dict[str, Any], account: str, iva_type: float, actor: str, notes: str) -> None:
+    """Añade la regla al CSV y la audita en el acto, antes de cualquier reprocesado que pueda fallar."""
     supplier = normalized.get("supplier", {})
     row = {
         "tenant": normalized.get("tenant", settings.default_tenant),
@@ -211,16 +291,38 @@ def _append_rule(normalized: Dict[str, Any], account: str, iva_type: float, acto
 def _apply_rule_to_similar(nif: str, exclude_doc: str, actor: str) -> None:
     if not nif:
         return
-    queue = utils.fetch_review_queue()
-    for row in queue:
+    targets: List[str] = []
+    for row in utils.fetch_review_queue_by_nif(nif):
         doc_id = row["doc_id"]
         if doc_id == exclude_doc:
             continue
-        normalized = _load_json(doc_id)
-        other_nif = (normalized.get("supplier", {}).get("nif") or "").upper()
+        other_nif = row["supplier_nif"]
+        if other_nif is None:
+            normalized = _load_json(doc_id)
+            other_nif = (normalized.get("supplier", {}).get("nif") or "").upper()
         if other_nif and other_nif == nif.upper():
-            pipeline.reprocess_from_json(doc_id)
-            utils.add_audit(doc_id, "HITL_AUTO_REPROCESS", actor, None, {"reason": "rule_applied"})
+            targets.append(doc_id)
+    if not targets:
+        return
+    workers = max(1, min(settings.pipeline_concurrency, len(targets)))
+    # Un fallo no debe dejar sin auditar los documentos que sí se reprocesaron.
+    reprocessed: List[str] = []
+    first_error: Optional[BaseException] = None
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(pipeline.reprocess_from_json, doc_id): doc_id for doc_id in targets}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as exc:
+                logger.error("Error reprocesando %s: %s", futures[future], exc)
+                first_error = first_error or exc
+                continue
+            reprocessed.append(futures[future])
+    utils.add_audit_bulk(
+        (doc_id, "HITL_AUTO_REPROCESS", actor, None, {"reason": "rule_applied"}) for doc_id in reprocessed
+    )
+    if first_error is not None:
+        raise first_error
 
 
 def accept_doc(
@@ -231,7 +333,7 @@ def accept_doc(
     suggestion: Optional[Dict[str, Any]] = None,
     tenant: Optional[str] = None,
 ) -> None:
-    actor = actor or getpass.getuser()
+    actor = actor or DEFAULT_ACTOR
     _ensure_tenant(doc_id, tenant)
     normalized = _load_json(doc_id)
     entry = _load_entry(doc_id)
@@ -258,16 +360,19 @@ def edit_doc(
     apply_to_similar: bool = False,
     tenant: Optional[str] = None,
 ) -> None:
-    actor = actor or getpass.getuser()
+    actor = actor or DEFAULT_ACTOR
     _ensure_tenant(doc_id, tenant)
-    entry = _load_entry(doc_id)
-    normalized = _load_json(doc_id)
+    # Copias propias (sin caché) porque se modifican y reescriben a continuación.
+    entry_path = utils.BASE_DIR / "OUT" / "json" / f"{doc_id}.entry.json"
+    normalized_path = utils.BASE_DIR / "OUT" / "json" / f"{doc_id}.json"
+    entry = utils.read_json(entry_path)
+    normalized = utils.read_json(normalized_path)
     if not entry.get("lines"):
         raise ValueError("No hay líneas para editar")
     entry["lines"][0]["account"] = account
     normalized["lines"][0]["vat_rate"] = iva_rate
-    utils.json_dump(entry, utils.BASE_DIR / "OUT" / "json" / f"{doc_id}.entry.json")
-    utils.json_dump(normalized, utils.BASE_DIR / "OUT" / "json" / f"{doc_id}.json")
+    # Asiento y normalizado se reemplazan juntos para no dejar el par a medias en disco.
+    utils.json_dump_atomic_batch([(entry, entry_path), (normalized, normalized_path)])
     _append_rule(normalized, account, iva_rate, actor, "editado HITL")
     supplier_nif = (normalized.get("supplier", {}).get("nif") or "").upper()
     if apply_to_similar:
@@ -277,7 +382,7 @@ def edit_doc(
 
 
 def mark_duplicate(doc_id: str, actor: Optional[str] = None, tenant: Optional[str] = None) -> None:
-    actor = actor or getpass.getuser()
+    actor = actor or DEFAULT_ACTOR
     _ensure_tenant(doc_id, tenant)
     utils.update_doc_status(doc_id, "ERROR", duplicate_flag=1)
     utils.remove_review_item(doc_id)
@@ -285,7 +390,7 @@ def mark_duplicate(doc_id: str, actor: Optional[str] = None, tenant: Optional[st
 
 
 def reprocess_doc(doc_id: str, actor: Optional[str] = None, tenant: Optional[str] = None) -> None:
-    actor = actor or getpass.getuser()
+    actor = actor or DEFAULT_ACTOR
     _ensure_tenant(doc_id, tenant)
     pipeline.reprocess_from_json(doc_id)
     utils.add_audit(doc_id, "HITL_REPROCESS", actor, None, None)
@@ -297,7 +402,7 @@ def clear_reconciliation(
     include_manual: bool = False,
     tenant: Optional[str] = None,
 ) -> None:
-    actor = actor or getpass.getuser()
+    actor = actor or DEFAULT_ACTOR
     _ensure_tenant(doc_id, tenant)
     utils.clear_matches(doc_id, include_manual=include_manual)
     utils.add_audit(doc_id, "HITL_CLEAR_RECON", actor, None, {"include_manual": include_manual})
@@ -2,59 +2,126 @@
 from __future__ import annotations
 
 import argparse
-import json
+import importlib
 import logging
+import os
 import random
 import socket
+import signal
 import sqlite3
 import subprocess
-import time
-from dataclasses import replace
+import sys
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Dict, List, Optional
+from types import MappingProxyType
+from typing import Callable, Dict, List, Optional, Tuple
 from datetime import datetime
 
-from . import bank_matcher, metrics, policy_sim, utils, alerts
-from tools import backfill_llm_costs
+from . import jobs_cache, policy_sim, utils
 from .config import settings
-from .pipeline import process_file as pipeline_process
-from .sources import ImapSource, LocalFolderSource, SftpSource
+from .sources import ImapSource, IngestionSource, LocalFolderSource, SftpSource
+
+# Módulos pesados (pipeline, proveedores, httpx, pandas...) que solo necesitan algunos runners:
+# se importan dentro de cada run_* para que `list`/`enable`/`delete` arranquen rápido.
+_LAZY_MODULES = {
+    "alerts": ".alerts",
+    "bank_matcher": ".bank_matcher",
+    "metrics": ".metrics",
+    "pipeline": ".pipeline",
+    "backfill_llm_costs": "tools.backfill_llm_costs",
+}
+
+
+def __getattr__(name: str):
+    # Compatibilidad con `jobs.metrics`, `jobs.alerts`... (p. ej. monkeypatch en tests).
+    target = _LAZY_MODULES.get(name)
+    if target is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return importlib.import_module(target, __package__)
 
 logger = logging.getLogger(__name__)
 HOSTNAME = socket.gethostname()
+RUN_DUE_MAX_WORKERS = 8
+RETRY_MAX_WAIT = 300.0
+# Se activa con SIGTERM: corta las esperas entre reintentos y no lanza más jobs.
+_SHUTDOWN = threading.Event()
+
+
+def _request_shutdown(signum, _frame) -> None:
+    logger.warning("Señal %s recibida: parando el scheduler", signum)
+    _SHUTDOWN.set()
 
 
 class JobSkipped(Exception):
     """Raised when a job intentionally skips execution (e.g., not implemented)."""
 
 
-def _process_source(source: LocalFolderSource) -> int:
-    documents = source.list_new_documents()
+def _process_source(source: IngestionSource) -> int:
+    """Procesa cualquier origen (carpeta, IMAP, SFTP) con el mismo pool de PIPELINE_CONCURRENCY."""
+    from .pipeline import process_file as pipeline_process
+
+    documents = list(source.list_new_documents())
     processed = 0
-    for document in documents:
-        doc_id = pipeline_process(document.path, tenant=source.tenant)
-        source.mark_processed(document, doc_id)
-        processed += 1
+    workers = max(1, min(settings.pipeline_concurrency, len(documents)))
+    if workers == 1:
+        for document in documents:
+            doc_id = pipeline_process(document.path, tenant=source.tenant)
+            source.mark_processed(document, doc_id)
+            processed += 1
+        return processed
+    # El pipeline va en paralelo (PIPELINE_CONCURRENCY); mark_processed sigue en este hilo
+    # porque el archivado busca nombres libres y no es seguro entre hilos.
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(pipeline_process, document.path, tenant=source.tenant): document
+            for document in documents
+        }
+        # Un fallo no debe dejar sin archivar los que sí terminaron (se reprocesarían como duplicados).
+        first_error: Optional[BaseException] = None
+        for future in as_completed(futures):
+            try:
+                doc_id = future.result()
+            except Exception as exc:
+                logger.error("Error procesando %s: %s", futures[future].path, exc)
+                first_error = first_error or exc
+                continue
+            source.mark_processed(futures[future], doc_id)
+            processed += 1
+    if first_error is not None:
+        raise first_error
     return processed
 
 
+@lru_cache(maxsize=1024)
+def _parse_config(raw: str) -> MappingProxyType:
+    # Cada tick vuelve a leer los mismos jobs: el JSON de config se parsea una vez por contenido.
+    try:
+        data = utils.json_loads(raw)
+    except ValueError:
+        data = {}
+    return MappingProxyType(data if isinstance(data, dict) else {})
+
+
 def _json_config(job, overrides: Optional[Dict] = None) -> Dict:
-    data = {}
-    if job and job["config"]:
-        try:
-            data = json.loads(job["config"])
-        except json.JSONDecodeError:
-            data = {}
+    data = dict(_parse_config(job["config"])) if job and job["config"] else {}
     if overrides:
         data.update(overrides)
     return data
 
 
+def _resolve_tenant(job, config: Dict) -> str:
+    return config.get("tenant") or job["tenant"] or settings.default_tenant
+
+
 def run_scan_folder(job, config: Dict) -> None:
     path = Path(config["path"])
     pattern = config.get("pattern", "*.pdf")
     recursive = config.get("recursive", True)
-    tenant = config.get("tenant") or job["tenant"] or settings.default_tenant
+    tenant = _resolve_tenant(job, config)
     archive = config.get("archive")
     limit = config.get("limit")
     if not path.exists():
@@ -74,7 +141,9 @@ def run_scan_folder(job, config: Dict) -> None:
 
 
 def run_import_bank(job, config: Dict) -> None:
-    tenant = config.get("tenant") or job["tenant"] or settings.default_tenant
+    from . import bank_matcher
+
+    tenant = _resolve_tenant(job, config)
     csv_path = Path(config["path"])
     profile_name = config.get("profile")
     direction = config.get("direction")
@@ -106,7 +175,7 @@ def run_scan_imap(job, config: Dict) -> None:
     try:
         source = ImapSource(
             name=job["name"],
-            tenant=config.get("tenant") or job["tenant"] or settings.default_tenant,
+            tenant=_resolve_tenant(job, config),
             host=config.get("host") or settings.imap_host,
             username=config.get("username") or settings.imap_user,
             password=config.get("password") or settings.imap_password,
@@ -123,7 +192,7 @@ def run_scan_sftp(job, config: Dict) -> None:
     try:
         source = SftpSource(
             name=job["name"],
-            tenant=config.get("tenant") or job["tenant"] or settings.default_tenant,
+            tenant=_resolve_tenant(job, config),
             host=config.get("host") or settings.sftp_host,
             username=config.get("username") or settings.sftp_user,
             password=config.get("password") or settings.sftp_password,
@@ -137,32 +206,47 @@ def run_scan_sftp(job, config: Dict) -> None:
 
 
 def run_preflight(job, config: Dict) -> None:
+    from . import metrics
+
     logger.info("Job %s -> Preflight", job["name"])
-    tenant = config.get("tenant") or job["tenant"] or settings.default_tenant
-    metrics.print_preflight(tenant)
+    tenant = _resolve_tenant(job, config)
+    # El informe solo depende del tenant y de docs: si nada cambió se reimprime el anterior.
+    key = jobs_cache.cache_key(tenant, jobs_cache.docs_fingerprint())
+    report = jobs_cache.cached(f"preflight:{job['id']}", key, lambda: metrics.format_preflight(tenant))
+    sys.stdout.write(report)
 
 
 def run_policy(job, config: Dict) -> None:
     policy_name = config.get("policy", "balanced")
-    base_policy = policy_sim.POLICIES.get(policy_name)
-    if not base_policy:
+    if policy_name not in policy_sim.POLICIES:
         raise ValueError(f"Política desconocida {policy_name}")
-    policy = replace(base_policy)
     min_conf = config.get("min_conf")
-    if min_conf is not None:
-        policy.min_conf_entry = float(min_conf)
-    result = policy_sim.simulate_policy(
-        policy,
-        doc_type_prefix=config.get("doc_type"),
-        manifest_path=Path(config["manifest"]) if config.get("manifest") else None,
-    )
-    logger.info(
-        "Job %s -> %s auto-post %.1f%% (total %d)",
-        job["name"],
-        policy.name,
-        result["auto_post_pct"],
-        result["total_docs"],
+    policy = policy_sim.get_policy(policy_name, float(min_conf) if min_conf is not None else None)
+    manifest_path = Path(config["manifest"]) if config.get("manifest") else None
+
+    def simulate() -> Dict:
+        full = policy_sim.simulate_policy(
+            policy,
+            doc_type_prefix=config.get("doc_type"),
+            manifest_path=manifest_path,
+        )
+        return {"auto_post_pct": full["auto_post_pct"], "total_docs": full["total_docs"]}
+
+    key = jobs_cache.cache_key(
+        asdict(policy),
+        config.get("doc_type"),
+        jobs_cache.file_digest(manifest_path),
+        jobs_cache.docs_fingerprint(),
     )
+    result = jobs_cache.cached(f"policy:{job['id']}", key, simulate)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(
+            "Job %s -> %s auto-post %.1f%% (total %d)",
+            job["name"],
+            policy.name,
+            result["auto_post_pct"],
+            result["total_docs"],
+        )
 
 
 def run_golden(job, config: Dict) -> None:
@@ -173,8 +257,21 @@ def run_golden(job, config: Dict) -> None:
         args.append("--reset")
     if config.get("force", True):
         args.append("--force")
-    logger.info("Job %s -> ejecutando %s", job["name"], " ".join(args))
-    subprocess.run(args, check=True)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Job %s -> ejecutando %s", job["name"], " ".join(args))
+    _spawn_and_wait(args)
+
+
+def _spawn_and_wait(args: List[str]) -> None:
+    """Lanza el comando con posix_spawn (sin copiar la memoria del scheduler como fork)."""
+    if not hasattr(os, "posix_spawnp"):  # pragma: no cover - Windows
+        subprocess.run(args, check=True)
+        return
+    pid = os.posix_spawnp(args[0], args, os.environ)
+    _, status = os.waitpid(pid, 0)
+    returncode = os.waitstatus_to_exitcode(status)
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, args)
 
 
 def run_backup_db(job, config: Dict) -> None:
@@ -186,21 +283,35 @@ def run_backup_db(job, config: Dict) -> None:
     dest = dest_dir / f"docs_{ts}.sqlite"
     if not src.exists():
         raise JobSkipped(f"No existe la base de datos en {src}")
-    shutil.copy2(src, dest)
+    # API de backup online de SQLite: copia páginas con los bloqueos correctos (incluye el WAL)
+    # en lugar de copiar un fichero que otro proceso puede estar escribiendo.
+    with utils.get_connection() as conn:
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE);")
+    source = sqlite3.connect(src)
+    target = sqlite3.connect(dest)
+    try:
+        source.backup(target, pages=1024, sleep=0.005)
+    finally:
+        target.close()
+        source.close()
     logger.info("Job %s -> backup creado en %s", job["name"], dest)
 
 
 def run_alerts(job, config: Dict) -> None:
+    from . import alerts
+
     alerts_list = alerts.evaluate_alerts(tenant=config.get("tenant"))
     if not alerts_list:
+        # El resultado (success) lo registra run_job, como en el resto de runners.
         logger.info("Job %s -> sin alertas", job["name"])
-        utils.record_job_run(job["id"], "success")
         return
     alerts.send_alerts(alerts_list, tenant=config.get("tenant"))
     logger.info("Job %s -> alertas enviadas: %s", job["name"], alerts_list)
 
 
 def run_backfill_llm_costs(job, config: Dict) -> None:
+    from tools import backfill_llm_costs
+
     dry = bool(config.get("dry_run"))
     updated = backfill_llm_costs.backfill(dry_run=dry)
     logger.info("Job %s -> backfill cost_eur updated=%d dry=%s", job["name"], updated, dry)
@@ -254,19 +365,50 @@ def _cmd_add_sftp(args: argparse.Namespace) -> None:
     print(f"Job scan_sftp creado con id {job_id}")
 
 
-def run_job(job: sqlite3.Row) -> None:  # type: ignore[name-defined]
-    config = _json_config(job)
-    job_type = job["job_type"]
-    runner = JOB_RUNNERS.get(job_type)
+@dataclass(frozen=True)
+class _PreparedJob:
+    run: Callable[[], None]
+    max_retries: int
+    retry_delay: float
+
+
+_PREPARED_JOBS: Dict[int, Tuple[Tuple, _PreparedJob]] = {}
+
+
+def _prepare_job(job) -> _PreparedJob:
+    """
+    Resuelve runner, config y parámetros de reintento una vez por job; se reutiliza mientras
+    no cambien tipo, config, tenant o nombre (los únicos campos de la fila que leen los runners).
+    """
+    key = (job["job_type"], job["config"], job["tenant"], job["name"])
+    cached = _PREPARED_JOBS.get(job["id"])
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    runner = JOB_RUNNERS.get(job["job_type"])
     if not runner:
-        raise ValueError(f"Tipo de job no soportado: {job_type}")
-    max_retries = int(config.get("max_retries", 0) or 0)
-    retry_delay = float(config.get("retry_delay", 5) or 5)
-    utils.mark_job_started(job["id"], HOSTNAME)
+        raise ValueError(f"Tipo de job no soportado: {job['job_type']}")
+    config = _json_config(job)
+    prepared = _PreparedJob(
+        run=partial(runner, job, config),
+        max_retries=int(config.get("max_retries", 0) or 0),
+        retry_delay=float(config.get("retry_delay", 5) or 5),
+    )
+    _PREPARED_JOBS[job["id"]] = (key, prepared)
+    return prepared
+
+
+def run_job(job: sqlite3.Row, mark_started: bool = True) -> None:  # type: ignore[name-defined]
+    prepared = _prepare_job(job)
+    max_retries = prepared.max_retries
+    retry_delay = prepared.retry_delay
+    if mark_started:
+        utils.mark_job_started(job["id"], HOSTNAME)
     attempt = 0
+    base_wait = max(1.0, retry_delay)
+    prev_wait = base_wait
     while True:
         try:
-            runner(job, config)
+            prepared.run()
             utils.record_job_run(job["id"], "success")
             break
         except JobSkipped as exc:
@@ -278,7 +420,9 @@ def run_job(job: sqlite3.Row) -> None:  # type: ignore[name-defined]
         except Exception as exc:
             if attempt < max_retries:
                 attempt += 1
-                wait = max(1.0, retry_delay) * attempt + random.uniform(0, max(1.0, retry_delay))
+                # Decorrelated jitter: crece con el fallo anterior, aleatorio y acotado.
+                wait = min(RETRY_MAX_WAIT, random.uniform(base_wait, prev_wait * 3))
+                prev_wait = wait
                 logger.warning(
                     "Job %s falló (%s). Reintento %d/%d en %.1fs",
                     job["name"],
@@ -287,7 +431,9 @@ def run_job(job: sqlite3.Row) -> None:  # type: ignore[name-defined]
                     max_retries,
                     wait,
                 )
-                time.sleep(wait)
+                if _SHUTDOWN.wait(wait):
+                    utils.record_job_run(job["id"], "skipped", "shutdown")
+                    raise JobSkipped("shutdown") from exc
                 continue
             utils.record_job_run(job["id"], "error", str(exc))
             raise
@@ -298,11 +444,14 @@ def cmd_list(_: argparse.Namespace) -> None:
     if not rows:
         print("No hay jobs definidos.")
         return
-    for row in rows:
-        print(
+    # Una sola escritura a stdout en lugar de un print por job.
+    sys.stdout.write(
+        "".join(
             f"[{row['id']}] {row['name']} ({row['job_type']}) tenant={row['tenant'] or '-'} "
-            f"schedule={row['schedule'] or 'manual'} enabled={row['enabled']} last_status={row['last_status'] or '-'}"
+            f"schedule={row['schedule'] or 'manual'} enabled={row['enabled']} last_status={row['last_status'] or '-'}\n"
+            for row in rows
         )
+    )
 
 
 def cmd_run_due(_: argparse.Namespace) -> None:
@@ -310,10 +459,27 @@ def cmd_run_due(_: argparse.Namespace) -> None:
     if not due:
         print("No hay jobs pendientes.")
         return
+    # Se reclaman todos los jobs pendientes en una sola transacción antes de ejecutarlos.
+    utils.mark_jobs_started([job["id"] for job in due], HOSTNAME)
+    # Un hilo por tipo de job: tipos distintos corren en paralelo, los del mismo tipo en serie.
+    groups: Dict[str, List[sqlite3.Row]] = defaultdict(list)
     for job in due:
+        groups[job["job_type"]].append(job)
+    with ThreadPoolExecutor(max_workers=min(RUN_DUE_MAX_WORKERS, len(groups))) as executor:
+        futures = [executor.submit(_run_due_group, group) for group in groups.values()]
+        for future in as_completed(futures):
+            future.result()
+
+
+def _run_due_group(group: List[sqlite3.Row]) -> None:
+    for job in group:
+        if _SHUTDOWN.is_set():
+            # Libera el claim para que el siguiente tick lo recoja.
+            utils.clear_job_start(job["id"])
+            continue
         print(f"Ejecutando job #{job['id']} ({job['name']}) ...")
         try:
-            run_job(job)
+            run_job(job, mark_started=False)
         except JobSkipped as exc:
             print(f"Job #{job['id']} omitido: {exc}")
         except Exception as exc:  # pragma: no cover
@@ -402,101 +568,125 @@ def cmd_add_backup(args: argparse.Namespace) -> None:
     print(f"Job backup_db creado con id {job_id}")
 
 
-def build_parser() -> argparse.ArgumentParser:
-    parser = argparse.ArgumentParser(description="CERTIVA Job Scheduler")
-    sub = parser.add_subparsers(dest="command", required=True)
+def _add_id_command(func):
+    def build(cmd: argparse.ArgumentParser) -> None:
+        cmd.add_argument("--id", type=int, required=True)
+        cmd.set_defaults(func=func)
+
+    return build
+
+
+def _build_add_scan(cmd: argparse.ArgumentParser) -> None:
+    cmd.add_argument("--name", required=True)
+    cmd.add_argument("--tenant", default=settings.default_tenant)
+    cmd.add_argument("--path", required=True)
+    cmd.add_argument("--pattern", default="*.pdf")
+    cmd.add_argument("--recursive", action="store_true")
+    cmd.add_argument("--archive")
+    cmd.add_argument("--schedule", help="Ej. every_5m, hourly, daily_02:00")
+    cmd.set_defaults(func=cmd_add_scan)
+
+
+def _build_add_bank(cmd: argparse.ArgumentParser) -> None:
+    cmd.add_argument("--name", required=True)
+    cmd.add_argument("--tenant", default=settings.default_tenant)
+    cmd.add_argument("--path", required=True)
+    cmd.add_argument("--profile")
+    cmd.add_argument("--direction")
+    cmd.add_argument("--account-id")
+    cmd.add_argument("--positive-sign", default="credit", choices=["credit", "debit"])
+    cmd.add_argument("--auto-match", action="store_true")
+    cmd.add_argument("--tolerance", type=float, default=0.01)
+    cmd.add_argument("--window", type=int, default=10)
+    cmd.add_argument("--schedule")
+    cmd.set_defaults(func=cmd_add_bank)
+
+
+def _build_add_preflight(cmd: argparse.ArgumentParser) -> None:
+    cmd.add_argument("--name", required=True)
+    cmd.add_argument("--tenant", default=settings.default_tenant)
+    cmd.add_argument("--schedule")
+    cmd.set_defaults(func=cmd_add_preflight)
+
+
+def _build_add_policy(cmd: argparse.ArgumentParser) -> None:
+    cmd.add_argument("--name", required=True)
+    cmd.add_argument("--policy", default="balanced", choices=list(policy_sim.POLICIES.keys()))
+    cmd.add_argument("--tenant")
+    cmd.add_argument("--doc-type")
+    cmd.add_argument("--manifest")
+    cmd.add_argument("--min-conf", type=float)
+    cmd.add_argument("--schedule")
+    cmd.set_defaults(func=cmd_add_policy)
+
+
+def _build_add_golden(cmd: argparse.ArgumentParser) -> None:
+    cmd.add_argument("--name", required=True)
+    cmd.add_argument("--dirty", action="store_true")
+    cmd.add_argument("--reset", action="store_true")
+    cmd.add_argument("--force", action="store_true")
+    cmd.add_argument("--schedule")
+    cmd.set_defaults(func=cmd_add_golden)
+
+
+def _build_add_backup(cmd: argparse.ArgumentParser) -> None:
+    cmd.add_argument("--name", required=True)
+    cmd.add_argument("--dest-dir", help="Directorio destino del backup", default=None)
+    cmd.add_argument("--schedule")
+    cmd.set_defaults(func=cmd_add_backup)
+
+
+def _build_add_purge(cmd: argparse.ArgumentParser) -> None:
+    cmd.add_argument("--name", required=True)
+    cmd.add_argument("--days", type=int, help="Días de retención", default=None)
+    cmd.add_argument("--schedule")
+    cmd.set_defaults(func=lambda args: _cmd_add_purge(args))
+
+
+def _build_add_alerts(cmd: argparse.ArgumentParser) -> None:
+    cmd.add_argument("--name", required=True)
+    cmd.add_argument("--tenant", help="Tenant opcional")
+    cmd.add_argument("--schedule")
+    cmd.set_defaults(func=lambda args: _cmd_add_alerts(args))
+
+
+def _build_add_backfill(cmd: argparse.ArgumentParser) -> None:
+    cmd.add_argument("--name", required=True)
+    cmd.add_argument("--dry-run", action="store_true")
+    cmd.add_argument("--schedule")
+    cmd.set_defaults(func=lambda args: _cmd_add_backfill(args))
+
+
+# nombre -> (ayuda, builder). Se construye solo el subcomando invocado (todos con --help).
+_SUBCOMMANDS: Dict[str, Tuple[str, Callable[[argparse.ArgumentParser], None]]] = {
+    "list": ("Listar jobs", lambda cmd: cmd.set_defaults(func=cmd_list)),
+    "run-due": ("Ejecuta todos los jobs pendientes", lambda cmd: cmd.set_defaults(func=cmd_run_due)),
+    "run": ("Ejecuta un job concreto", _add_id_command(cmd_run)),
+    "enable": ("Habilita un job", _add_id_command(cmd_enable)),
+    "disable": ("Deshabilita un job", _add_id_command(cmd_disable)),
+    "delete": ("Elimina un job", _add_id_command(cmd_delete)),
+    "add-scan-folder": ("Crea un job de escaneo local", _build_add_scan),
+    "add-import-bank": ("Crea un job de importación bancaria", _build_add_bank),
+    "add-preflight": ("Crea un job de preflight SII", _build_add_preflight),
+    "add-policy-sim": ("Crea un job de simulación de políticas", _build_add_policy),
+    "add-run-golden": ("Crea un job para ejecutar tests.run_golden", _build_add_golden),
+    "add-backup-db": ("Crea un job para respaldar la base de datos SQLite", _build_add_backup),
+    "add-purge-out": ("Crea un job para purgar OUT/ archivos antiguos", _build_add_purge),
+    "add-run-alerts": ("Crea un job para evaluar/enviar alertas", _build_add_alerts),
+    "add-backfill-llm-costs": ("Job para recalcular cost_eur en llm_calls", _build_add_backfill),
+}
 
-    sub.add_parser("list", help="Listar jobs").set_defaults(func=cmd_list)
-    sub.add_parser("run-due", help="Ejecuta todos los jobs pendientes").set_defaults(func=cmd_run_due)
-
-    run_cmd = sub.add_parser("run", help="Ejecuta un job concreto")
-    run_cmd.add_argument("--id", type=int, required=True)
-    run_cmd.set_defaults(func=cmd_run)
-
-    enable_cmd = sub.add_parser("enable", help="Habilita un job")
-    enable_cmd.add_argument("--id", type=int, required=True)
-    enable_cmd.set_defaults(func=cmd_enable)
-
-    disable_cmd = sub.add_parser("disable", help="Deshabilita un job")
-    disable_cmd.add_argument("--id", type=int, required=True)
-    disable_cmd.set_defaults(func=cmd_disable)
-
-    delete_cmd = sub.add_parser("delete", help="Elimina un job")
-    delete_cmd.add_argument("--id", type=int, required=True)
-    delete_cmd.set_defaults(func=cmd_delete)
-
-    scan_cmd = sub.add_parser("add-scan-folder", help="Crea un job de escaneo local")
-    scan_cmd.add_argument("--name", required=True)
-    scan_cmd.add_argument("--tenant", default=settings.default_tenant)
-    scan_cmd.add_argument("--path", required=True)
-    scan_cmd.add_argument("--pattern", default="*.pdf")
-    scan_cmd.add_argument("--recursive", action="store_true")
-    scan_cmd.add_argument("--archive")
-    scan_cmd.add_argument("--schedule", help="Ej. every_5m, hourly, daily_02:00")
-    scan_cmd.set_defaults(func=cmd_add_scan)
-
-    bank_cmd = sub.add_parser("add-import-bank", help="Crea un job de importación bancaria")
-    bank_cmd.add_argument("--name", required=True)
-    bank_cmd.add_argument("--tenant", default=settings.default_tenant)
-    bank_cmd.add_argument("--path", required=True)
-    bank_cmd.add_argument("--profile")
-    bank_cmd.add_argument("--direction")
-    bank_cmd.add_argument("--account-id")
-    bank_cmd.add_argument("--positive-sign", default="credit", choices=["credit", "debit"])
-    bank_cmd.add_argument("--auto-match", action="store_true")
-    bank_cmd.add_argument("--tolerance", type=float, default=0.01)
-    bank_cmd.add_argument("--window", type=int, default=10)
-    bank_cmd.add_argument("--schedule")
-    bank_cmd.set_defaults(func=cmd_add_bank)
-
-    preflight_cmd = sub.add_parser("add-preflight", help="Crea un job de preflight SII")
-    preflight_cmd.add_argument("--name", required=True)
-    preflight_cmd.add_argument("--tenant", default=settings.default_tenant)
-    preflight_cmd.add_argument("--schedule")
-    preflight_cmd.set_defaults(func=cmd_add_preflight)
-
-    policy_cmd = sub.add_parser("add-policy-sim", help="Crea un job de simulación de políticas")
-    policy_cmd.add_argument("--name", required=True)
-    policy_cmd.add_argument("--policy", default="balanced", choices=list(policy_sim.POLICIES.keys()))
-    policy_cmd.add_argument("--tenant")
-    policy_cmd.add_argument("--doc-type")
-    policy_cmd.add_argument("--manifest")
-    policy_cmd.add_argument("--min-conf", type=float)
-    policy_cmd.add_argument("--schedule")
-    policy_cmd.set_defaults(func=cmd_add_policy)
-
-    golden_cmd = sub.add_parser("add-run-golden", help="Crea un job para ejecutar tests.run_golden")
-    golden_cmd.add_argument("--name", required=True)
-    golden_cmd.add_argument("--dirty", action="store_true")
-    golden_cmd.add_argument("--reset", action="store_true")
-    golden_cmd.add_argument("--force", action="store_true")
-    golden_cmd.add_argument("--schedule")
-    golden_cmd.set_defaults(func=cmd_add_golden)
-
-    backup_cmd = sub.add_parser("add-backup-db", help="Crea un job para respaldar la base de datos SQLite")
-    backup_cmd.add_argument("--name", required=True)
-    backup_cmd.add_argument("--dest-dir", help="Directorio destino del backup", default=None)
-    backup_cmd.add_argument("--schedule")
-    backup_cmd.set_defaults(func=cmd_add_backup)
-
-    purge_cmd = sub.add_parser("add-purge-out", help="Crea un job para purgar OUT/ archivos antiguos")
-    purge_cmd.add_argument("--name", required=True)
-    purge_cmd.add_argument("--days", type=int, help="Días de retención", default=None)
-    purge_cmd.add_argument("--schedule")
-    purge_cmd.set_defaults(func=lambda args: _cmd_add_purge(args))
-
-    alerts_cmd = sub.add_parser("add-run-alerts", help="Crea un job para evaluar/enviar alertas")
-    alerts_cmd.add_argument("--name", required=True)
-    alerts_cmd.add_argument("--tenant", help="Tenant opcional")
-    alerts_cmd.add_argument("--schedule")
-    alerts_cmd.set_defaults(func=lambda args: _cmd_add_alerts(args))
-
-    backfill_cmd = sub.add_parser("add-backfill-llm-costs", help="Job para recalcular cost_eur en llm_calls")
-    backfill_cmd.add_argument("--name", required=True)
-    backfill_cmd.add_argument("--dry-run", action="store_true")
-    backfill_cmd.add_argument("--schedule")
-    backfill_cmd.set_defaults(func=lambda args: _cmd_add_backfill(args))
 
+def build_parser(command: Optional[str] = None) -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="CERTIVA Job Scheduler")
+    sub = parser.add_subparsers(dest="command", required=True)
+    if command in _SUBCOMMANDS:
+        names = [command]
+    else:
+        names = list(_SUBCOMMANDS)
+    for name in names:
+        help_text, builder = _SUBCOMMANDS[name]
+        builder(sub.add_parser(name, help=help_text))
     return parser
 
 
@@ -520,8 +710,10 @@ def _cmd_add_backfill(args: argparse.Namespace) -> None:
 
 def main() -> None:
     utils.configure_logging()
-    parser = build_parser()
-    args = parser.parse_args()
+    signal.signal(signal.SIGTERM, _request_shutdown)
+    argv = sys.argv[1:]
+    parser = build_parser(argv[0] if argv else None)
+    args = parser.parse_args(argv)
     args.func(args)
 
 
@@ -0,0 +1,53 @@
+"""Caché persistente (tabla job_cache) para jobs que solo dependen de sus entradas y de `docs`."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from pathlib import Path
+from typing import Any, Callable, Optional, TypeVar
+
+from . import utils
+
+T = TypeVar("T")
+
+
+def docs_fingerprint() -> str:
+    """Huella barata de la tabla docs: cambia con cada alta, baja o actualización (updated_at)."""
+    with utils.get_reader() as conn:
+        count, last_update = conn.execute(
+            "SELECT COUNT(*), MAX(updated_at) FROM docs"
+        ).fetchone()
+    return f"{count}:{last_update or ''}"
+
+
+def file_digest(path: Optional[Path]) -> Optional[str]:
+    if not path or not path.exists():
+        return None
+    return utils.compute_sha256(path)
+
+
+def cache_key(*parts: Any) -> str:
+    raw = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def cached(slot: str, key: str, compute: Callable[[], T]) -> T:
+    """
+    Devuelve el valor guardado para `slot` si se calculó con la misma clave; si no, lo calcula
+    y lo guarda (una fila por slot, así la tabla no crece con cada cambio de clave).
+    El valor debe ser serializable a JSON.
+    """
+    with utils.get_reader() as conn:
+        row = conn.execute(
+            "SELECT key, value FROM job_cache WHERE slot = ?", (slot,)
+        ).fetchone()
+    if row is not None and row["key"] == key:
+        return utils.json_loads(row["value"])
+    value = compute()
+    with utils.get_connection() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO job_cache(slot, key, value, updated_at) VALUES(?, ?, ?, ?)",
+            (slot, key, json.dumps(value, ensure_ascii=False), utils.iso_now()),
+        )
+    return value
@@ -2,13 +2,23 @@
 from __future__ import annotations
 
 import argparse
+import atexit
+import glob
 import logging
+import os
 import sys
+import time
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
 from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import chain, islice
 from pathlib import Path
-from typing import Callable, Dict, List, Tuple
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Tuple
 
-from . import hitl_cli, metrics, pipeline, reports, utils
+# Solo utils/config al cargar: pipeline, métricas, reportes y providers se importan dentro de cada
+# opción para que subcomandos ligeros (dump-summary) arranquen sin pagar todas las dependencias.
+from . import utils
 from .config import (
     BASE_DIR,
     settings,
@@ -17,13 +27,24 @@ from .config import (
     set_llm_provider_override,
     set_ocr_provider_override,
 )
-from .ocr_providers import DummyOCRProvider
-from .llm_providers import DummyLLMProvider
-from .batch_writer import build_batch_outputs
-from .experiments.dual_llm_tuning import run_dual_llm_experiment
+
+if TYPE_CHECKING:
+    from .llm_providers import LLMProvider
+    from .ocr_providers import OCRProvider
 
 
 EXPERIMENT_DIR = BASE_DIR / "IN" / "lote_experimentos_azure_openai"
+PROBE_SAMPLE = 5
+# mtime de EXPERIMENT_DIR la última vez que se comprobó que tenía PDFs.
+_samples_ready_mtime: Optional[int] = None
+# Endpoint -> instante (monotonic) del último azure_probe OK. Los fallos no se guardan.
+_PROBE_CACHE: Dict[str, float] = {}
+HISTORY_PATH = BASE_DIR / ".certiva_history"
+# Últimos valores tecleados por acción del menú (carpeta, tenant…), para proponerlos por defecto.
+LAST_INPUTS_PATH = BASE_DIR / ".certiva_last_inputs.json"
+# Un solo hilo: build_batch_outputs lee y resetea el estado global de provider_health y del
+# monitor de Azure, así que dos agregaciones a la vez mezclarían sus RESUMEN.
+_BATCH_EXECUTOR: Optional[ThreadPoolExecutor] = None
 
 
 def _print_header() -> None:
@@ -36,26 +57,100 @@ def _wait_enter() -> None:
     input("\nPulsa ENTER para continuar...")
 
 
+def _path_completer(text: str, state: int) -> Optional[str]:
+    matches = sorted(glob.glob(os.path.expanduser(text) + "*"))
+    if state >= len(matches):
+        return None
+    match = matches[state]
+    return match + os.sep if os.path.isdir(match) else match
+
+
+def _setup_readline() -> None:
+    """Historial persistente y autocompletado de rutas en los prompts (si hay readline)."""
+    try:
+        import readline
+    except ImportError:  # pragma: no cover - Windows sin pyreadline
+        return
+    try:
+        readline.read_history_file(HISTORY_PATH)
+    except OSError:
+        pass
+    readline.set_history_length(500)
+    atexit.register(readline.write_history_file, HISTORY_PATH)
+    readline.set_completer_delims(" \t\n")
+    readline.parse_and_bind("tab: complete")
+    readline.set_completer(_path_completer)
+
+
+def _load_last_inputs() -> Dict[str, Dict[str, str]]:
+    try:
+        data = utils.read_json(LAST_INPUTS_PATH)
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def _remember_inputs(action: str, **values: str) -> None:
+    data = _load_last_inputs()
+    data[action] = values
+    try:
+        utils.json_dump(data, LAST_INPUTS_PATH)
+    except OSError:  # pragma: no cover - solo es una comodidad
+        logging.getLogger(__name__).debug("No se pudo guardar %s", LAST_INPUTS_PATH)
+
+
 def _clear_overrides() -> None:
     set_ocr_provider_override(None)
     set_llm_provider_override(None)
 
 
-def _set_providers(force_dummy: bool) -> Tuple[str, str]:
+def _set_dummy_providers() -> Tuple[OCRProvider, LLMProvider]:
+    from .llm_providers import DummyLLMProvider
+    from .ocr_providers import DummyOCRProvider
+
+    ocr, llm = DummyOCRProvider(), DummyLLMProvider()
+    set_ocr_provider_override(ocr)
+    set_llm_provider_override(llm)
+    return ocr, llm
+
+
+def _set_providers(force_dummy: bool) -> Tuple[OCRProvider, LLMProvider]:
     if force_dummy:
-        set_ocr_provider_override(DummyOCRProvider())
-        set_llm_provider_override(DummyLLMProvider())
-        return DummyOCRProvider().provider_name, DummyLLMProvider().provider_name
+        return _set_dummy_providers()
     _clear_overrides()
-    current_ocr = get_ocr_provider()
-    current_llm = get_llm_provider()
-    return current_ocr.provider_name, current_llm.provider_name
+    return get_ocr_provider(), get_llm_provider()
 
 
-def _run_preflight_probe(folder: Path, total_files: int, quiet: bool) -> None:
+@contextmanager
+def providers_context(force_dummy: bool, quiet: bool = True) -> Iterator[Tuple[OCRProvider, LLMProvider]]:
+    """
+    Resuelve los providers una vez para todo el lote y deja puestos los overrides mientras dura
+    el bloque (el LLM se sigue resolviendo dentro de rules_engine). Al salir siempre se limpian.
+    """
+    try:
+        ocr, llm = _set_providers(force_dummy)
+        if not quiet:
+            print(f"Usando providers configurados → OCR: {ocr.provider_name} · LLM: {llm.provider_name}")
+    except Exception as exc:
+        if not quiet:
+            print(f"Providers reales no configurados ({exc}). Recurriendo a modo dummy.\n")
+        ocr, llm = _set_dummy_providers()
+    try:
+        yield ocr, llm
+    finally:
+        _clear_overrides()
+
+
+def _run_preflight_probe(folder: Path, total_files: int, quiet: bool, force: bool = False) -> None:
     if settings.ocr_provider_type != "azure":
         return
-    sample = max(1, min(5, total_files))
+    cache_key = settings.azure_formrec_endpoint or "azure"
+    last_ok = _PROBE_CACHE.get(cache_key)
+    if not force and last_ok is not None and time.monotonic() - last_ok < settings.azure_probe_ttl_sec:
+        if not quiet:
+            print("[+] azure_probe OK reciente, se omite el chequeo.")
+        return
+    sample = max(1, min(PROBE_SAMPLE, total_files))
     try:
         from tools import azure_probe
     except ImportError:  # pragma: no cover - defensive
@@ -78,52 +173,110 @@ def _run_preflight_probe(folder: Path, total_files: int, quiet: bool) -> None:
             "PROVIDER_DEGRADED: azure_probe detectó 429/timeout. "
             "Ajusta AZURE_MAX_RPS o reintenta más tarde."
         )
+    _PROBE_CACHE[cache_key] = time.monotonic()
     if not quiet:
         print("[+] azure_probe OK. Continuando con el procesamiento…")
 
 
-def process_folder_batch(
+def _iter_pdfs(root: Path) -> Iterator[Path]:
+    """Recorre `root` con os.scandir y va devolviendo los PDF según aparecen (sin ordenar)."""
+    pending = [str(root)]
+    while pending:
+        try:
+            entries = os.scandir(pending.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.name.endswith(".pdf") and entry.is_file():
+                    yield Path(entry.path)
+
+
+def _batch_executor() -> ThreadPoolExecutor:
+    global _BATCH_EXECUTOR
+    if _BATCH_EXECUTOR is None:
+        _BATCH_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="certiva-batch")
+    return _BATCH_EXECUTOR
+
+
+def start_folder_batch(
     path: Path,
     tenant: str,
     force_dummy: bool,
     quiet: bool = False,
     skip_probe: bool = False,
-) -> Tuple[Path, List[str]]:
+    force_probe: bool = False,
+) -> Tuple[List[str], "Future[Path]"]:
+    """
+    Procesa la carpeta y deja la agregación del lote (build_batch_outputs) en segundo plano.
+    Devuelve los doc_ids y un Future con la carpeta del lote, para que un script pueda lanzar
+    otros trabajos mientras se escriben CSV/RESUMEN.
+    """
+    from . import pipeline
+    from .batch_writer import build_batch_outputs
+
     if not path.exists():
         raise FileNotFoundError(f"No existe la carpeta {path}")
-    files = sorted([p for p in path.rglob("*.pdf")])
-    if not files:
+    pdfs = _iter_pdfs(path)
+    # Solo se adelantan los PDFs que necesita el probe; el resto se lista mientras se procesa.
+    head = list(islice(pdfs, PROBE_SAMPLE))
+    if not head:
         raise RuntimeError("No se encontraron PDFs.")
     if not skip_probe and not force_dummy:
-        _run_preflight_probe(path, len(files), quiet)
+        _run_preflight_probe(path, len(head), quiet, force=force_probe)
     utils.configure_logging()
-    try:
-        ocr_name, llm_name = _set_providers(force_dummy)
-        if not quiet:
-            print(f"Usando providers configurados → OCR: {ocr_name} · LLM: {llm_name}")
-    except Exception as exc:
-        if not quiet:
-            print(f"Providers reales no configurados ({exc}). Recurriendo a modo dummy.\n")
-        set_ocr_provider_override(DummyOCRProvider())
-        set_llm_provider_override(DummyLLMProvider())
-    processed = 0
-    doc_ids: List[str] = []
-    for file_path in files:
+    results: List[Tuple[Path, str]] = []
+
+    def collect(future: Future, file_path: Path) -> None:
         try:
-            doc_id = pipeline.process_file(file_path, tenant=tenant)
-            if doc_id:
-                processed += 1
-                doc_ids.append(doc_id)
-                if not quiet:
-                    print(f"  ✓ {file_path.name} → {doc_id[:8]}…")
+            doc_id = future.result()
         except Exception as exc:  # pragma: no cover
             if not quiet:
                 print(f"  × Error con {file_path.name}: {exc}")
-    _clear_overrides()
+            return
+        if doc_id:
+            results.append((file_path, doc_id))
+            if not quiet:
+                print(f"  ✓ {file_path.name} → {doc_id[:8]}…")
+
+    # Los PDFs van en paralelo (PIPELINE_CONCURRENCY) para solapar las llamadas OCR/LLM, con
+    # como mucho 2×workers en vuelo; un PDF que falla no tumba el lote.
+    workers = max(1, settings.pipeline_concurrency)
+    in_flight: Dict[Future, Path] = {}
+    with providers_context(force_dummy, quiet) as (ocr, _llm), ThreadPoolExecutor(max_workers=workers) as executor:
+        for file_path in chain(head, pdfs):
+            if len(in_flight) >= 2 * workers:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    collect(future, in_flight.pop(future))
+            future = executor.submit(pipeline.process_file, file_path, tenant=tenant, ocr_provider=ocr)
+            in_flight[future] = file_path
+        for future in as_completed(in_flight):
+            collect(future, in_flight[future])
+    # Mismo orden que el antiguo sorted(rglob): por ruta.
+    doc_ids = [doc_id for _, doc_id in sorted(results)]
+    processed = len(doc_ids)
     batch_name = f"{path.name}_{datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')}"
-    batch_dir = build_batch_outputs(doc_ids, tenant, batch_name)
     if not quiet:
         print(f"\nListo. Documentos procesados: {processed}")
+    return doc_ids, _batch_executor().submit(build_batch_outputs, doc_ids, tenant, batch_name)
+
+
+def process_folder_batch(
+    path: Path,
+    tenant: str,
+    force_dummy: bool,
+    quiet: bool = False,
+    skip_probe: bool = False,
+    force_probe: bool = False,
+) -> Tuple[Path, List[str]]:
+    doc_ids, outputs = start_folder_batch(
+        path, tenant, force_dummy, quiet=quiet, skip_probe=skip_probe, force_probe=force_probe
+    )
+    batch_dir = outputs.result()
+    if not quiet:
         print(f"Lote disponible en {batch_dir}")
     return batch_dir, doc_ids
 
@@ -147,15 +300,33 @@ def option_process_demo() -> None:
 
 def option_process_real() -> None:
     """Procesa una carpeta real usando los providers configurados."""
-    default_folder = BASE_DIR / "IN" / settings.default_tenant
-    folder_str = input(f"Carpeta a procesar [{default_folder}]: ").strip()
-    folder = Path(folder_str) if folder_str else default_folder
-    tenant_input = input(f"Tenant [{settings.default_tenant}]: ").strip() or settings.default_tenant
-    _process_folder(folder, tenant_input, force_dummy=False)
+    last = _load_last_inputs().get("process_real", {})
+    default_folder = last.get("folder") or str(BASE_DIR / "IN" / settings.default_tenant)
+    default_tenant = last.get("tenant") or settings.default_tenant
+    folder_str = input(f"Carpeta a procesar [{default_folder}]: ").strip() or default_folder
+    tenant_input = input(f"Tenant [{default_tenant}]: ").strip() or default_tenant
+    _remember_inputs("process_real", folder=folder_str, tenant=tenant_input)
+    _process_folder(Path(folder_str), tenant_input, force_dummy=False)
+
+
+def _experiment_samples_ready() -> bool:
+    """¿Hay PDFs en EXPERIMENT_DIR? Solo se vuelve a listar si cambia el mtime del directorio."""
+    global _samples_ready_mtime
+    try:
+        mtime = EXPERIMENT_DIR.stat().st_mtime_ns
+    except FileNotFoundError:
+        return False
+    if mtime == _samples_ready_mtime:
+        return True
+    with os.scandir(EXPERIMENT_DIR) as entries:
+        ready = any(entry.name.endswith(".pdf") for entry in entries)
+    if ready:
+        _samples_ready_mtime = mtime
+    return ready
 
 
 def _ensure_experiment_samples() -> None:
-    if EXPERIMENT_DIR.exists() and any(EXPERIMENT_DIR.glob("*.pdf")):
+    if _experiment_samples_ready():
         return
     print("Generando PDFs sintéticos para el experimento dual LLM...")
     try:
@@ -173,7 +344,8 @@ def _ensure_experiment_samples() -> None:
 
 def option_dual_llm_experiment() -> None:
     """Ejecuta el flujo dual LLM sobre el lote sintético y propone ajustes de threshold."""
-    utils.configure_logging()
+    from .experiments.dual_llm_tuning import run_dual_llm_experiment
+
     _ensure_experiment_samples()
     try:
         result = run_dual_llm_experiment(EXPERIMENT_DIR, settings.default_tenant)
@@ -199,8 +371,10 @@ def _format_money(value: float) -> str:
 
 def option_show_metrics() -> None:
     """Muestra métricas clave en terminal."""
-    utils.configure_logging()
-    stats = metrics.gather_stats(settings.default_tenant)
+    from . import metrics
+
+    # Solo los bloques que se muestran aquí (sin cartera AR, jobs ni IVA/aging/cashflow).
+    stats = metrics.gather_stats(settings.default_tenant, sections={"bank", "pnl", "llm"})
     print("\nResumen de métricas")
     print("-" * 40)
     print(f"Docs totales: {stats['docs_total']} | Posteados: {stats['posted']}")
@@ -245,21 +419,24 @@ def option_show_metrics() -> None:
 
 def option_list_queue() -> None:
     """Listado rápido de la cola HITL."""
-    utils.configure_logging()
+    from . import hitl_cli
+
     hitl_cli.list_queue()
     _wait_enter()
 
 
 def option_review_interactive() -> None:
     """Abre la revisión interactiva en la propia terminal."""
-    utils.configure_logging()
+    from . import hitl_cli
+
     hitl_cli.interactive()
     _wait_enter()
 
 
 def option_open_reports() -> None:
     """Imprime un resumen rápido de reportes (P&L / IVA / Cashflow)."""
-    utils.configure_logging()
+    from . import reports
+
     today = utils.today_iso()
     first_day = today[:-2] + "01"
     pnl = reports.build_pnl(settings.default_tenant, first_day, today)
@@ -293,7 +470,8 @@ MENU: Dict[str, tuple[str, Callable[[], None]]] = {
 }
 
 
-def headless_main(argv: Optional[List[str]] = None) -> None:
+@lru_cache(maxsize=1)
+def _build_headless_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description="CERTIVA launcher (headless)")
     sub = parser.add_subparsers(dest="command", required=True)
 
@@ -301,6 +479,7 @@ def headless_main(argv: Optional[List[str]] = None) -> None:
     pf_cmd.add_argument("--path", required=True)
     pf_cmd.add_argument("--tenant", default=settings.default_tenant)
     pf_cmd.add_argument("--force-dummy", action="store_true")
+    pf_cmd.add_argument("--force-probe", action="store_true", help="Ignora el azure_probe cacheado")
 
     exp_cmd = sub.add_parser("experiment-dual-llm", help="Lanza el experimento dual LLM")
     exp_cmd.add_argument("--path", default=str(EXPERIMENT_DIR), help="Carpeta de entrada")
@@ -308,13 +487,20 @@ def headless_main(argv: Optional[List[str]] = None) -> None:
 
     dump_cmd = sub.add_parser("dump-summary", help="Imprime un RESUMEN.txt")
     dump_cmd.add_argument("--lote", required=True)
+    return parser
+
 
-    args = parser.parse_args(argv)
+def headless_main(argv: Optional[List[str]] = None) -> None:
+    args = _build_headless_parser().parse_args(argv)
+    utils.configure_logging()
     if args.command == "process-folder":
-        batch_dir, _ = process_folder_batch(Path(args.path), args.tenant, args.force_dummy, quiet=False)
+        batch_dir, _ = process_folder_batch(
+            Path(args.path), args.tenant, args.force_dummy, quiet=False, force_probe=args.force_probe
+        )
         print(batch_dir)
     elif args.command == "experiment-dual-llm":
-        utils.configure_logging()
+        from .experiments.dual_llm_tuning import run_dual_llm_experiment
+
         _ensure_experiment_samples()
         result = run_dual_llm_experiment(Path(args.path), args.tenant)
         print(result.get("batch_dir"))
@@ -330,7 +516,9 @@ def main() -> None:
         headless_args = sys.argv[index + 1 :]
         headless_main(headless_args)
         return
+    # Una sola vez por proceso: las opciones del menú ya no reconfiguran el logging.
     utils.configure_logging()
+    _setup_readline()
     while True:
         _print_header()
         for key, (label, _) in MENU.items():
@@ -3,93 +3,180 @@ from __future__ import annotations
 
 import argparse
 import csv
+import sqlite3
 from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
 from . import utils
 
 
 RULES_PATH = utils.BASE_DIR / "rules" / "vendor_map.csv"
+JSON_READ_WORKERS = 8
+
+
+def _iter_rule_rows(path: Path) -> Iterator[Tuple[Tuple[str, str], List[str], List[str]]]:
+    """(clave, cabecera, fila) de vendor_map.csv con los índices resueltos una vez."""
+    with path.open("r", encoding="utf-8") as fh:
+        reader = csv.reader(fh)
+        header = next(reader, None)
+        if not header:
+            return
+        # -1 si la columna no existe.
+        index = {name: i for i, name in enumerate(header)}
+        tenant_i, nif_i, name_i = (index.get(col, -1) for col in ("tenant", "nif", "supplier_name"))
+        for row in reader:
+            width = len(row)
+            tenant = row[tenant_i] if 0 <= tenant_i < width else ""
+            nif = row[nif_i] if 0 <= nif_i < width else ""
+            name = row[name_i] if 0 <= name_i < width else ""
+            yield (tenant or "default", nif or name or ""), header, row
+
+
+@lru_cache(maxsize=4)
+def _load_vendor_rules_cached(path: Path, mtime_ns: int, size: int) -> Dict[Tuple[str, str], Dict[str, str]]:
+    return {key: dict(zip(header, row)) for key, header, row in _iter_rule_rows(path)}
+
+
+@lru_cache(maxsize=4)
+def _count_vendor_rules_cached(path: Path, mtime_ns: int, size: int) -> Dict[str, int]:
+    # Solo claves (como load_vendor_rules, una regla repetida cuenta una vez), sin dicts por fila.
+    keys = {key for key, _header, _row in _iter_rule_rows(path)}
+    return dict(Counter(rule_tenant for rule_tenant, _ in keys))
 
 
 def load_vendor_rules() -> Dict[Tuple[str, str], Dict[str, str]]:
-    if not RULES_PATH.exists():
+    """Reglas de vendor_map.csv por (tenant, nif|nombre); se reparsea solo si el CSV cambia."""
+    try:
+        stat = RULES_PATH.stat()
+    except FileNotFoundError:
         return {}
-    rules: Dict[str, Dict[str, str]] = {}
-    with RULES_PATH.open("r", encoding="utf-8") as fh:
-        reader = csv.DictReader(fh)
-        for row in reader:
-            key = (row.get("tenant") or "default", row.get("nif") or row.get("supplier_name") or "")
-            rules[key] = row
-    return rules
+    return _load_vendor_rules_cached(RULES_PATH, stat.st_mtime_ns, stat.st_size)
 
 
 def summarize_vendor_rules(tenant: Optional[str] = None) -> Dict[str, int]:
-    rules = load_vendor_rules()
-    counter: Counter[str] = Counter()
-    for (rule_tenant, _), _row in rules.items():
-        if tenant and rule_tenant.lower() != tenant.lower():
-            continue
-        counter[rule_tenant] += 1
-    return dict(counter)
+    try:
+        stat = RULES_PATH.stat()
+    except FileNotFoundError:
+        return {}
+    counts = _count_vendor_rules_cached(RULES_PATH, stat.st_mtime_ns, stat.st_size)
+    if not tenant:
+        return dict(counts)
+    return {rule_tenant: count for rule_tenant, count in counts.items() if rule_tenant.lower() == tenant.lower()}
 
 
-def find_no_rule_gaps(limit: int = 5, tenant: Optional[str] = None) -> Dict[str, int]:
+def _read_json_many(paths: List[Path]) -> List[Optional[Dict]]:
+    """Lee varios JSON en paralelo (I/O); None si el archivo no existe."""
+
+    def read(path: Path) -> Optional[Dict]:
+        try:
+            return utils.read_json(path)
+        except FileNotFoundError:
+            return None
+
+    if len(paths) < 2:
+        return [read(path) for path in paths]
+    with ThreadPoolExecutor(max_workers=min(JSON_READ_WORKERS, len(paths))) as executor:
+        return list(executor.map(read, paths))
+
+
+def _no_rule_docs(conn: sqlite3.Connection, tenant: Optional[str]) -> List[sqlite3.Row]:
+    # `issues IS NOT NULL` permite al planificador usar el índice parcial idx_docs_tenant_issues.
+    query = "SELECT doc_id FROM docs WHERE issues IS NOT NULL AND issues LIKE '%NO_RULE%'"
+    params = []
+    if tenant:
+        query += " AND tenant = ?"
+        params.append(tenant)
+    return conn.execute(query, params).fetchall()
+
+
+def _count_no_rule_gaps(docs: List[sqlite3.Row], limit: int) -> Dict[str, int]:
     gaps: Counter[str] = Counter()
-    with utils.get_connection() as conn:
-        query = "SELECT doc_id, issues FROM docs WHERE issues IS NOT NULL"
-        params = []
-        if tenant:
-            query += " AND tenant = ?"
-            params.append(tenant)
-        docs = conn.execute(query, params).fetchall()
-    for row in docs:
-        issues = row["issues"] or ""
-        if "NO_RULE" not in issues:
-            continue
-        json_path = utils.BASE_DIR / "OUT" / "json" / f"{row['doc_id']}.json"
-        if not json_path.exists():
+    json_dir = utils.BASE_DIR / "OUT" / "json"
+    for normalized in _read_json_many([json_dir / f"{row['doc_id']}.json" for row in docs]):
+        if normalized is None:
             continue
-        normalized = utils.read_json(json_path)
         supplier = normalized.get("supplier", {})
         name = supplier.get("name") or "Proveedor desconocido"
         gaps[name] += 1
     return dict(gaps.most_common(limit))
 
 
+def find_no_rule_gaps(limit: int = 5, tenant: Optional[str] = None) -> Dict[str, int]:
+    with utils.get_reader() as conn:
+        docs = _no_rule_docs(conn, tenant)
+    return _count_no_rule_gaps(docs, limit)
+
+
+def _learning_actions(conn: sqlite3.Connection) -> Dict[str, int]:
+    counts = dict(
+        conn.execute(
+            "SELECT step, COUNT(*) FROM audit WHERE step IN ('LEARN_RULE', 'HITL_ACCEPT') GROUP BY step"
+        ).fetchall()
+    )
+    return {"learn_rule": counts.get("LEARN_RULE", 0), "hitl_accept": counts.get("HITL_ACCEPT", 0)}
+
+
 def summarize_learning_actions() -> Dict[str, int]:
-    with utils.get_connection() as conn:
-        learn_rules = conn.execute("SELECT COUNT(*) FROM audit WHERE step = 'LEARN_RULE'").fetchone()[0]
-        hitl_accept = conn.execute("SELECT COUNT(*) FROM audit WHERE step = 'HITL_ACCEPT'").fetchone()[0]
-    return {"learn_rule": learn_rules, "hitl_accept": hitl_accept}
+    with utils.get_reader() as conn:
+        return _learning_actions(conn)
 
 
-def mapping_source_breakdown(tenant: Optional[str] = None) -> Dict[str, Dict[str, int]]:
-    with utils.get_connection() as conn:
-        audit_hitl = {
-            row[0] for row in conn.execute("SELECT DISTINCT doc_id FROM audit WHERE step LIKE 'HITL%'").fetchall()
-        }
-        query = "SELECT doc_id, tenant, status FROM docs WHERE status IN ('POSTED','ENTRY_READY')"
-        params = []
-        if tenant:
-            query += " AND tenant = ?"
-            params.append(tenant)
-        docs = conn.execute(query, params).fetchall()
+def _mapping_docs(conn: sqlite3.Connection, tenant: Optional[str]) -> Tuple[Set[str], List[sqlite3.Row]]:
+    audit_hitl = {
+        row[0] for row in conn.execute("SELECT DISTINCT doc_id FROM audit WHERE step LIKE 'HITL%'").fetchall()
+    }
+    query = "SELECT doc_id, status FROM docs WHERE status IN ('POSTED','ENTRY_READY')"
+    params = []
+    if tenant:
+        query += " AND tenant = ?"
+        params.append(tenant)
+    return audit_hitl, conn.execute(query, params).fetchall()
+
+
+def _count_mapping_sources(audit_hitl: Set[str], docs: List[sqlite3.Row]) -> Dict[str, Dict[str, int]]:
     totals: Counter[str] = Counter()
     autopost: Counter[str] = Counter()
-    for row in docs:
-        if tenant and row["tenant"].lower() != tenant.lower():
+    json_dir = utils.BASE_DIR / "OUT" / "json"
+    entries = _read_json_many([json_dir / f"{row['doc_id']}.entry.json" for row in docs])
+    for row, entry in zip(docs, entries):
+        if entry is None:
             continue
-        entry_path = utils.BASE_DIR / "OUT" / "json" / f"{row['doc_id']}.entry.json"
-        if not entry_path.exists():
-            continue
-        entry = utils.read_json(entry_path)
         source = entry.get("mapping_source") or "unknown"
         totals[source] += 1
         if row["status"] == "POSTED" and row["doc_id"] not in audit_hitl:
             autopost[source] += 1
-    return {"totals": dict(totals.most_common()), "auto_post": dict(autopost.most_common())}
+    # Sin ordenar: report() ordena lo que muestra.
+    return {"totals": dict(totals), "auto_post": dict(autopost)}
+
+
+def mapping_source_breakdown(tenant: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+    with utils.get_reader() as conn:
+        audit_hitl, docs = _mapping_docs(conn, tenant)
+    return _count_mapping_sources(audit_hitl, docs)
+
+
+@dataclass
+class LearningStats:
+    actions: Dict[str, int]
+    mapping: Dict[str, Dict[str, int]]
+    gaps: Dict[str, int]
+
+
+def _gather_learning_stats(limit: int, tenant: Optional[str]) -> LearningStats:
+    """Todas las consultas de report() en una sola conexión de lectura; los JSON se leen después."""
+    with utils.get_reader() as conn:
+        actions = _learning_actions(conn)
+        audit_hitl, mapping_docs = _mapping_docs(conn, tenant)
+        gap_docs = _no_rule_docs(conn, tenant)
+    return LearningStats(
+        actions=actions,
+        mapping=_count_mapping_sources(audit_hitl, mapping_docs),
+        gaps=_count_no_rule_gaps(gap_docs, limit),
+    )
 
 
 def report(limit: int = 5, tenant: Optional[str] = None) -> None:
@@ -97,22 +184,23 @@ def report(limit: int = 5, tenant: Optional[str] = None) -> None:
     print(header)
     rule_summary = summarize_vendor_rules(tenant=tenant)
     if rule_summary:
-        for tenant, count in rule_summary.items():
-            print(f"Tenant {tenant}: {count} reglas registradas")
+        for rule_tenant, count in rule_summary.items():
+            print(f"Tenant {rule_tenant}: {count} reglas registradas")
     else:
         print("No hay reglas en vendor_map.csv")
 
-    actions = summarize_learning_actions()
+    stats = _gather_learning_stats(limit, tenant)
+    actions = stats.actions
     print(f"Acciones HITL → LEARN_RULE: {actions['learn_rule']} | HITL_ACCEPT: {actions['hitl_accept']}")
 
-    mapping_stats = mapping_source_breakdown(tenant=tenant)
+    mapping_stats = stats.mapping
     if mapping_stats["totals"]:
         print("\nUso de mapping_source (total / auto-post):")
-        for source, total in mapping_stats["totals"].items():
+        for source, total in sorted(mapping_stats["totals"].items(), key=lambda item: -item[1]):
             auto = mapping_stats["auto_post"].get(source, 0)
             print(f"  - {source}: {total} docs · {auto} auto-post")
 
-    gaps = find_no_rule_gaps(limit, tenant=tenant)
+    gaps = stats.gaps
     if gaps:
         print(f"\nTop {limit} proveedores con incidencias NO_RULE:")
         for supplier, count in gaps.items():
@@ -1,47 +1,142 @@
 """Utilities for recording LLM prompts/responses in a PII-safe way."""
 from __future__ import annotations
 
-import json
+import atexit
+import logging
+import os
+import queue
 import shutil
+import threading
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
+from . import utils
 from .config import BASE_DIR, settings
-from .pii_scrub import scrub_pii
+from .pii_scrub import scrub_pii, scrub_pii_batch
+
+logger = logging.getLogger(__name__)
 
 _DEBUG_ROOT = BASE_DIR / "OUT" / "debug"
+# Escritura en segundo plano: record() no bloquea el pipeline con mkdir/write por traza.
+_QUEUE: "queue.Queue[Tuple[Path, Dict[str, bytes]]]" = queue.Queue(maxsize=1024)
+_WRITER: Optional[threading.Thread] = None
+_WRITER_LOCK = threading.Lock()
 
 
-def _sanitize(obj: Any) -> Any:
+# Separador entre hojas al escrutar el payload de una vez: no es carácter de palabra, así que
+# los \b de los patrones base se comportan igual que en los extremos de cada cadena.
+_LEAF_SEP = "\x1e"
+# Payloads sin texto libre (los monta llm_suggest: tenant, tiempos, modelo, umbral): no se escrutan.
+_SANITIZE_SKIP = frozenset({"metadata"})
+
+
+def _collect_strings(obj: Any, leaves: List[str]) -> None:
     if isinstance(obj, str):
-        return scrub_pii(
-            obj,
-            strict=settings.llm_pii_scrub_strict,
-            enabled=getattr(settings, "llm_debug_redact_pii", True),
-        )
+        leaves.append(obj)
+    elif isinstance(obj, dict):
+        for value in obj.values():
+            _collect_strings(value, leaves)
+    elif isinstance(obj, list):
+        for item in obj:
+            _collect_strings(item, leaves)
+
+
+def _replace_strings(obj: Any, scrubbed: Iterator[str]) -> Any:
+    if isinstance(obj, str):
+        return next(scrubbed)
     if isinstance(obj, dict):
-        return {key: _sanitize(value) for key, value in obj.items()}
+        return {key: _replace_strings(value, scrubbed) for key, value in obj.items()}
     if isinstance(obj, list):
-        return [_sanitize(item) for item in obj]
+        return [_replace_strings(item, scrubbed) for item in obj]
     return obj
 
 
+def _sanitize(obj: Any) -> Any:
+    if not getattr(settings, "llm_debug_redact_pii", True):
+        return obj
+    strict = settings.llm_pii_scrub_strict
+    leaves: List[str] = []
+    _collect_strings(obj, leaves)
+    if not leaves:
+        return obj
+    scrubbed: Optional[List[str]] = None
+    # Modo estricto hoja a hoja: NAME_TOKEN_PATTERN se ancla en `$` (fin de cada cadena).
+    if not strict and not any(_LEAF_SEP in leaf for leaf in leaves):
+        parts = scrub_pii(_LEAF_SEP.join(leaves)).split(_LEAF_SEP)
+        if len(parts) == len(leaves):
+            scrubbed = parts
+    if scrubbed is None:
+        scrubbed = scrub_pii_batch(leaves, strict=strict)
+    return _replace_strings(obj, iter(scrubbed))
+
+
 def is_enabled() -> bool:
     return bool(getattr(settings, "debug_llm", False))
 
 
+def _write_files(target: Path, files: Dict[str, bytes]) -> None:
+    target.mkdir(parents=True, exist_ok=True)
+    for name, data in files.items():
+        # Archivo nuevo + replace (no truncar): los lotes pueden tener hardlinks a la traza anterior.
+        tmp = target / f".{name}.json.tmp"
+        tmp.write_bytes(data)
+        os.replace(tmp, target / f"{name}.json")
+
+
+def _drain_queue(pending: "queue.Queue[Tuple[Path, Dict[str, bytes]]]") -> None:
+    while True:
+        target, files = pending.get()
+        try:
+            _write_files(target, files)
+        except OSError as exc:  # pragma: no cover - disco lleno/permisos
+            logger.warning("No se pudo escribir la traza LLM en %s: %s", target, exc)
+        finally:
+            pending.task_done()
+
+
+def _ensure_writer() -> None:
+    global _WRITER
+    with _WRITER_LOCK:
+        if _WRITER is None:
+            _WRITER = threading.Thread(
+                target=_drain_queue, args=(_QUEUE,), name="llm-debug-writer", daemon=True
+            )
+            _WRITER.start()
+            atexit.register(flush)
+
+
+def flush() -> None:
+    """Espera a que se escriban las trazas pendientes."""
+    if _WRITER is not None:
+        _QUEUE.join()
+
+
 def record(doc_id: str, tenant: str, payload: Dict[str, Any]) -> None:
     if not is_enabled():
         return
-    target = _DEBUG_ROOT / doc_id
-    target.mkdir(parents=True, exist_ok=True)
-    for name, content in payload.items():
-        sanitized = _sanitize(content)
-        path = target / f"{name}.json"
-        path.write_text(json.dumps(sanitized, ensure_ascii=False, indent=2), encoding="utf-8")
+    # Saneado y serialización aquí (el payload puede cambiar después); la escritura va al hilo.
+    pretty = bool(getattr(settings, "debug_llm_pretty", False))
+    files = {
+        name: utils.json_bytes(content if name in _SANITIZE_SKIP else _sanitize(content), pretty=pretty)
+        for name, content in payload.items()
+    }
+    _ensure_writer()
+    item = (_DEBUG_ROOT / doc_id, files)
+    try:
+        _QUEUE.put_nowait(item)
+    except queue.Full:
+        # Las trazas no son críticas: se descarta la más antigua.
+        logger.warning("Cola de trazas LLM llena; se descarta la más antigua")
+        try:
+            _QUEUE.get_nowait()
+            _QUEUE.task_done()
+        except queue.Empty:
+            pass
+        _QUEUE.put(item)
 
 
 def copy_into_batch(doc_id: str, batch_dir: Path) -> None:
+    flush()
     source = _DEBUG_ROOT / doc_id
     if not source.exists():
         return
@@ -49,4 +144,12 @@ def copy_into_batch(doc_id: str, batch_dir: Path) -> None:
     if dest.exists():
         shutil.rmtree(dest)
     dest.parent.mkdir(parents=True, exist_ok=True)
-    shutil.copytree(source, dest)
+    shutil.copytree(source, dest, copy_function=_link_or_copy)
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    """Hardlink si origen y destino comparten sistema de archivos; si no, copia normal."""
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
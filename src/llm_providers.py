@@ -2,32 +2,75 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
+import asyncio
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+import copy
+import hashlib
 import json
 import logging
+import random
+import re
+import threading
 import time
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+from types import MappingProxyType, SimpleNamespace
+from typing import Any, Callable, Dict, Mapping, Iterable, List, Optional, Sequence, Tuple, Union
+import sqlite3
+
+from . import utils
+
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
 
 logger = logging.getLogger(__name__)
 
+# openai y numpy tardan en importarse: se cargan solo al crear un responder OpenAI (en modo
+# dummy u offline no se tocan).
+
+
+def _transient_api_errors() -> Tuple[type, ...]:
+    """Errores transitorios de la API; el resto (BadRequest, auth…) no mejora reintentando."""
+    try:
+        from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError  # type: ignore
+    except ImportError:  # pragma: no cover - sin openai no hay OpenAILLMProvider
+        return ()
+    return (RateLimitError, APITimeoutError, APIConnectionError, InternalServerError)
+
+
+def _has_numpy() -> bool:
+    try:
+        import numpy  # type: ignore  # noqa: F401
+    except ImportError:  # pragma: no cover - dependencia opcional (caché semántica)
+        return False
+    return True
+
 
 class LLMProvider(ABC):
     provider_name = "undefined"
 
     def __init__(self) -> None:
-        self._last_debug_payload: Optional[Dict[str, Any]] = None
+        self._last_debug_payload: Optional[Union[Dict[str, Any], Callable[[], Dict[str, Any]]]] = None
 
     @abstractmethod
     def propose_mapping(self, invoice: Dict[str, Any]) -> Dict[str, Any]:
         """Devuelve sugerencias de cuenta/IVA/issue codes para un documento."""
         raise NotImplementedError
 
-    def set_debug_payload(self, payload: Dict[str, Any]) -> None:
+    def propose_mapping_batch(self, invoices: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Mapping de varios documentos, en el mismo orden. Por defecto, uno tras otro."""
+        return [self.propose_mapping(invoice) for invoice in invoices]
+
+    def set_debug_payload(self, payload: Union[Dict[str, Any], Callable[[], Dict[str, Any]]]) -> None:
+        """Acepta el payload o una función que lo construye (solo se llama si alguien lo consume)."""
         self._last_debug_payload = payload
 
     def consume_debug_payload(self) -> Optional[Dict[str, Any]]:
         payload = self._last_debug_payload
         self._last_debug_payload = None
-        return payload
+        return payload() if callable(payload) else payload
 
 
 class DummyLLMProvider(LLMProvider):
@@ -45,38 +88,64 @@ class DummyLLMProvider(LLMProvider):
         ("RENTA", "621000", 21.0, "Pago de rentas"),
         ("VIAJE", "624000", 21.0, "Serv. viajes"),
     ]
+    # Todas las heurísticas en una sola pasada. El lookahead deja ver coincidencias solapadas y,
+    # en una misma posición, la alternativa que gana es la de menor índice, así que el mínimo de
+    # lo encontrado respeta la prioridad de HEURISTICS igual que el antiguo bucle `token in`.
+    _TOKENS_RE = re.compile(
+        "(?=" + "|".join(f"(?P<h{i}>{re.escape(token)})" for i, (token, *_rest) in enumerate(HEURISTICS)) + ")",
+        re.IGNORECASE,
+    )
 
     def __init__(self) -> None:
         super().__init__()
 
+    @classmethod
+    def _best_heuristic(cls, texts: Iterable[str]) -> Optional[int]:
+        """Índice de la heurística más prioritaria presente en alguno de los textos."""
+        best: Optional[int] = None
+        for text in texts:
+            for match in cls._TOKENS_RE.finditer(text):
+                index = int(match.lastgroup[1:])
+                if best is None or index < best:
+                    best = index
+                    if best == 0:
+                        return best
+        return best
+
     def propose_mapping(self, invoice: Dict[str, Any]) -> Dict[str, Any]:
-        supplier = (invoice.get("supplier") or {}).get("name", "")
+        # El OCR puede dejar nombre o descripciones a None.
+        supplier = (invoice.get("supplier") or {}).get("name") or ""
         lines = invoice.get("lines") or []
-        blob = f"{supplier} " + " ".join(line.get("desc", "") for line in lines)
-        upper = blob.upper()
-        for token, account, iva, rationale in self.HEURISTICS:
-            if token in upper:
-                mapping = {
-                    "account": account,
-                    "iva_type": iva,
-                    "confidence_llm": 0.75,
-                    "rationale": rationale,
-                    "issue_codes": [],
-                    "provider": self.provider_name,
-                    "model_used": "dummy",
+        # Proveedor y descripciones por separado (ningún token lleva espacios, así que da lo mismo
+        # que el texto unido); el blob solo se monta si se consume el debug.
+        best = self._best_heuristic(chain((supplier,), (line.get("desc") or "" for line in lines)))
+
+        def blob() -> str:
+            return f"{supplier} " + " ".join(line.get("desc") or "" for line in lines)
+
+        if best is not None:
+            token, account, iva, rationale = self.HEURISTICS[best]
+            mapping = {
+                "account": account,
+                "iva_type": iva,
+                "confidence_llm": 0.75,
+                "rationale": rationale,
+                "issue_codes": [],
+                "provider": self.provider_name,
+                "model_used": "dummy",
+            }
+            self.set_debug_payload(
+                lambda: {
+                    "prompt": {
+                        "supplier": supplier,
+                        "blob": blob(),
+                        "token_match": token,
+                    },
+                    "response_raw": {"account": account, "iva_type": iva},
+                    "parsed_result": mapping,
                 }
-                self.set_debug_payload(
-                    {
-                        "prompt": {
-                            "supplier": supplier,
-                            "blob": blob,
-                            "token_match": token,
-                        },
-                        "response_raw": {"account": account, "iva_type": iva},
-                        "parsed_result": mapping,
-                    }
-                )
-                return mapping
+            )
+            return mapping
         mapping = {
             "account": "629000",
             "iva_type": 21.0,
@@ -87,8 +156,8 @@ class DummyLLMProvider(LLMProvider):
             "model_used": "dummy",
         }
         self.set_debug_payload(
-            {
-                "prompt": {"supplier": supplier, "blob": blob, "token_match": None},
+            lambda: {
+                "prompt": {"supplier": supplier, "blob": blob(), "token_match": None},
                 "response_raw": {"account": "629000", "iva_type": 21.0},
                 "parsed_result": mapping,
             }
@@ -98,54 +167,379 @@ class DummyLLMProvider(LLMProvider):
 
 
 
+def _as_namespace(value: Any) -> Any:
+    """Convierte el JSON de la Batch API en objetos con atributos, como los del SDK."""
+    if isinstance(value, dict):
+        return SimpleNamespace(**{key: _as_namespace(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return [_as_namespace(item) for item in value]
+    return value
+
+
+_Result = Tuple[Dict[str, Any], Dict[str, Any], Dict[str, int]]
+
+
+def _dumps(data: Any, sort_keys: bool = False) -> str:
+    """JSON compacto en UTF-8 (sin escapar acentos); orjson si está disponible."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+        return orjson.dumps(data, default=str, option=option).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False, sort_keys=sort_keys, default=str, separators=(",", ":"))
+
+
+def _loads(raw: Union[str, bytes]) -> Any:
+    if not raw:
+        return {}
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+class _ResponseCache:
+    """LRU con TTL para respuestas del LLM; compartida entre hilos."""
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: "OrderedDict[bytes, Tuple[float, _Result]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: bytes) -> Optional[_Result]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and time.monotonic() - item[0] < self.ttl:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return item[1]
+            if item is not None:
+                del self._items[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: bytes, value: _Result) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._items[key] = (time.monotonic(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def info(self) -> Dict[str, int]:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._items), "maxsize": self.maxsize}
+
+
+class _PersistentResponseCache:
+    """
+    Segundo nivel bajo _ResponseCache en la tabla llm_response_cache: sobrevive a reinicios del
+    worker. Cualquier error de BD o fila corrupta se trata como fallo de caché (nunca rompe la
+    llamada). Solo se guardan mapping y uso: el debug lleva el payload sin redactar (proveedor,
+    NIF) y no debe quedarse en disco.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.prune()
+
+    def get(self, key: bytes) -> Optional[_Result]:
+        try:
+            with utils.get_reader() as conn:
+                row = conn.execute(
+                    "SELECT value FROM llm_response_cache WHERE key = ? AND created_at >= ?",
+                    (key.hex(), time.time() - self.ttl),
+                ).fetchone()
+        except sqlite3.Error as exc:
+            logger.debug("Caché persistente LLM no disponible: %s", exc)
+            row = None
+        try:
+            data, usage = _loads(row["value"]) if row is not None else (None, None)
+        except (ValueError, TypeError) as exc:
+            logger.debug("Fila corrupta en la caché persistente LLM: %s", exc)
+            data = usage = None
+        if not isinstance(data, dict) or not isinstance(usage, dict):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data, {}, usage
+
+    def put(self, key: bytes, model_id: str, value: _Result) -> None:
+        try:
+            with utils.get_connection() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_response_cache(key, model, value, created_at) VALUES(?, ?, ?, ?)",
+                    (key.hex(), model_id, _dumps([value[0], value[2]]), time.time()),
+                )
+        except sqlite3.Error as exc:
+            logger.debug("No se pudo guardar en la caché persistente LLM: %s", exc)
+
+    def prune(self) -> None:
+        """Borra las filas caducadas (se llama al crear el responder, una vez por proceso)."""
+        try:
+            with utils.get_connection() as conn:
+                conn.execute("DELETE FROM llm_response_cache WHERE created_at < ?", (time.time() - self.ttl,))
+        except sqlite3.Error as exc:
+            logger.debug("No se pudo purgar la caché persistente LLM: %s", exc)
+
+
+class _SemanticCache:
+    """
+    Respuestas indexadas por embedding normalizado: una factura casi igual a otra ya vista
+    (proveedor escrito distinto, descripción con otra redacción) reutiliza su mapping si el
+    coseno supera `threshold`. Un índice por modelo (la respuesta de mini no vale como la de
+    premium). Matriz numpy (maxsize, dim) reservada al primer alta de cada modelo y usada como
+    buffer circular: al llenarse, cada alta pisa la fila más antigua (FIFO) sin copiar nada.
+    """
+
+    def __init__(self, threshold: float, maxsize: int = 10_000) -> None:
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self._matrices: Dict[str, Any] = {}
+        self._values: Dict[str, List[Optional[_Result]]] = {}
+        # Altas totales por modelo: la siguiente fila es count % maxsize.
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, model_id: str, vector: Any) -> Optional[_Result]:
+        with self._lock:
+            matrix = self._matrices.get(model_id)
+            if matrix is None:
+                return None
+            filled = min(self._counts[model_id], self.maxsize)
+            sims = matrix[:filled] @ vector
+            best = int(sims.argmax())
+            if float(sims[best]) >= self.threshold:
+                return self._values[model_id][best]
+        return None
+
+    def add(self, model_id: str, vector: Any, value: _Result) -> None:
+        import numpy as np  # type: ignore
+
+        with self._lock:
+            matrix = self._matrices.get(model_id)
+            if matrix is None:
+                matrix = self._matrices[model_id] = np.empty((self.maxsize, vector.shape[0]), dtype=np.float32)
+                self._values[model_id] = [None] * self.maxsize
+                self._counts[model_id] = 0
+            slot = self._counts[model_id] % self.maxsize
+            matrix[slot] = vector
+            self._values[model_id][slot] = value
+            self._counts[model_id] += 1
+
+
+_PGC_ACCOUNTS = (
+    ("600000", "Compras de mercaderías"),
+    ("602000", "Compras de otros aprovisionamientos (material de oficina, consumibles)"),
+    ("621000", "Arrendamientos y cánones (alquiler de locales, renting)"),
+    ("622000", "Reparaciones y conservación"),
+    ("623000", "Servicios de profesionales independientes (asesoría, abogados, notaría)"),
+    ("624000", "Transportes"),
+    ("625000", "Primas de seguros"),
+    ("626000", "Servicios bancarios y similares"),
+    ("627000", "Publicidad, propaganda y relaciones públicas"),
+    ("628000", "Suministros (electricidad, agua, gas)"),
+    ("628100", "Suministros de telefonía e internet"),
+    ("629000", "Otros servicios (software, SaaS, soporte IT)"),
+    ("629200", "Viajes y desplazamientos"),
+    ("629300", "Mantenimiento"),
+    ("629500", "Hostelería y restauración"),
+    ("631000", "Otros tributos"),
+    ("649000", "Otros gastos sociales (formación)"),
+    ("700000", "Ventas de mercaderías"),
+    ("705000", "Prestaciones de servicios"),
+    ("705200", "Ventas con ticket"),
+    ("705500", "Prestaciones de servicios intracomunitarias"),
+)
+
+_FEW_SHOT_EXAMPLES = (
+    (
+        {"supplier": {"name": "Iberdrola Clientes SAU"}, "totals": {"base": 82.5, "vat": 17.33, "gross": 99.83},
+         "doc_type": "invoice", "category": "suministros", "lines": [{"desc": "Consumo eléctrico marzo"}]},
+        {"account": "628000", "iva_type": 21, "issue_codes": [], "rationale": "Suministro eléctrico"},
+    ),
+    (
+        {"supplier": {"name": "Gestoría López SL"}, "totals": {"base": 300.0, "vat": 63.0, "gross": 363.0},
+         "doc_type": "invoice", "category": "servicios_prof", "lines": [{"desc": "Honorarios asesoría fiscal T1"}]},
+        {"account": "623000", "iva_type": 21, "issue_codes": [], "rationale": "Servicios profesionales"},
+    ),
+    (
+        {"supplier": {"name": "Librería Central"}, "totals": {"base": 40.0, "vat": 1.6, "gross": 41.6},
+         "doc_type": "invoice", "category": None, "lines": [{"desc": "Manuales técnicos"}]},
+        {"account": "602000", "iva_type": 4, "issue_codes": [], "rationale": "Libros con IVA superreducido"},
+    ),
+    (
+        {"supplier": {"name": "Cloud Services Ireland Ltd"}, "totals": {"base": 120.0, "vat": 0.0, "gross": 120.0},
+         "doc_type": "invoice", "category": "intracomunitaria", "lines": [{"desc": "Suscripción mensual"}]},
+        {"account": "629000", "iva_type": 0, "issue_codes": ["INTRACOM_IVA0"],
+         "rationale": "Servicio intracomunitario con inversión del sujeto pasivo"},
+    ),
+    (
+        {"supplier": {"name": "Telefónica de España SAU"}, "totals": {"base": -25.0, "vat": -5.25, "gross": -30.25},
+         "doc_type": "credit_note", "category": "telefonia", "lines": [{"desc": "Abono por incidencia en fibra"}]},
+        {"account": "628100", "iva_type": 21, "issue_codes": ["CREDIT_NOTE"],
+         "rationale": "Abono de un suministro de telecomunicaciones"},
+    ),
+)
+
+
+PAYLOAD_DESC_CHARS = 120
+PAYLOAD_MAX_LINES = 5
+_PAYLOAD_SUPPLIER_FIELDS = ("name", "nif", "vat", "country")
+
+
+def _round_amount(value: Any) -> Any:
+    return round(value, 2) if isinstance(value, float) else value
+
+
+def _drop_empty(value: Any) -> Any:
+    """Quita None, cadenas vacías y contenedores que quedan vacíos tras limpiar."""
+    if isinstance(value, dict):
+        cleaned = {key: _drop_empty(item) for key, item in value.items()}
+        return {key: item for key, item in cleaned.items() if item not in (None, "", {}, [])}
+    if isinstance(value, list):
+        return [item for item in (_drop_empty(item) for item in value) if item not in (None, "", {}, [])]
+    return value
+
+
+def _build_system_prompt(schema: Dict[str, Any]) -> str:
+    accounts = "\n".join(f"- {code}: {label}" for code, label in _PGC_ACCOUNTS)
+    examples = "\n\n".join(
+        f"Factura:\n{json.dumps(invoice, ensure_ascii=False, sort_keys=True)}\n"
+        f"Respuesta:\n{json.dumps(answer, ensure_ascii=False, sort_keys=True)}"
+        for invoice, answer in _FEW_SHOT_EXAMPLES
+    )
+    return (
+        "Eres un asistente contable experto en el Plan General Contable español. "
+        "Recibirás el JSON de una factura normalizada y debes devolver exclusivamente "
+        "un JSON con los campos account (texto, cuenta 6xx/7xx), iva_type (número) e issue_codes "
+        "(array de strings si detectas anomalías). No añadas texto adicional.\n\n"
+        "Esquema JSON de la respuesta:\n"
+        f"{json.dumps(schema, ensure_ascii=False, sort_keys=True)}\n\n"
+        "Criterios:\n"
+        "- Facturas recibidas (doc_type invoice): cuentas del grupo 6. Ventas y abonos emitidos: grupo 7.\n"
+        "- Usa la categoría si viene informada; si no, decide por el proveedor y las descripciones de línea.\n"
+        "- iva_type es el tipo aplicado (21, 10, 4 o 0). Calcúlalo con totals.vat / totals.base si hace falta.\n"
+        "- Operaciones intracomunitarias: iva_type 0 e issue code INTRACOM_IVA0.\n"
+        "- Si base + IVA no cuadra con el total, añade AMOUNT_MISMATCH.\n"
+        "- Abonos y notas de crédito (importes negativos o doc_type *_credit_note): misma cuenta que la "
+        "operación original e issue code CREDIT_NOTE.\n"
+        "- Usa solo esos issue codes; si no aplica ninguno, devuelve issue_codes vacío.\n"
+        "- Tickets de restaurante o cafetería: 629500. Billetes, hoteles y kilometraje: 629200.\n"
+        "- Licencias de software, hosting y suscripciones SaaS: 629000. Telefonía móvil y fibra: 628100.\n"
+        "- No inventes cuentas fuera del PGC ni subcuentas con menos de 6 dígitos.\n"
+        "- rationale: una frase corta en español.\n\n"
+        f"Cuentas habituales:\n{accounts}\n\n"
+        f"Ejemplos:\n\n{examples}"
+    )
+
+
+_MAPPING_SCHEMA: Mapping[str, Any] = MappingProxyType(
+    {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "mapping",
+            "schema": {
+                "type": "object",
+                "properties": {
+                    "account": {"type": "string"},
+                    "iva_type": {"type": ["number", "null"]},
+                    "issue_codes": {
+                        "type": "array",
+                        "items": {"type": "string"},
+                        "default": [],
+                    },
+                    "rationale": {"type": "string"},
+                },
+                "required": ["account", "iva_type", "issue_codes"],
+                "additionalProperties": False,
+            },
+        },
+    }
+)
+
+# Prefijo largo e idéntico byte a byte en todas las llamadas (la factura va detrás, en el mensaje
+# de usuario) para aprovechar la caché automática de prompts de OpenAI.
+_MAPPING_SYSTEM_PROMPT = _build_system_prompt(_MAPPING_SCHEMA["json_schema"]["schema"])
+_MAPPING_SYSTEM_MESSAGE = {"role": "system", "content": _MAPPING_SYSTEM_PROMPT}
+
+
 class _OpenAIResponder:
     """Wrapper alrededor del cliente OpenAI Responses API."""
 
-    def __init__(self, api_key: str, api_base: str) -> None:
+    def __init__(
+        self,
+        api_key: str,
+        api_base: str,
+        cache_size: int = 10_000,
+        cache_ttl: float = 3600.0,
+        semantic_threshold: float = 0.0,
+        embedding_model: str = "text-embedding-3-small",
+        persist_ttl: float = 0.0,
+    ) -> None:
         try:
             from openai import OpenAI  # type: ignore
         except ImportError as exc:  # pragma: no cover
             raise RuntimeError("Instala openai>=1.0 para usar OpenAILLMProvider") from exc
         self._client = OpenAI(api_key=api_key, base_url=api_base)
-        self._schema = {
-            "type": "json_schema",
-            "json_schema": {
-                "name": "mapping",
-                "schema": {
-                    "type": "object",
-                    "properties": {
-                        "account": {"type": "string"},
-                        "iva_type": {"type": ["number", "null"]},
-                        "issue_codes": {
-                            "type": "array",
-                            "items": {"type": "string"},
-                            "default": [],
-                        },
-                        "rationale": {"type": "string"},
-                    },
-                    "required": ["account", "iva_type", "issue_codes"],
-                    "additionalProperties": False,
-                },
-            },
-        }
-        self._system_prompt = (
-            "Eres un asistente contable experto en el Plan General Contable español. "
-            "Recibirás el JSON de una factura normalizada y debes devolver exclusivamente "
-            "un JSON con los campos account (texto, cuenta 6xx/7xx), iva_type (número) e issue_codes "
-            "(array de strings si detectas anomalías). No añadas texto adicional."
+        # JSON mal formado en la respuesta: otro intento suele arreglarlo.
+        self._retryable_errors = _transient_api_errors() + (ValueError,)
+        self._api_key = api_key
+        self._api_base = api_base
+        # Facturas con el mismo payload (mismo proveedor y líneas) dan la misma respuesta.
+        self._response_cache = _ResponseCache(cache_size, cache_ttl)
+        # Nivel en SQLite para no volver a pagar tras un reinicio (persist_ttl 0 lo desactiva).
+        self._persistent_cache = _PersistentResponseCache(persist_ttl) if persist_ttl > 0 else None
+        # Desactivada con umbral 0 o sin numpy.
+        self._semantic_cache = (
+            _SemanticCache(semantic_threshold, max(cache_size, 1))
+            if semantic_threshold > 0 and _has_numpy()
+            else None
         )
+        self._embedding_model = embedding_model
+        # Esquema y prompt de sistema son constantes de módulo: se construyen una vez por proceso.
+        self._schema = _MAPPING_SCHEMA
+        self._system_message = _MAPPING_SYSTEM_MESSAGE
+        self._system_prompt = self._system_message["content"]
+        # Prompt (con ejemplos) y esquema entran en la clave de caché: tras desplegar otro prompt
+        # la caché persistente no devuelve mappings del anterior.
+        self._prompt_digest = hashlib.blake2b(
+            _dumps([self._system_prompt, dict(self._schema)], sort_keys=True).encode("utf-8"), digest_size=8
+        ).hexdigest()
 
     @staticmethod
     def _invoice_payload(invoice: Dict[str, Any]) -> Dict[str, Any]:
-        lines = (invoice.get("lines") or [])[:5]
-        return {
-            "supplier": invoice.get("supplier"),
-            "totals": invoice.get("totals"),
-            "invoice": invoice.get("invoice"),
-            "doc_type": (invoice.get("metadata") or {}).get("doc_type"),
-            "category": (invoice.get("metadata") or {}).get("category"),
-            "lines": lines,
-        }
+        """
+        Solo los campos que ayudan a clasificar (misma forma que los ejemplos del prompt): sin
+        número ni fechas, descripciones recortadas, importes redondeados y sin nulos.
+        """
+        supplier = invoice.get("supplier") or {}
+        totals = invoice.get("totals") or {}
+        metadata = invoice.get("metadata") or {}
+        payload = _drop_empty(
+            {
+                "supplier": {field: supplier.get(field) for field in _PAYLOAD_SUPPLIER_FIELDS},
+                "totals": {field: _round_amount(totals.get(field)) for field in ("base", "vat", "gross")},
+                "currency": (invoice.get("invoice") or {}).get("currency"),
+                "doc_type": metadata.get("doc_type"),
+                "category": metadata.get("category"),
+                "lines": [
+                    {
+                        "desc": (line.get("desc") or "")[:PAYLOAD_DESC_CHARS],
+                        "vat_rate": _round_amount(line.get("vat_rate")),
+                        "amount": _round_amount(line.get("amount")),
+                    }
+                    for line in (invoice.get("lines") or [])[:PAYLOAD_MAX_LINES]
+                ],
+            }
+        )
+        if logger.isEnabledFor(logging.DEBUG):
+            full = len(_dumps({key: invoice.get(key) for key in ("supplier", "totals", "invoice", "metadata", "lines")}))
+            logger.debug("Payload LLM %s: %d -> %d bytes", invoice.get("doc_id", "-"), full, len(_dumps(payload)))
+        return payload
 
     @staticmethod
     def _extract_text_blocks(response: Any) -> str:  # pragma: no cover - structure depends on SDK
@@ -164,7 +558,7 @@ class _OpenAIResponder:
     @staticmethod
     def _usage_payload(usage: Any) -> Dict[str, int]:
         if usage is None:
-            return {"prompt_tokens": 0, "completion_tokens": 0}
+            return {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
         prompt = getattr(usage, "prompt_tokens", None)
         if prompt is None:
             prompt = getattr(usage, "input_tokens", 0)
@@ -179,18 +573,180 @@ class _OpenAIResponder:
             completion_val = int(completion or 0)
         except (TypeError, ValueError):
             completion_val = 0
-        return {"prompt_tokens": prompt_val, "completion_tokens": completion_val}
+        details = getattr(usage, "prompt_tokens_details", None) or getattr(usage, "input_tokens_details", None)
+        try:
+            cached_val = int(getattr(details, "cached_tokens", 0) or 0)
+        except (TypeError, ValueError):
+            cached_val = 0
+        if prompt_val:
+            logger.debug("Tokens de prompt en caché: %s/%s (%.0f%%)", cached_val, prompt_val, 100 * cached_val / prompt_val)
+        return {"prompt_tokens": prompt_val, "completion_tokens": completion_val, "cached_tokens": cached_val}
 
-    def call(self, model_id: str, invoice: Dict[str, Any], temperature: float = 0.0) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, int]]:
+    RETRY_ATTEMPTS = 3
+    RETRY_BACKOFF = 0.5
+    RETRY_MAX_SLEEP = 8.0
+    BATCH_FINAL_STATES = frozenset({"completed", "failed", "expired", "cancelled"})
+
+    def _build_inputs(self, invoice: Dict[str, Any]) -> Tuple[Dict[str, Any], List[Dict[str, str]]]:
         payload_dict = self._invoice_payload(invoice)
-        payload = json.dumps(payload_dict, ensure_ascii=False)
+        payload = _dumps(payload_dict)
         inputs = [
-            {"role": "system", "content": self._system_prompt},
+            self._system_message,
             {"role": "user", "content": payload},
         ]
-        delays = [0.0, 0.8, 2.0]
-        last_error: Optional[Exception] = None
-        for attempt, delay in enumerate(delays, start=1):
+        return payload_dict, inputs
+
+    def _cache_key(self, model_id: str, payload_dict: Dict[str, Any], temperature: float = 0.0) -> bytes:
+        canonical = _dumps(payload_dict, sort_keys=True)
+        raw = "\x00".join((model_id, self._prompt_digest, repr(float(temperature)), canonical))
+        return hashlib.blake2b(raw.encode("utf-8"), digest_size=16).digest()
+
+    def _cached(self, key: bytes) -> Optional[_Result]:
+        """Copia de la respuesta guardada, sin tokens (no se ha pagado nada)."""
+        hit = self._response_cache.get(key)
+        if hit is None and self._persistent_cache is not None:
+            hit = self._persistent_cache.get(key)
+            if hit is not None:
+                self._response_cache.put(key, hit)
+        if hit is None:
+            return None
+        data, debug, _usage = copy.deepcopy(hit)
+        data["duration_ms"] = 0
+        debug["cache_hit"] = True
+        return data, debug, {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}
+
+    def _remember(self, key: bytes, model_id: str, result: _Result) -> _Result:
+        self._response_cache.put(key, copy.deepcopy(result))
+        if self._persistent_cache is not None:
+            self._persistent_cache.put(key, model_id, result)
+        return result
+
+    def _embed(self, payload: str) -> Any:
+        import numpy as np  # type: ignore
+
+        response = self._client.embeddings.create(model=self._embedding_model, input=payload)
+        vector = np.asarray(response.data[0].embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+    def _semantic_lookup(self, model_id: str, key: bytes, payload: str) -> Tuple[Optional[_Result], Any]:
+        """Busca por similitud; si acierta, lo sube también a la caché exacta."""
+        try:
+            vector = self._embed(payload)
+        except Exception as exc:  # pragma: no cover - sin embeddings se sigue sin caché
+            logger.warning("Embedding OpenAI falló, se omite la caché semántica: %s", exc)
+            return None, None
+        hit = self._semantic_cache.lookup(model_id, vector)
+        if hit is None:
+            return None, vector
+        self._response_cache.put(key, copy.deepcopy(hit))
+        data, debug, _usage = copy.deepcopy(hit)
+        data["duration_ms"] = 0
+        debug["cache_hit"] = "semantic"
+        return (data, debug, {"prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0}), vector
+
+    def cache_info(self) -> Dict[str, int]:
+        info = self._response_cache.info()
+        if self._persistent_cache is not None:
+            info["persistent_hits"] = self._persistent_cache.hits
+            info["persistent_misses"] = self._persistent_cache.misses
+        return info
+
+    def _parse_response(
+        self, response: Any, payload_dict: Dict[str, Any], start: float
+    ) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, int]]:
+        raw_text = self._extract_text_blocks(response)
+        data = _loads(raw_text)
+        data.setdefault("issue_codes", [])
+        data["duration_ms"] = int((time.perf_counter() - start) * 1000)
+        debug = {
+            "system_prompt": self._system_prompt,
+            "prompt": payload_dict,
+            "response_text": raw_text,
+        }
+        usage = self._usage_payload(getattr(response, "usage", None))
+        return data, debug, usage
+
+    def submit_batch(self, model_id: str, invoices: Dict[str, Dict[str, Any]]) -> str:
+        """Sube las facturas como JSONL (una petición /v1/responses por custom_id) a la Batch API."""
+        lines = []
+        for custom_id, invoice in invoices.items():
+            _payload_dict, inputs = self._build_inputs(invoice)
+            request = {
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/responses",
+                "body": {"model": model_id, "max_output_tokens": 256, "input": inputs},
+            }
+            lines.append(_dumps(request))
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        batch_file = self._client.files.create(file=("certiva_batch.jsonl", data), purpose="batch")
+        batch = self._client.batches.create(
+            input_file_id=batch_file.id, endpoint="/v1/responses", completion_window="24h"
+        )
+        return batch.id
+
+    def collect_batch(
+        self,
+        batch_id: str,
+        invoices: Dict[str, Dict[str, Any]],
+        poll_interval: float = 30.0,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Union[Tuple[Dict[str, Any], Dict[str, Any], Dict[str, int]], Exception]]:
+        """Espera a que termine el batch y devuelve, por custom_id, el resultado o la excepción."""
+        start = time.perf_counter()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        batch = self._client.batches.retrieve(batch_id)
+        while batch.status not in self.BATCH_FINAL_STATES:
+            if deadline is not None and time.monotonic() >= deadline:
+                raise RuntimeError(f"Batch {batch_id} sin terminar ({batch.status})")
+            time.sleep(poll_interval)
+            batch = self._client.batches.retrieve(batch_id)
+        results: Dict[str, Union[Tuple[Dict[str, Any], Dict[str, Any], Dict[str, int]], Exception]] = {}
+        output_file_id = getattr(batch, "output_file_id", None)
+        if output_file_id:
+            for raw_line in self._client.files.content(output_file_id).text.splitlines():
+                if not raw_line.strip():
+                    continue
+                line = _loads(raw_line)
+                custom_id = line.get("custom_id")
+                if custom_id not in invoices:
+                    continue
+                response = line.get("response") or {}
+                if line.get("error") or int(response.get("status_code") or 0) >= 400:
+                    results[custom_id] = RuntimeError(str(line.get("error") or response.get("body")))
+                    continue
+                try:
+                    payload_dict = self._invoice_payload(invoices[custom_id])
+                    results[custom_id] = self._parse_response(_as_namespace(response.get("body") or {}), payload_dict, start)
+                except ValueError as exc:
+                    results[custom_id] = RuntimeError(str(exc))
+        for custom_id in invoices:
+            results.setdefault(custom_id, RuntimeError(f"Batch {batch_id} {batch.status}: sin respuesta"))
+        return results
+
+    def _retry_delay(self, model_id: str, exc: Exception, attempt: int) -> float:
+        """Espera antes del siguiente intento (backoff exponencial con jitter completo) o relanza."""
+        logger.warning("LLM OpenAI error (%s): %s", model_id, exc)
+        if attempt >= self.RETRY_ATTEMPTS or not isinstance(exc, self._retryable_errors):
+            raise RuntimeError(str(exc)) from exc
+        return random.uniform(0.0, min(self.RETRY_MAX_SLEEP, self.RETRY_BACKOFF * 2**attempt))
+
+    def call(self, model_id: str, invoice: Dict[str, Any], temperature: float = 0.0) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, int]]:
+        payload_dict, inputs = self._build_inputs(invoice)
+        key = self._cache_key(model_id, payload_dict, temperature)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        vector = None
+        # Con temperatura > 0 la respuesta no es reproducible: no se reutiliza por similitud.
+        if self._semantic_cache is not None and temperature <= 0:
+            cached, vector = self._semantic_lookup(model_id, key, inputs[1]["content"])
+            if cached is not None:
+                return cached
+        attempt = 0
+        while True:
+            attempt += 1
             try:
                 start = time.perf_counter()
                 response = self._client.responses.create(
@@ -198,31 +754,69 @@ class _OpenAIResponder:
                     max_output_tokens=256,
                     input=inputs,
                 )
-                raw_text = self._extract_text_blocks(response)
-                data = json.loads(raw_text or "{}")
-                data.setdefault("issue_codes", [])
-                data["duration_ms"] = int((time.perf_counter() - start) * 1000)
-                debug = {
-                    "system_prompt": self._system_prompt,
-                    "prompt": payload_dict,
-                    "response_text": raw_text,
-                }
-                usage = self._usage_payload(getattr(response, "usage", None))
-                return data, debug, usage
-            except Exception as exc:  # pragma: no cover
-                last_error = exc
-                logger.warning("LLM OpenAI error (%s): %s", model_id, exc)
-                if attempt < len(delays):
-                    time.sleep(delay)
-                    continue
-                raise RuntimeError(str(exc)) from exc
-        raise RuntimeError(str(last_error))
+                result = self._remember(key, model_id, self._parse_response(response, payload_dict, start))
+                if vector is not None:
+                    self._semantic_cache.add(model_id, vector, copy.deepcopy(result))
+                return result
+            except Exception as exc:
+                time.sleep(self._retry_delay(model_id, exc, attempt))
+
+    async def _acall(
+        self, client: Any, model_id: str, invoice: Dict[str, Any]
+    ) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, int]]:
+        """Igual que call() pero con el cliente async; los reintentos esperan con asyncio.sleep."""
+        payload_dict, inputs = self._build_inputs(invoice)
+        key = self._cache_key(model_id, payload_dict)
+        cached = self._cached(key)
+        if cached is not None:
+            return cached
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                start = time.perf_counter()
+                response = await client.responses.create(
+                    model=model_id,
+                    max_output_tokens=256,
+                    input=inputs,
+                )
+                return self._remember(key, model_id, self._parse_response(response, payload_dict, start))
+            except Exception as exc:
+                await asyncio.sleep(self._retry_delay(model_id, exc, attempt))
+
+    def _async_client(self) -> Any:
+        from openai import AsyncOpenAI  # type: ignore
+
+        return AsyncOpenAI(api_key=self._api_key, base_url=self._api_base)
+
+    async def call_many(
+        self, model_id: str, invoices: Sequence[Dict[str, Any]], concurrency: int = 20
+    ) -> List[Union[Tuple[Dict[str, Any], Dict[str, Any], Dict[str, int]], Exception]]:
+        """
+        Lanza las peticiones de `invoices` a la vez (como mucho `concurrency` en vuelo) y devuelve
+        los resultados en el mismo orden. Un fallo no corta el resto: se devuelve la excepción.
+        """
+        sem = asyncio.Semaphore(max(1, concurrency))
+        client = self._async_client()
+
+        async def _bounded(invoice: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, int]]:
+            async with sem:
+                return await self._acall(client, model_id, invoice)
+
+        try:
+            return await asyncio.gather(*(_bounded(invoice) for invoice in invoices), return_exceptions=True)
+        finally:
+            close = getattr(client, "close", None)
+            if close is not None:
+                await close()
 
 
 class OpenAILLMProvider(LLMProvider):
     """LLM simple basado en un único modelo OpenAI."""
 
     provider_name = "openai"
+    # La Batch API factura a mitad de precio.
+    BATCH_DISCOUNT = 0.5
 
     def __init__(
         self,
@@ -231,6 +825,11 @@ class OpenAILLMProvider(LLMProvider):
         api_base: str,
         responder: Optional[_OpenAIResponder] = None,
         pricing: Optional[Dict[str, Dict[str, float]]] = None,
+        batch_concurrency: int = 20,
+        cache_size: int = 10_000,
+        cache_ttl: float = 3600.0,
+        semantic_threshold: float = 0.0,
+        persist_ttl: float = 0.0,
     ) -> None:
         if not api_key:
             raise RuntimeError("OPENAI_API_KEY no configurada")
@@ -238,8 +837,11 @@ class OpenAILLMProvider(LLMProvider):
             raise RuntimeError("OPENAI_MODEL no configurado")
         super().__init__()
         self.model = model
-        self._responder = responder or _OpenAIResponder(api_key, api_base)
+        self._responder = responder or _OpenAIResponder(
+            api_key, api_base, cache_size, cache_ttl, semantic_threshold=semantic_threshold, persist_ttl=persist_ttl
+        )
         self.pricing = pricing or {}
+        self.batch_concurrency = batch_concurrency
 
     def _finalize(self, mapping: Dict[str, Any], model_used: str) -> Dict[str, Any]:
         issues = mapping.get("issue_codes") or []
@@ -258,15 +860,19 @@ class OpenAILLMProvider(LLMProvider):
         out_rate = float(rate.get("out", 0.0))
         return round((prompt_tokens / 1_000_000) * in_rate + (completion_tokens / 1_000_000) * out_rate, 6)
 
+    def _with_usage(self, mapping: Dict[str, Any], usage: Dict[str, int]) -> Dict[str, Any]:
+        finalized = self._finalize(mapping, "mini")
+        prompt_tokens = int(usage.get("prompt_tokens", 0))
+        completion_tokens = int(usage.get("completion_tokens", 0))
+        finalized["prompt_tokens"] = prompt_tokens
+        finalized["completion_tokens"] = completion_tokens
+        finalized["cost_eur"] = self._cost_for("mini", prompt_tokens, completion_tokens)
+        return finalized
+
     def propose_mapping(self, invoice: Dict[str, Any]) -> Dict[str, Any]:
         try:
             mapping, debug, usage = self._responder.call(self.model, invoice)
-            finalized = self._finalize(mapping, "mini")
-            prompt_tokens = int(usage.get("prompt_tokens", 0))
-            completion_tokens = int(usage.get("completion_tokens", 0))
-            finalized["prompt_tokens"] = prompt_tokens
-            finalized["completion_tokens"] = completion_tokens
-            finalized["cost_eur"] = self._cost_for("mini", prompt_tokens, completion_tokens)
+            finalized = self._with_usage(mapping, usage)
             self.set_debug_payload(
                 {
                     "prompt": debug.get("prompt"),
@@ -277,32 +883,122 @@ class OpenAILLMProvider(LLMProvider):
             return finalized
         except RuntimeError as exc:
             logger.warning("LLM OpenAI error definitivo: %s", exc)
-            return {
-                "account": "",
-                "iva_type": None,
-                "confidence_llm": 0.0,
-                "rationale": str(exc),
-                "issue_codes": ["LLM_ERROR"],
-                "provider": self.provider_name,
-                "model_used": "mini",
-                "prompt_tokens": 0,
-                "completion_tokens": 0,
-                "cost_eur": 0.0,
-            }
+            return self._error_mapping(exc)
+
+    def propose_mapping_batch(self, invoices: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Varias facturas en paralelo con el cliente async (batch_concurrency en vuelo). Usa
+        asyncio.run, así que solo vale desde código síncrono. No deja debug payload.
+        Las facturas con el mismo payload (misma clave que la caché de respuestas) se envían una
+        sola vez; las repetidas reciben una copia con coste 0.
+        """
+        if not invoices:
+            return []
+        groups: Dict[bytes, List[int]] = {}
+        for index, invoice in enumerate(invoices):
+            key = self._responder._cache_key(self.model, self._responder._invoice_payload(invoice))
+            groups.setdefault(key, []).append(index)
+        unique = [invoices[indexes[0]] for indexes in groups.values()]
+        results = asyncio.run(self._responder.call_many(self.model, unique, self.batch_concurrency))
+        mappings: List[Optional[Dict[str, Any]]] = [None] * len(invoices)
+        for indexes, result in zip(groups.values(), results):
+            if isinstance(result, Exception):
+                logger.warning("LLM OpenAI error definitivo: %s", result)
+                mapping = self._error_mapping(result)
+            else:
+                raw_mapping, _debug, usage = result
+                mapping = self._with_usage(raw_mapping, usage)
+            mappings[indexes[0]] = mapping
+            for index in indexes[1:]:
+                duplicate = copy.deepcopy(mapping)
+                duplicate.update(prompt_tokens=0, completion_tokens=0, cost_eur=0.0)
+                mappings[index] = duplicate
+        return mappings  # type: ignore[return-value]
+
+    def propose_mapping_bulk(
+        self,
+        invoices: Sequence[Dict[str, Any]],
+        poll_interval: float = 30.0,
+        timeout: Optional[float] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Mapping diferido vía Batch API (ventana de 24h, sin límites de QPM) para reprocesos y
+        backfills. Bloquea hasta que termina el batch. Devuelve {doc_id: mapping}; las facturas
+        sin doc_id usan su posición como clave. El coste se calcula con BATCH_DISCOUNT.
+        Lanza ValueError si dos facturas comparten clave (se perdería una de las respuestas).
+        """
+        by_id: Dict[str, Dict[str, Any]] = {}
+        duplicates: List[str] = []
+        for index, invoice in enumerate(invoices):
+            custom_id = str(invoice.get("doc_id") or index)
+            if custom_id in by_id:
+                duplicates.append(custom_id)
+            by_id[custom_id] = invoice
+        if duplicates:
+            raise ValueError(f"Claves repetidas en el batch: {', '.join(sorted(set(duplicates)))}")
+        if not by_id:
+            return {}
+        batch_id = self._responder.submit_batch(self.model, by_id)
+        logger.info("Batch OpenAI %s enviado con %s facturas", batch_id, len(by_id))
+        results = self._responder.collect_batch(batch_id, by_id, poll_interval=poll_interval, timeout=timeout)
+        mappings: Dict[str, Dict[str, Any]] = {}
+        for custom_id, result in results.items():
+            if isinstance(result, Exception):
+                logger.warning("LLM OpenAI batch error (%s): %s", custom_id, result)
+                mappings[custom_id] = self._error_mapping(result)
+                continue
+            mapping, _debug, usage = result
+            finalized = self._with_usage(mapping, usage)
+            finalized["cost_eur"] = round(finalized["cost_eur"] * self.BATCH_DISCOUNT, 6)
+            mappings[custom_id] = finalized
+        return mappings
+
+    def _error_mapping(self, exc: Exception) -> Dict[str, Any]:
+        return {
+            "account": "",
+            "iva_type": None,
+            "confidence_llm": 0.0,
+            "rationale": str(exc),
+            "issue_codes": ["LLM_ERROR"],
+            "provider": self.provider_name,
+            "model_used": "mini",
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cost_eur": 0.0,
+        }
+
+
+_SPECULATIVE_EXECUTOR: Optional[ThreadPoolExecutor] = None
+_SPECULATIVE_LOCK = threading.Lock()
+# Llamadas premium especulativas en vuelo a la vez (mini va en el hilo que llama).
+_SPECULATIVE_WORKERS = 4
+
+
+def _speculative_executor() -> ThreadPoolExecutor:
+    global _SPECULATIVE_EXECUTOR
+    with _SPECULATIVE_LOCK:
+        if _SPECULATIVE_EXECUTOR is None:
+            _SPECULATIVE_EXECUTOR = ThreadPoolExecutor(
+                max_workers=_SPECULATIVE_WORKERS, thread_name_prefix="certiva-llm-premium"
+            )
+        return _SPECULATIVE_EXECUTOR
 
 
 class DualOpenAILLMProvider(LLMProvider):
     """Cascada mini → premium para casos complejos."""
 
     provider_name = "openai-dual"
-    HARD_ISSUE_CODES = {"LLM_ERROR", "MAPPING_AMBIGUOUS"}
-    PREMIUM_CATEGORIES = {
+    HARD_ISSUE_CODES = frozenset({"LLM_ERROR", "MAPPING_AMBIGUOUS"})
+    PREMIUM_CATEGORIES = frozenset({
         "intracomunitaria",
         "ventas_intracom",
         "ventas_abono",
         "nota_credito",
         "abono",
-    }
+    })
+    PREMIUM_DOC_TYPES = frozenset({"sales_credit_note", "sales_intracom"})
+    # Con speculative_escalation, importes por encima de umbral * margen lanzan mini y premium a la vez.
+    SPECULATIVE_MARGIN = 2.0
 
     def __init__(
         self,
@@ -313,6 +1009,11 @@ class DualOpenAILLMProvider(LLMProvider):
         threshold_gross: float,
         responder: Optional[_OpenAIResponder] = None,
         pricing: Optional[Dict[str, Dict[str, float]]] = None,
+        cache_size: int = 10_000,
+        cache_ttl: float = 3600.0,
+        semantic_threshold: float = 0.0,
+        persist_ttl: float = 0.0,
+        speculative_escalation: bool = False,
     ) -> None:
         super().__init__()
         if not api_key:
@@ -320,8 +1021,11 @@ class DualOpenAILLMProvider(LLMProvider):
         self.model_mini = model_mini
         self.model_premium = model_premium or model_mini
         self.threshold_gross = threshold_gross
-        self._responder = responder or _OpenAIResponder(api_key, api_base)
+        self._responder = responder or _OpenAIResponder(
+            api_key, api_base, cache_size, cache_ttl, semantic_threshold=semantic_threshold, persist_ttl=persist_ttl
+        )
         self.pricing = pricing or {}
+        self.speculative_escalation = speculative_escalation
 
     def _call_model(self, model_id: str, invoice: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, int]]:
         mapping, debug, usage = self._responder.call(model_id, invoice)
@@ -329,26 +1033,52 @@ class DualOpenAILLMProvider(LLMProvider):
         mapping["provider"] = self.provider_name
         return mapping, debug, usage
 
+    def _call_both(self, invoice: Dict[str, Any]) -> List[Union[_Result, Exception]]:
+        """
+        Mini en este hilo y premium en el pool a la vez, ambos con el cliente síncrono del
+        responder; cada posición es el resultado o la excepción de ese modelo.
+        """
+        premium = _speculative_executor().submit(self._call_model, self.model_premium, invoice)
+        results: List[Union[_Result, Exception]] = []
+        try:
+            results.append(self._call_model(self.model_mini, invoice))
+        except Exception as exc:
+            results.append(exc)
+        try:
+            results.append(premium.result())
+        except Exception as exc:
+            results.append(exc)
+        return results
+
+    @staticmethod
+    def _unwrap(result: Union[_Result, Exception]) -> _Result:
+        if isinstance(result, Exception):
+            raise result
+        return result
+
     def _should_escalate(self, mapping: Dict[str, Any], invoice: Dict[str, Any]) -> bool:
-        issue_codes = set(mapping.get("issue_codes") or [])
-        if issue_codes.intersection(self.HARD_ISSUE_CODES):
-            return True
+        # Primero lo que más escala (importe), luego issue codes y por último las categorías.
         metadata = invoice.get("metadata") or {}
-        category = (metadata.get("category") or "").lower()
-        doc_type = (metadata.get("doc_type") or "").lower()
-        if category in self.PREMIUM_CATEGORIES or doc_type in {"sales_credit_note", "sales_intracom"}:
+        if float((invoice.get("totals") or {}).get("gross") or 0.0) >= self._threshold_for(invoice, metadata):
             return True
-        gross = float((invoice.get("totals") or {}).get("gross") or 0.0)
-        threshold = self.threshold_gross
+        if not self.HARD_ISSUE_CODES.isdisjoint(mapping.get("issue_codes") or ()):
+            return True
+        category = metadata.get("category")
+        if category and category.lower() in self.PREMIUM_CATEGORIES:
+            return True
+        doc_type = metadata.get("doc_type")
+        return bool(doc_type) and doc_type.lower() in self.PREMIUM_DOC_TYPES
+
+    def _threshold_for(self, invoice: Dict[str, Any], metadata: Dict[str, Any]) -> float:
         override = invoice.get("_llm_threshold_override")
         if override is None:
-            override = (metadata.get("llm_threshold_override") if isinstance(metadata, dict) else None)
+            override = metadata.get("llm_threshold_override") if isinstance(metadata, dict) else None
+        if override is None:
+            return self.threshold_gross
         try:
-            if override is not None:
-                threshold = float(override)
+            return float(override)
         except (TypeError, ValueError):
-            threshold = self.threshold_gross
-        return gross >= threshold
+            return self.threshold_gross
 
     @staticmethod
     def _merge_issue_codes(*groups: Iterable[str]) -> List[str]:
@@ -376,10 +1106,27 @@ class DualOpenAILLMProvider(LLMProvider):
         mapping.setdefault("cost_eur", 0.0)
         return mapping
 
+    def _definitely_escalates(self, invoice: Dict[str, Any]) -> bool:
+        """Precheck sin llamar a mini: importe muy por encima del umbral o categoría premium."""
+        metadata = invoice.get("metadata") or {}
+        gross = float((invoice.get("totals") or {}).get("gross") or 0.0)
+        if gross > self._threshold_for(invoice, metadata) * self.SPECULATIVE_MARGIN:
+            return True
+        category = metadata.get("category")
+        return bool(category) and category.lower() in self.PREMIUM_CATEGORIES
+
     def propose_mapping(self, invoice: Dict[str, Any]) -> Dict[str, Any]:
         stage_debug: Dict[str, Any] = {}
+        # Si la escalada es casi segura no se espera a mini: se paga mini igualmente, pero la
+        # latencia es la del modelo más lento y no la suma de ambos.
+        speculative: Optional[List[Union[_Result, Exception]]] = None
+        if self.speculative_escalation and self._definitely_escalates(invoice):
+            speculative = self._call_both(invoice)
         try:
-            mini_mapping, mini_debug, mini_usage = self._call_model(self.model_mini, invoice)
+            if speculative is None:
+                mini_mapping, mini_debug, mini_usage = self._call_model(self.model_mini, invoice)
+            else:
+                mini_mapping, mini_debug, mini_usage = self._unwrap(speculative[0])
             stage_debug["mini"] = {
                 "prompt": mini_debug.get("prompt"),
                 "response_raw": mini_debug.get("response_text"),
@@ -412,7 +1159,10 @@ class DualOpenAILLMProvider(LLMProvider):
             return finalized
 
         try:
-            premium_mapping, premium_debug, premium_usage = self._call_model(self.model_premium, invoice)
+            if speculative is None:
+                premium_mapping, premium_debug, premium_usage = self._call_model(self.model_premium, invoice)
+            else:
+                premium_mapping, premium_debug, premium_usage = self._unwrap(speculative[1])
             premium_mapping["issue_codes"] = self._merge_issue_codes(
                 mini_mapping.get("issue_codes"),
                 premium_mapping.get("issue_codes"),
@@ -4,20 +4,34 @@ from __future__ import annotations
 import logging
 import os
 from dataclasses import dataclass
-from enum import Enum
+from enum import StrEnum
+from functools import lru_cache
 import time
-from typing import Dict, Optional
+from types import MappingProxyType
+from typing import Dict, Iterator, Mapping, Optional, Tuple
 
 from .config import settings
 from . import utils
 from .pii_scrub import scrub_pii
 
+try:  # pragma: no cover - dependencia opcional
+    import tiktoken  # type: ignore
+except ImportError:  # pragma: no cover
+    tiktoken = None
+
 logger = logging.getLogger(__name__)
 
 MAX_CONTEXT_CHARS = 4000
+# Con tiktoken el contexto se corta en tokens (~4 caracteres/token, el mismo presupuesto).
+MAX_CONTEXT_TOKENS = MAX_CONTEXT_CHARS // 4
+TRUNCATION_MARK = "\n...[contenido truncado]..."
+# Solo se memoiza el saneado de textos en este rango: los cortos no compensan y los muy largos
+# ocuparían demasiada memoria en la caché.
+SCRUB_CACHE_MIN_CHARS = 128
+SCRUB_CACHE_MAX_CHARS = 4 * MAX_CONTEXT_CHARS
 
 
-class LLMTask(str, Enum):
+class LLMTask(StrEnum):
     RAG_NORMATIVO = "rag_normativo"
     EXPLICAR_PNL = "explicar_pnl"
     EXPLICAR_IVA = "explicar_iva"
@@ -25,7 +39,7 @@ class LLMTask(str, Enum):
     SUGERIR_MAPPING = "sugerir_mapping"
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class LLMConfig:
     provider: str
     model: str
@@ -34,8 +48,9 @@ class LLMConfig:
     cost_hint: float = 0.0
 
 
-def _build_task_config() -> Dict[LLMTask, LLMConfig]:
-    return {
+def _build_task_config() -> Mapping[LLMTask, LLMConfig]:
+    """Tabla fija de solo lectura: se construye una vez al importar el módulo."""
+    return MappingProxyType({
         LLMTask.RAG_NORMATIVO: LLMConfig(
             provider=settings.llm_rag_provider,
             model=settings.llm_rag_model,
@@ -66,26 +81,52 @@ def _build_task_config() -> Dict[LLMTask, LLMConfig]:
             max_tokens=400,
             temperature=0.2,
         ),
-    }
+    })
 
 
 TASK_CONFIG = _build_task_config()
 
 
+@lru_cache(maxsize=1024)
+def _scrub_text_cached(text: str, strict: bool, enabled: bool) -> str:
+    return scrub_pii(text, strict=strict, enabled=enabled)
+
+
 def _scrub_text(text: str) -> str:
-    return scrub_pii(
-        text or "",
-        strict=settings.llm_pii_scrub_strict,
-        enabled=not settings.llm_enable_pii,
-    )
+    text = text or ""
+    strict = settings.llm_pii_scrub_strict
+    enabled = not settings.llm_enable_pii
+    # Prompts de sistema y contextos se repiten mucho entre llamadas.
+    if enabled and SCRUB_CACHE_MIN_CHARS <= len(text) <= SCRUB_CACHE_MAX_CHARS:
+        return _scrub_text_cached(text, strict, enabled)
+    return scrub_pii(text, strict=strict, enabled=enabled)
+
+
+@lru_cache(maxsize=1)
+def _token_encoder():
+    """Encoder de tiktoken o None si no está instalado o no se pudo cargar."""
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as exc:  # pragma: no cover - p.ej. sin red para descargar el vocabulario
+        logger.warning("tiktoken no disponible, se trunca por caracteres: %s", exc)
+        return None
 
 
 def _truncate(text: Optional[str]) -> Optional[str]:
-    if not text:
+    # Un token tiene al menos un carácter: si cabe en caracteres, cabe en tokens.
+    if not text or len(text) <= MAX_CONTEXT_TOKENS:
         return text
-    if len(text) > MAX_CONTEXT_CHARS:
-        return text[:MAX_CONTEXT_CHARS] + "\n...[contenido truncado]..."
-    return text
+    encoder = _token_encoder()
+    if encoder is None:
+        if len(text) > MAX_CONTEXT_CHARS:
+            return text[:MAX_CONTEXT_CHARS] + TRUNCATION_MARK
+        return text
+    ids = encoder.encode(text)
+    if len(ids) <= MAX_CONTEXT_TOKENS:
+        return text
+    return encoder.decode(ids[:MAX_CONTEXT_TOKENS]) + TRUNCATION_MARK
 
 
 def _resolve_provider(provider: str) -> str:
@@ -104,15 +145,14 @@ def _resolve_provider(provider: str) -> str:
     return "dummy"
 
 
-def call_llm(
+def _prepare_call(
     task: LLMTask,
-    system_prompt: str,
     user_prompt: str,
-    context: Optional[str] = None,
-    tenant: Optional[str] = None,
-    user: Optional[str] = None,
-) -> str:
-    """Llama al modelo configurado para una tarea y devuelve la respuesta textual."""
+    context: Optional[str],
+    tenant: Optional[str],
+    user: Optional[str],
+) -> Tuple[LLMConfig, str, Optional[str]]:
+    """Config de la tarea, prompt saneado y, si se ha agotado la cuota, la respuesta simulada (ya registrada)."""
     cfg = TASK_CONFIG.get(task)
     if not cfg:
         logger.warning("No existe configuración LLM para la tarea %s. Se usará proveedor 'dummy'.", task)
@@ -127,7 +167,6 @@ def call_llm(
     quota_error = utils.check_llm_quota(tenant, user)
     if quota_error:
         logger.warning("LLM quota exceeded for tenant=%s user=%s", tenant, user)
-        simulated = f"[Simulación {task.value}] {quota_error}"
         utils.log_llm_call(
             task.value,
             "quota_guard",
@@ -139,6 +178,55 @@ def call_llm(
             tenant=tenant,
             username=user,
         )
+        return cfg, combined_prompt, f"[Simulación {task.value}] {quota_error}"
+    return cfg, combined_prompt, None
+
+
+def _log_call(
+    task: LLMTask,
+    provider: str,
+    cfg: LLMConfig,
+    system_prompt: str,
+    combined_prompt: str,
+    usage: Dict[str, int],
+    response_chars: int,
+    start: float,
+    error: Optional[str],
+    tenant: Optional[str],
+    user: Optional[str],
+) -> None:
+    latency_ms = (time.monotonic() - start) * 1000
+    # Tokens reales si el proveedor los devuelve; si no, la aproximación de ~4 caracteres/token.
+    prompt_tokens = usage.get("prompt_tokens")
+    if prompt_tokens is None:
+        prompt_tokens = _estimate_tokens(system_prompt) + _estimate_tokens(combined_prompt)
+    completion_tokens = usage.get("completion_tokens")
+    if completion_tokens is None:
+        completion_tokens = max(1, response_chars >> 2) if response_chars else 0
+    utils.log_llm_call(
+        task.value,
+        provider,
+        cfg.model,
+        prompt_tokens,
+        completion_tokens,
+        latency_ms,
+        error,
+        tenant=tenant,
+        username=user,
+    )
+
+
+def call_llm(
+    task: LLMTask,
+    system_prompt: str,
+    user_prompt: str,
+    context: Optional[str] = None,
+    tenant: Optional[str] = None,
+    user: Optional[str] = None,
+) -> str:
+    """Llama al modelo configurado para una tarea y devuelve la respuesta textual."""
+    cfg, combined_prompt, simulated = _prepare_call(task, user_prompt, context, tenant, user)
+    if simulated is not None:
         return simulated
 
     provider = _resolve_provider(cfg.provider)
@@ -146,10 +234,11 @@ def call_llm(
 
     start = time.monotonic()
     response = ""
+    usage: Dict[str, int] = {}
     error = None
     try:
         if provider == "openai":
-            response = _call_openai(cfg, system_prompt, combined_prompt)
+            response, usage = _call_openai(cfg, system_prompt, combined_prompt)
         elif provider in {"groq", "xai"}:
             logger.warning("Proveedor %s aún no implementado. Se devolverá respuesta simulada.", provider)
             response = _simulate_response(task, combined_prompt)
@@ -161,38 +250,83 @@ def call_llm(
         logger.error("LLM call failed: %s", exc)
         return _simulate_response(task, combined_prompt)
     finally:
-        latency_ms = (time.monotonic() - start) * 1000
-        prompt_tokens = _estimate_tokens(system_prompt) + _estimate_tokens(combined_prompt)
-        completion_tokens = _estimate_tokens(response)
-        utils.log_llm_call(
-            task.value,
-            provider,
-            cfg.model,
-            prompt_tokens,
-            completion_tokens,
-            latency_ms,
-            error,
-            tenant=tenant,
-            username=user,
-        )
+        _log_call(task, provider, cfg, system_prompt, combined_prompt, usage, len(response), start, error, tenant, user)
+
+
+def stream_llm(
+    task: LLMTask,
+    system_prompt: str,
+    user_prompt: str,
+    context: Optional[str] = None,
+    tenant: Optional[str] = None,
+    user: Optional[str] = None,
+) -> Iterator[str]:
+    """
+    Como call_llm pero devuelve los fragmentos según llegan (stream=True con OpenAI), para
+    mostrar las explicaciones largas sin esperar a la respuesta completa. El registro en
+    llm_calls se hace al agotar (o cerrar) el generador.
+    """
+    cfg, combined_prompt, simulated = _prepare_call(task, user_prompt, context, tenant, user)
+    if simulated is not None:
+        yield simulated
+        return
 
+    provider = _resolve_provider(cfg.provider)
+    logger.info("LLM stream task=%s provider=%s model=%s", task.value, provider, cfg.model)
 
-def _call_openai(cfg: LLMConfig, system_prompt: str, combined_prompt: str) -> str:
+    start = time.monotonic()
+    response_chars = 0
+    usage: Dict[str, int] = {}
+    error = None
     try:
-        import openai
-    except ImportError:  # pragma: no cover - dependencia opcional
-        logger.error("openai no está instalado. Devuelvo respuesta simulada.")
-        return _simulate_response(LLMTask.RAG_NORMATIVO, combined_prompt)
+        if provider == "openai":
+            chunks = _stream_openai(cfg, system_prompt, combined_prompt, usage)
+        else:
+            chunks = iter((_simulate_response(task, combined_prompt),))
+        for chunk in chunks:
+            response_chars += len(chunk)
+            yield chunk
+    except Exception as exc:  # pragma: no cover - defensive
+        error = str(exc)
+        logger.error("LLM stream failed: %s", exc)
+        if not response_chars:
+            yield _simulate_response(task, combined_prompt)
+    finally:
+        _log_call(task, provider, cfg, system_prompt, combined_prompt, usage, response_chars, start, error, tenant, user)
+
+
+def _usage_tokens(usage: object) -> Dict[str, int]:
+    if not usage:
+        return {}
+    get = usage.get if isinstance(usage, dict) else lambda key: getattr(usage, key, None)
+    return {key: int(get(key)) for key in ("prompt_tokens", "completion_tokens") if get(key) is not None}
+
+
+@lru_cache(maxsize=1)
+def _openai_client(api_key: str, api_base: Optional[str], timeout: float):
+    """
+    Cliente v1 compartido por todos los hilos (el pool de conexiones de httpx se reutiliza).
+    Se indexa por la configuración para crear otro si cambia la clave o el endpoint.
+    """
+    from openai import OpenAI
 
+    return OpenAI(api_key=api_key, base_url=api_base or None, timeout=timeout)
+
+
+def _call_openai(cfg: LLMConfig, system_prompt: str, combined_prompt: str) -> Tuple[str, Dict[str, int]]:
+    """Respuesta y uso de tokens informado por la API ({} si no lo hay)."""
     api_key = settings.openai_api_key
     if not api_key:
         logger.warning("OPENAI_API_KEY no configurado. Devuelvo respuesta simulada.")
-        return _simulate_response(LLMTask.RAG_NORMATIVO, combined_prompt)
+        return _simulate_response(LLMTask.RAG_NORMATIVO, combined_prompt), {}
+    try:
+        client = _openai_client(api_key, settings.openai_api_base, settings.llm_timeout_seconds)
+    except ImportError:  # pragma: no cover - dependencia opcional
+        logger.error("openai no está instalado. Devuelvo respuesta simulada.")
+        return _simulate_response(LLMTask.RAG_NORMATIVO, combined_prompt), {}
 
-    openai.api_key = api_key
-    openai.api_base = settings.openai_api_base
     try:
-        completion = openai.ChatCompletion.create(
+        completion = client.chat.completions.create(
             model=cfg.model,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -200,12 +334,36 @@ def _call_openai(cfg: LLMConfig, system_prompt: str, combined_prompt: str) -> st
             ],
             max_tokens=cfg.max_tokens,
             temperature=cfg.temperature,
-            timeout=settings.llm_timeout_seconds,
         )
-        return completion["choices"][0]["message"]["content"].strip()
+        return (completion.choices[0].message.content or "").strip(), _usage_tokens(completion.usage)
     except Exception as exc:  # pragma: no cover - errores externos
         logger.error("Error llamando a OpenAI: %s", exc)
-        return _simulate_response(LLMTask.RAG_NORMATIVO, combined_prompt)
+        return _simulate_response(LLMTask.RAG_NORMATIVO, combined_prompt), {}
+
+
+def _stream_openai(
+    cfg: LLMConfig, system_prompt: str, combined_prompt: str, usage: Dict[str, int]
+) -> Iterator[str]:
+    """Fragmentos de texto de la respuesta; al terminar rellena `usage` con lo que informe la API."""
+    client = _openai_client(settings.openai_api_key, settings.openai_api_base, settings.llm_timeout_seconds)
+    stream = client.chat.completions.create(
+        model=cfg.model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": combined_prompt},
+        ],
+        max_tokens=cfg.max_tokens,
+        temperature=cfg.temperature,
+        stream=True,
+        stream_options={"include_usage": True},
+    )
+    for chunk in stream:
+        if chunk.choices:
+            content = chunk.choices[0].delta.content
+            if content:
+                yield content
+        if getattr(chunk, "usage", None):
+            usage.update(_usage_tokens(chunk.usage))
 
 
 def _simulate_response(task: LLMTask, combined_prompt: str) -> str:
@@ -222,6 +380,7 @@ class LLMCallLog:
     error: Optional[str] = None
 
 def _estimate_tokens(text: str) -> int:
+    """Último recurso cuando la API no informa del uso: ~4 caracteres por token, sin split()."""
     if not text:
         return 0
-    return max(1, len(text.split()))
+    return max(1, len(text) >> 2)
@@ -8,26 +8,34 @@ from . import llm_debug, policies, provider_health
 
 logger = logging.getLogger(__name__)
 
+# Número de factura y NIF en una sola pasada sobre el texto OCR; lastgroup indica cuál ha casado.
+_FIELDS_RE = re.compile(
+    r"(?:Factura|Invoice|Fact\.? No\.?|Número)\s*[:#]?\s*(?P<invoice>[A-Z0-9\-/]{4,})"
+    r"|(?:NIF|VAT|CIF)\s*[:#]?\s*(?P<nif>[A-Z0-9]{8,12})",
+    re.IGNORECASE,
+)
+_FIELD_SUGGESTIONS = {
+    "invoice": ("invoice.number", 0.65),
+    "nif": ("supplier.nif", 0.60),
+}
+
 
 def suggest_missing_fields(ocr_text: str) -> Dict[str, Dict[str, Any]]:
     """Attempt to recover invoice.number or supplier.nif using regex + LLM assistance."""
     suggestions: Dict[str, Dict[str, Any]] = {}
 
-    invoice_match = re.search(r"(?:Factura|Invoice|Fact\.? No\.?|Número)\s*[:#]?\s*([A-Z0-9\-/]{4,})", ocr_text, re.IGNORECASE)
-    if invoice_match:
-        suggestions["invoice.number"] = {
-            "value": invoice_match.group(1).strip(),
-            "confidence_llm": 0.65,
-            "source": "regex",
-        }
-
-    nif_match = re.search(r"(?:NIF|VAT|CIF)\s*[:#]?\s*([A-Z0-9]{8,12})", ocr_text, re.IGNORECASE)
-    if nif_match:
-        suggestions["supplier.nif"] = {
-            "value": nif_match.group(1).strip(),
-            "confidence_llm": 0.60,
+    # Primera aparición de cada campo; se deja de recorrer el texto en cuanto están los dos.
+    for match in _FIELDS_RE.finditer(ocr_text):
+        field, confidence = _FIELD_SUGGESTIONS[match.lastgroup]
+        if field in suggestions:
+            continue
+        suggestions[field] = {
+            "value": match.group(match.lastgroup).strip(),
+            "confidence_llm": confidence,
             "source": "regex",
         }
+        if len(suggestions) == len(_FIELD_SUGGESTIONS):
+            break
 
     missing = []
     if "invoice.number" not in suggestions:
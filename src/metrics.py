@@ -4,7 +4,7 @@ import logging
 from collections import Counter
 from datetime import datetime, date
 from statistics import mean
-from typing import Dict, List, Optional
+from typing import Dict, Iterable, List, Optional
 
 from . import utils, rules_engine, bank_matcher, reports, azure_ocr_monitor
 from .config import settings
@@ -91,7 +91,16 @@ def _gather_llm_stats(tenant: Optional[str] = None) -> Dict[str, float]:
     }
 
 
-def gather_stats(tenant: Optional[str] = None) -> Dict[str, float]:
+# Bloques caros de gather_stats que se pueden omitir con `sections` (lecturas de JSON, reports...).
+STATS_SECTIONS = frozenset({"ar", "bank", "jobs", "pnl", "reports", "llm"})
+
+
+def gather_stats(tenant: Optional[str] = None, sections: Optional[Iterable[str]] = None) -> Dict[str, float]:
+    """
+    Métricas del dashboard. Con `sections` solo se calculan esos bloques de STATS_SECTIONS;
+    el resto de claves se devuelven vacías. Sin `sections` se calcula todo.
+    """
+    wanted = STATS_SECTIONS if sections is None else STATS_SECTIONS.intersection(sections)
     with utils.get_connection() as conn:
         doc_query = "SELECT * FROM docs"
         params: List = []
@@ -188,7 +197,7 @@ def gather_stats(tenant: Optional[str] = None) -> Dict[str, float]:
             }
         )
 
-    ar_docs = [doc for doc in docs if (doc["doc_type"] or "").lower().startswith("sales")]
+    ar_docs = [doc for doc in docs if (doc["doc_type"] or "").lower().startswith("sales")] if "ar" in wanted else []
     ar_paid = [doc for doc in ar_docs if (doc["reconciled_pct"] or 0) >= 0.999]
     ar_partial = [doc for doc in ar_docs if 0 < (doc["reconciled_pct"] or 0) < 0.999]
     ar_overdue = 0
@@ -211,7 +220,7 @@ def gather_stats(tenant: Optional[str] = None) -> Dict[str, float]:
             except ValueError:
                 continue
 
-    bank_stats = bank_matcher.gather_bank_stats(tenant=tenant)
+    bank_stats = bank_matcher.gather_bank_stats(tenant=tenant) if "bank" in wanted else {}
     jobs = [
         {
             "id": job["id"],
@@ -222,16 +231,22 @@ def gather_stats(tenant: Optional[str] = None) -> Dict[str, float]:
             "last_run_at": job["last_run_at"],
             "last_status": job["last_status"],
         }
-        for job in utils.list_jobs()
+        for job in (utils.list_jobs() if "jobs" in wanted else [])
     ]
     today = date.today()
     first_day = today.replace(day=1)
     target_tenant = tenant or (settings.default_tenant if hasattr(settings, "default_tenant") else None)
-    pnl_summary = reports.build_pnl(target_tenant, first_day.isoformat(), today.isoformat())
-    vat_summary = reports.build_vat_report(target_tenant, first_day.isoformat(), today.isoformat())
-    aging_summary = reports.build_aging(target_tenant, today.isoformat(), "AR")
-    cashflow_summary = reports.build_cashflow_forecast(target_tenant, today.isoformat(), 3)
-    llm_stats = _gather_llm_stats(tenant)
+    pnl_summary: Dict = {}
+    vat_summary: Dict = {}
+    aging_summary: Dict = {}
+    cashflow_summary: Dict = {}
+    if "pnl" in wanted:
+        pnl_summary = reports.build_pnl(target_tenant, first_day.isoformat(), today.isoformat())
+    if "reports" in wanted:
+        vat_summary = reports.build_vat_report(target_tenant, first_day.isoformat(), today.isoformat())
+        aging_summary = reports.build_aging(target_tenant, today.isoformat(), "AR")
+        cashflow_summary = reports.build_cashflow_forecast(target_tenant, today.isoformat(), 3)
+    llm_stats = _gather_llm_stats(tenant) if "llm" in wanted else {}
     provider_breakdown = {
         "ocr": [(row["provider"], row["cnt"]) for row in provider_rows],
         "llm": [(row["provider"], row["cnt"]) for row in llm_rows],
@@ -390,23 +405,30 @@ def print_stats(tenant: Optional[str] = None) -> None:
                 print(f"  - {task}: {count} llamadas")
 
 
-def print_preflight(tenant: Optional[str] = None) -> None:
-    utils.configure_logging()
+def format_preflight(tenant: Optional[str] = None) -> str:
     data = gather_preflight(tenant)
-    print("Pre-SII pre-flight checklist")
-    print("----------------------------")
-    print("Documentos analizados:", data["total"])
-    print("Estados:")
+    lines = [
+        "Pre-SII pre-flight checklist",
+        "----------------------------",
+        f"Documentos analizados: {data['total']}",
+        "Estados:",
+    ]
     for status, count in data["status_counts"].most_common():
-        print(f"  - {status}: {count}")
-    print("Issues detectados:")
+        lines.append(f"  - {status}: {count}")
+    lines.append("Issues detectados:")
     if data["issue_counts"]:
         for code, count in data["issue_counts"].most_common():
             label = rules_engine.ISSUE_MESSAGES.get(code, code)
-            print(f"  - {code} ({label}): {count}")
+            lines.append(f"  - {code} ({label}): {count}")
     else:
-        print("  - Ninguno 🎉")
-    print("Duplicados marcados:", data["duplicates"])
+        lines.append("  - Ninguno 🎉")
+    lines.append(f"Duplicados marcados: {data['duplicates']}")
+    return "\n".join(lines) + "\n"
+
+
+def print_preflight(tenant: Optional[str] = None) -> None:
+    utils.configure_logging()
+    print(format_preflight(tenant), end="")
 
 
 def parse_args() -> argparse.Namespace:
@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 import re
-from typing import Iterable, Tuple
+from typing import Iterable, List, Match, Pattern, Sequence, Tuple
 
 PatternPair = Tuple[str, str]
 
@@ -22,21 +22,60 @@ NAME_TOKEN_PATTERN = re.compile(
 )
 
 
+LONG_NUMBER_PATTERN: PatternPair = (r"\b\d{8,}\b", "[NUM]")
+
+
+def _combine(pairs: Sequence[PatternPair]) -> Tuple[Pattern[str], Tuple[str, ...]]:
+    """
+    Una sola alternancia con un grupo por patrón, en el orden original. Estos patrones casan
+    tokens completos (anclados en límites de palabra) sin solaparse, así que una pasada da el
+    mismo resultado que aplicarlos uno tras otro. NAME_TOKEN_PATTERN no cumple esto y queda fuera.
+    """
+    regex = re.compile("|".join(f"({pattern})" for pattern, _ in pairs), re.IGNORECASE)
+    return regex, tuple(replacement for _, replacement in pairs)
+
+
+_BASE_RE, _BASE_REPLACEMENTS = _combine((*PII_PATTERNS_BASE, LONG_NUMBER_PATTERN))
+# En estricto los números largos van después de los nombres (el lookahead de nombres se para en
+# un dígito), así que no entran en la alternancia.
+_STRICT_RE, _STRICT_REPLACEMENTS = _combine((*PII_PATTERNS_BASE, *PII_PATTERNS_STRICT))
+_LONG_NUMBER_RE = re.compile(LONG_NUMBER_PATTERN[0])
+
+
+def _base_repl(match: Match[str]) -> str:
+    return _BASE_REPLACEMENTS[match.lastindex - 1]
+
+
+def _strict_repl(match: Match[str]) -> str:
+    return _STRICT_REPLACEMENTS[match.lastindex - 1]
+
+
+def _name_repl(match: Match[str]) -> str:
+    return match.group(0).replace(match.group("name"), "[NOMBRE]", 1)
+
+
+def _scrub_base(text: str) -> str:
+    return _BASE_RE.sub(_base_repl, text)
+
+
+def _scrub_strict(text: str) -> str:
+    # Mismo orden que el saneado original: base + estrictos, nombres y por último números largos.
+    scrubbed = NAME_TOKEN_PATTERN.sub(_name_repl, _STRICT_RE.sub(_strict_repl, text))
+    return _LONG_NUMBER_RE.sub(LONG_NUMBER_PATTERN[1], scrubbed)
+
+
 def scrub_pii(text: str, *, strict: bool = False, enabled: bool = True) -> str:
     """Return a version of text with PII placeholders when enabled."""
     if text is None:
         return ""
     if not enabled:
         return text
-    scrubbed = text
-    for pattern, replacement in PII_PATTERNS_BASE:
-        scrubbed = re.sub(pattern, replacement, scrubbed, flags=re.IGNORECASE)
-    if strict:
-        for pattern, replacement in PII_PATTERNS_STRICT:
-            scrubbed = re.sub(pattern, replacement, scrubbed, flags=re.IGNORECASE)
-        scrubbed = NAME_TOKEN_PATTERN.sub(
-            lambda match: match.group(0).replace(match.group("name"), "[NOMBRE]", 1),
-            scrubbed,
-        )
-    scrubbed = re.sub(r"\b\d{8,}\b", "[NUM]", scrubbed)
-    return scrubbed
+    return _scrub_strict(text) if strict else _scrub_base(text)
+
+
+def scrub_pii_batch(texts: Iterable[str], *, strict: bool = False, enabled: bool = True) -> List[str]:
+    """scrub_pii sobre varios textos, resolviendo el modo una sola vez."""
+    if not enabled:
+        return ["" if text is None else text for text in texts]
+    scrub = _scrub_strict if strict else _scrub_base
+    return ["" if text is None else scrub(text) for text in texts]
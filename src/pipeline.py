@@ -119,6 +119,7 @@ def process_normalized(
     issues_json = json.dumps(issues, ensure_ascii=False)
     metadata_payload = normalized.get("metadata") or {}
     doc_type = metadata_payload.get("doc_type")
+    supplier_nif = ((normalized.get("supplier") or {}).get("nif") or "").upper()
 
     low_confidence = confidence_global < settings.confidence_min_ok
     if low_confidence and "LOW_CONFIDENCE" not in issues:
@@ -150,6 +151,7 @@ def process_normalized(
             ocr_conf=ocr_conf_value,
             global_conf=confidence_global,
             doc_type=doc_type,
+            supplier_nif=supplier_nif,
             duplicate_flag=duplicate_flag,
             issues=issues_json,
             llm_provider=llm_provider,
@@ -170,6 +172,7 @@ def process_normalized(
         ocr_conf=ocr_conf_value,
         global_conf=confidence_global,
         doc_type=doc_type,
+        supplier_nif=supplier_nif,
         duplicate_flag=duplicate_flag,
         issues=issues_json,
         llm_provider=llm_provider,
@@ -5,19 +5,20 @@ import argparse
 import csv
 import json
 from collections import Counter, defaultdict
-from dataclasses import dataclass, field, replace
+from dataclasses import dataclass, replace
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import sqlite3
 
 from . import utils
 
 
-@dataclass
+@dataclass(frozen=True)
 class Policy:
     name: str
     min_conf_entry: float = 0.85
-    always_review_issues: List[str] = field(default_factory=list)
+    always_review_issues: Tuple[str, ...] = ()
     treat_no_rule_as_issue: bool = True
     allow_intracom_without_review: bool = False
     allow_nif_maybe_auto: bool = False
@@ -28,12 +29,12 @@ POLICIES: Dict[str, Policy] = {
     "conservative": Policy(
         name="conservative",
         min_conf_entry=0.9,
-        always_review_issues=[
+        always_review_issues=(
             "AMOUNT_MISMATCH",
             "FUTURE_DATE",
             "DUP_NIF_NUMBER",
             "DUP_NIF_GROSS",
-        ],
+        ),
         treat_no_rule_as_issue=True,
         allow_intracom_without_review=False,
         allow_nif_maybe_auto=False,
@@ -41,7 +42,7 @@ POLICIES: Dict[str, Policy] = {
     "balanced": Policy(
         name="balanced",
         min_conf_entry=0.85,
-        always_review_issues=["AMOUNT_MISMATCH", "FUTURE_DATE"],
+        always_review_issues=("AMOUNT_MISMATCH", "FUTURE_DATE"),
         treat_no_rule_as_issue=True,
         allow_intracom_without_review=True,
         allow_nif_maybe_auto=False,
@@ -49,7 +50,7 @@ POLICIES: Dict[str, Policy] = {
     "aggressive": Policy(
         name="aggressive",
         min_conf_entry=0.75,
-        always_review_issues=["AMOUNT_MISMATCH"],
+        always_review_issues=("AMOUNT_MISMATCH",),
         treat_no_rule_as_issue=False,
         allow_intracom_without_review=True,
         allow_nif_maybe_auto=True,
@@ -57,6 +58,16 @@ POLICIES: Dict[str, Policy] = {
     ),
 }
 
+
+@lru_cache(maxsize=64)
+def get_policy(name: str, min_conf: Optional[float] = None) -> Policy:
+    """Política base (inmutable) con el min_conf_entry sobrescrito si se indica."""
+    policy = POLICIES[name]
+    if min_conf is not None:
+        policy = replace(policy, min_conf_entry=float(min_conf))
+    return policy
+
+
 RISK_WEIGHTS = {
     "AMOUNT_MISMATCH": 5,
     "FUTURE_DATE": 4,
@@ -201,10 +212,7 @@ def parse_args() -> argparse.Namespace:
 
 def main() -> None:
     args = parse_args()
-    base_policy = POLICIES[args.policy]
-    policy = replace(base_policy)
-    if args.min_conf is not None:
-        policy.min_conf_entry = args.min_conf
+    policy = get_policy(args.policy, args.min_conf)
     result = simulate_policy(policy, doc_type_prefix=args.doc_type, manifest_path=args.manifest)
     _print_report(result)
 
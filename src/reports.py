@@ -359,9 +359,16 @@ def run_cashflow(args: argparse.Namespace) -> None:
         print(f"JSON generado en {path}")
 
 
+def _print_stream(chunks: Iterable[str]) -> None:
+    """Muestra la explicación según llega del LLM en vez de esperar al texto completo."""
+    for chunk in chunks:
+        print(chunk, end="", flush=True)
+    print()
+
+
 def run_explain_pnl(args: argparse.Namespace) -> None:
     report = build_pnl(args.tenant, args.date_from, args.date_to)
-    print(explain_reports.explain_pnl(report))
+    _print_stream(explain_reports.stream_pnl(report))
 
 
 def run_explain_iva(args: argparse.Namespace) -> None:
@@ -371,7 +378,7 @@ def run_explain_iva(args: argparse.Namespace) -> None:
 
 def run_explain_cashflow(args: argparse.Namespace) -> None:
     report = build_cashflow_forecast(args.tenant, args.date_from, args.months)
-    print(explain_reports.explain_cashflow(report))
+    _print_stream(explain_reports.stream_cashflow(report))
 
 
 def build_parser() -> argparse.ArgumentParser:
@@ -1,5 +1,6 @@
 import logging
 import re
+from functools import lru_cache
 from dataclasses import dataclass
 from datetime import date, timedelta
 from decimal import Decimal, InvalidOperation
@@ -507,5 +508,11 @@ def generate_entry(doc_id: str, invoice: Dict[str, Any]) -> RuleEvaluation:
     )
 
 
+@lru_cache(maxsize=4096)
+def _issues_to_messages_cached(codes: Tuple[str, ...]) -> Tuple[str, ...]:
+    return tuple(ISSUE_MESSAGES.get(code, code) for code in codes)
+
+
 def issues_to_messages(codes: List[str]) -> List[str]:
-    return [ISSUE_MESSAGES.get(code, code) for code in codes]
+    # El vocabulario de issues es pequeño: la misma combinación se repite en toda la cola.
+    return list(_issues_to_messages_cached(tuple(codes)))
@@ -1,17 +1,27 @@
+import atexit
 import hashlib
 import json
 import logging
 from logging.handlers import RotatingFileHandler
+import os
 import random
 import sqlite3
+import threading
+import weakref
 from contextlib import contextmanager
 from datetime import date, datetime, time as datetime_time, timedelta, timezone
 from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from dateutil import parser as date_parser
 
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover - dependencia opcional
+    orjson = None
+
 from .config import settings
 from .pii_scrub import scrub_pii
 
@@ -20,6 +30,7 @@ DB_PATH = BASE_DIR / "db" / "docs.sqlite"
 LOG_PATH = BASE_DIR / "OUT" / "logs" / "certiva.log"
 SUPPORTED_EXTENSIONS = {".pdf", ".png", ".jpg", ".jpeg"}
 MONEY_PLACES = Decimal("0.01")
+SQLITE_IN_CHUNK = 500
 
 _logger_configured = False
 
@@ -202,10 +213,81 @@ def compute_pdf_page_count(path: Path) -> Optional[int]:
         return None
 
 
+def json_bytes(data: Any, pretty: bool = False) -> bytes:
+    """Serializa a JSON UTF-8 con orjson si está disponible; compacto salvo `pretty`."""
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if pretty else 0)
+        try:
+            return orjson.dumps(data, option=option)
+        except TypeError:
+            # Tipos que orjson no serializa (Decimal, enteros >64 bits...): usamos json estándar.
+            pass
+    if pretty:
+        return json.dumps(data, ensure_ascii=False, indent=2).encode("utf-8")
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def json_loads(data: Any) -> Any:
+    """json.loads con orjson si está disponible (acepta str o bytes)."""
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+def _json_bytes(data: Dict[str, Any]) -> bytes:
+    return json_bytes(data, pretty=True)
+
+
 def json_dump(data: Dict[str, Any], path: Path) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as fh:
-        json.dump(data, fh, ensure_ascii=False, indent=2)
+    raw_write_bytes(path, _json_bytes(data))
+
+
+def raw_write_bytes(path: Path, data: bytes, fsync: bool = False) -> None:
+    """Escribe bytes con os.open/os.write directos, sin el buffer de un objeto fichero."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        view = memoryview(data)
+        while view:
+            written = os.write(fd, view)
+            view = view[written:]
+        if fsync:
+            os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def json_dump_atomic_batch(pairs: Iterable[Tuple[Dict[str, Any], Path]]) -> None:
+    """
+    Escribe varios JSON de forma atómica: primero todos los temporales (con fsync),
+    después los os.replace y un único fsync por directorio. Si algo falla antes de
+    renombrar, los ficheros originales quedan intactos.
+    """
+    staged: List[Tuple[Path, Path]] = []
+    try:
+        for data, path in pairs:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+            staged.append((tmp_path, path))
+            raw_write_bytes(tmp_path, _json_bytes(data), fsync=True)
+    except BaseException:
+        for tmp_path, _ in staged:
+            tmp_path.unlink(missing_ok=True)
+        raise
+    for tmp_path, path in staged:
+        os.replace(tmp_path, path)
+    for directory in {path.parent for _, path in staged}:
+        try:
+            dir_fd = os.open(directory, os.O_RDONLY | getattr(os, "O_DIRECTORY", 0))
+        except OSError:  # pragma: no cover - plataformas sin fsync de directorios
+            continue
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
 
 
 def delete_old_files(paths: List[Path], max_age_days: int) -> int:
@@ -213,17 +295,22 @@ def delete_old_files(paths: List[Path], max_age_days: int) -> int:
     Elimina archivos en `paths` con mtime anterior a max_age_days.
     Devuelve el número de archivos borrados.
     """
-    cutoff = datetime.now() - timedelta(days=max_age_days)
+    cutoff = (datetime.now() - timedelta(days=max_age_days)).timestamp()
     removed = 0
-    for base in paths:
-        if not base.exists():
+    # os.scandir reutiliza el tipo de entrada del listado: un solo stat por archivo.
+    pending = [str(base) for base in paths]
+    while pending:
+        try:
+            entries = os.scandir(pending.pop())
+        except OSError:
             continue
-        for f in base.rglob("*"):
-            if f.is_file():
+        with entries:
+            for entry in entries:
                 try:
-                    mtime = datetime.fromtimestamp(f.stat().st_mtime)
-                    if mtime < cutoff:
-                        f.unlink()
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.unlink(entry.path)
                         removed += 1
                 except OSError:
                     continue
@@ -246,6 +333,20 @@ def compute_llm_cost(model: str, prompt_tokens: float, completion_tokens: float)
     cost = (prompt_tokens / 1000000.0) * pricing_in + (completion_tokens / 1000000.0) * pricing_out
     return float(round(cost, 6))
 
+def _queue_issue_codes(reason: Optional[str], suggested: Any) -> List[str]:
+    """Códigos de issue de una fila de la cola (mismo criterio que hitl_service); NO_ISSUE si no hay."""
+    if isinstance(suggested, (str, bytes)):
+        try:
+            suggested = json_loads(suggested)
+        except ValueError:
+            suggested = None
+    if isinstance(suggested, dict) and isinstance(suggested.get("issues"), list):
+        codes = [str(code) for code in suggested["issues"]]
+    else:
+        codes = [part.strip() for part in str(reason or "").split(";") if part.strip()]
+    return codes or ["NO_ISSUE"]
+
+
 def init_db() -> None:
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
     conn = sqlite3.connect(DB_PATH)
@@ -323,6 +424,7 @@ def init_db() -> None:
             "llm_tokens_out": "REAL",
             "llm_cost_eur": "REAL",
             "page_count": "INTEGER",
+            "supplier_nif": "TEXT",
         }.items():
             if column not in columns:
                 cur.execute(f"ALTER TABLE docs ADD COLUMN {column} {ddl}")
@@ -346,6 +448,23 @@ def init_db() -> None:
             cur.execute("ALTER TABLE review_queue ADD COLUMN tenant TEXT")
     except sqlite3.OperationalError:
         pass
+    # Issues de la cola normalizados (una fila por código) para agregarlos en SQL.
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS queue_issues (
+            doc_id TEXT,
+            code TEXT,
+            PRIMARY KEY (doc_id, code)
+        )
+        """
+    )
+    if cur.execute("SELECT 1 FROM queue_issues LIMIT 1").fetchone() is None:
+        backfill = [
+            (row[0], code)
+            for row in cur.execute("SELECT doc_id, reason, suggested FROM review_queue").fetchall()
+            for code in _queue_issue_codes(row[1], row[2])
+        ]
+        cur.executemany("INSERT OR IGNORE INTO queue_issues(doc_id, code) VALUES(?, ?)", backfill)
     cur.execute(
         """
         CREATE TABLE IF NOT EXISTS audit (
@@ -519,14 +638,43 @@ def init_db() -> None:
         )
         """
     )
+    cur.execute("CREATE TABLE IF NOT EXISTS readiness_probe(ts TEXT)")
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS job_cache (
+            slot TEXT PRIMARY KEY,
+            key TEXT,
+            value TEXT,
+            updated_at TEXT
+        )
+        """
+    )
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS llm_response_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT,
+            value TEXT,
+            created_at REAL
+        )
+        """
+    )
     index_statements = [
         "CREATE INDEX IF NOT EXISTS idx_docs_status_tenant ON docs(status, tenant)",
         "CREATE INDEX IF NOT EXISTS idx_docs_doc_type ON docs(doc_type)",
         "CREATE INDEX IF NOT EXISTS idx_docs_updated_at ON docs(updated_at)",
+        "CREATE INDEX IF NOT EXISTS idx_docs_supplier_nif ON docs(supplier_nif)",
+        # learning.find_no_rule_gaps: filtra por tenant y evalúa el LIKE sobre el índice, sin tocar la tabla.
+        "CREATE INDEX IF NOT EXISTS idx_docs_tenant_issues ON docs(tenant, issues) WHERE issues IS NOT NULL",
         "CREATE INDEX IF NOT EXISTS idx_bank_tx_tenant_matched ON bank_tx(tenant, matched_doc_id)",
         "CREATE INDEX IF NOT EXISTS idx_matches_doc_id ON matches(doc_id)",
         "CREATE INDEX IF NOT EXISTS idx_jobs_enabled_schedule ON jobs(enabled, schedule)",
+        # list_jobs(only_enabled=True) en cada tick: búsqueda por enabled ya ordenada por id.
+        "CREATE INDEX IF NOT EXISTS idx_jobs_enabled_id ON jobs(enabled, id)",
         "CREATE INDEX IF NOT EXISTS idx_review_queue_created_at ON review_queue(created_at)",
+        "CREATE INDEX IF NOT EXISTS idx_queue_issues_code ON queue_issues(code)",
+        # Purga de caducadas en _PersistentResponseCache.prune.
+        "CREATE INDEX IF NOT EXISTS idx_llm_response_cache_created_at ON llm_response_cache(created_at)",
         "CREATE INDEX IF NOT EXISTS idx_audit_doc_step ON audit(doc_id, step)",
         "CREATE INDEX IF NOT EXISTS idx_dedupe_tenant_nif ON dedupe(tenant, supplier_nif, inv_number, inv_date)",
         "CREATE INDEX IF NOT EXISTS idx_login_attempts_user_time ON login_attempts(username, created_at)",
@@ -541,21 +689,152 @@ def init_db() -> None:
 
 init_db()
 
+_CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL;",
+    "PRAGMA synchronous=NORMAL;",
+    "PRAGMA busy_timeout=5000;",
+    "PRAGMA cache_size=-64000;",
+    "PRAGMA temp_store=MEMORY;",
+    "PRAGMA mmap_size=268435456;",
+)
+
+_conn_local = threading.local()
+_conn_generation = 0
+# Conexión abierta -> finalizador que la cierra cuando termina el hilo que la creó.
+_open_connections: Dict[sqlite3.Connection, weakref.finalize] = {}
+_open_connections_lock = threading.Lock()
+
+
+class _ThreadMarker:
+    """Vive en el threading.local del hilo: se libera (y dispara los finalizadores) al terminar el hilo."""
+
+    __slots__ = ("__weakref__",)
+
+
+def _thread_marker() -> _ThreadMarker:
+    marker = getattr(_conn_local, "marker", None)
+    if marker is None:
+        marker = _conn_local.marker = _ThreadMarker()
+    return marker
+
+
+def _open_connection(db_path: Path, read_only: bool = False) -> sqlite3.Connection:
+    # check_same_thread=False solo para poder cerrarla en atexit: cada hilo usa la suya.
+    if read_only:
+        conn = sqlite3.connect(f"{db_path.resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+        pragmas = _CONNECTION_PRAGMAS[1:] + ("PRAGMA query_only=1;",)
+    else:
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        pragmas = _CONNECTION_PRAGMAS
+    conn.row_factory = sqlite3.Row
+    for pragma in pragmas:
+        try:
+            conn.execute(pragma)
+        except sqlite3.OperationalError:
+            pass
+    finalizer = weakref.finalize(_thread_marker(), _discard_connection, conn)
+    finalizer.atexit = False  # de la salida del proceso se encarga close_connections
+    with _open_connections_lock:
+        _open_connections[conn] = finalizer
+    return conn
+
+
+def _discard_connection(conn: sqlite3.Connection) -> None:
+    with _open_connections_lock:
+        finalizer = _open_connections.pop(conn, None)
+    if finalizer is not None:
+        finalizer.detach()
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
+def _thread_connection() -> sqlite3.Connection:
+    """Conexión reutilizable por hilo (y proceso) para la BD activa en DB_PATH."""
+    key = (os.getpid(), _conn_generation, str(DB_PATH))
+    conn = getattr(_conn_local, "conn", None)
+    if conn is not None and getattr(_conn_local, "key", None) == key:
+        return conn
+    if conn is not None and getattr(_conn_local, "key", (None,))[0] == key[0]:
+        _discard_connection(conn)
+    conn = _open_connection(DB_PATH)
+    _conn_local.conn = conn
+    _conn_local.key = key
+    _conn_local.depth = 0
+    return conn
+
+
+def _thread_reader() -> sqlite3.Connection:
+    """Conexión de solo lectura por hilo: las consultas no comparten conexión con las escrituras."""
+    key = (os.getpid(), _conn_generation, str(DB_PATH))
+    conn = getattr(_conn_local, "reader", None)
+    if conn is not None and getattr(_conn_local, "reader_key", None) == key:
+        return conn
+    if conn is not None and getattr(_conn_local, "reader_key", (None,))[0] == key[0]:
+        _discard_connection(conn)
+    conn = _open_connection(DB_PATH, read_only=True)
+    _conn_local.reader = conn
+    _conn_local.reader_key = key
+    return conn
+
+
+def close_connections() -> None:
+    """Cierra las conexiones reutilizadas (checkpoint del WAL incluido)."""
+    global _conn_generation
+    with _open_connections_lock:
+        _conn_generation += 1
+        conns = list(_open_connections.items())
+        _open_connections.clear()
+    for conn, finalizer in conns:
+        finalizer.detach()
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    _conn_local.__dict__.clear()
+
+
+atexit.register(close_connections)
+
+
 @contextmanager
 def get_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = _thread_connection()
+    _conn_local.depth += 1
     try:
-        conn.execute("PRAGMA journal_mode=WAL;")
-        conn.execute("PRAGMA synchronous=NORMAL;")
-        conn.execute("PRAGMA busy_timeout=3000;")
+        yield conn
+        if _conn_local.depth == 1:
+            conn.commit()
+    except BaseException:
+        if _conn_local.depth == 1:
+            conn.rollback()
+        raise
+    finally:
+        _conn_local.depth -= 1
+
+@contextmanager
+def get_reader():
+    """
+    Conexión de solo lectura (mode=ro, query_only) para consultas como list_jobs/next_due_jobs.
+    Dentro de una transacción abierta del hilo se usa la conexión de escritura para ver sus cambios.
+    """
+    if getattr(_conn_local, "depth", 0) > 0 and getattr(_conn_local, "conn", None) is not None:
+        with get_connection() as conn:
+            yield conn
+        return
+    try:
+        conn = _thread_reader()
     except sqlite3.OperationalError:
-        pass
+        # BD aún sin crear: mode=ro no puede abrirla.
+        with get_connection() as conn:
+            yield conn
+        return
     try:
         yield conn
-        conn.commit()
     finally:
-        conn.close()
+        if conn.in_transaction:
+            conn.rollback()
 
 def insert_or_get_doc(doc_id: str, sha256: str, filename: str, tenant: str) -> None:
     with get_connection() as conn:
@@ -661,6 +940,7 @@ def add_review_item(doc_id: str, reason: str, suggested: Optional[Dict[str, Any]
     payload = json.dumps(suggested or {}, ensure_ascii=False)
     doc_row = get_doc(doc_id)
     tenant_value = tenant or (doc_row["tenant"] if doc_row else settings.default_tenant)
+    codes = _queue_issue_codes(reason, suggested)
     with get_connection() as conn:
         conn.execute(
             """
@@ -669,10 +949,51 @@ def add_review_item(doc_id: str, reason: str, suggested: Optional[Dict[str, Any]
             """,
             (doc_id, reason, payload, tenant_value),
         )
+        conn.execute("DELETE FROM queue_issues WHERE doc_id = ?", (doc_id,))
+        conn.executemany(
+            "INSERT OR IGNORE INTO queue_issues(doc_id, code) VALUES(?, ?)",
+            [(doc_id, code) for code in codes],
+        )
 
 def remove_review_item(doc_id: str) -> None:
     with get_connection() as conn:
         conn.execute("DELETE FROM review_queue WHERE doc_id = ?", (doc_id,))
+        conn.execute("DELETE FROM queue_issues WHERE doc_id = ?", (doc_id,))
+
+
+def summarize_queue_issues(limit_per_issue: int, tenant: Optional[str] = None) -> Dict[str, Any]:
+    """Conteo por código de issue y primeros doc_ids (orden de llegada) agregados en SQLite."""
+    tenant_clause = " WHERE rq.tenant = ?" if tenant else ""
+    tenant_params: List[Any] = [tenant] if tenant else []
+    with get_connection() as conn:
+        total = conn.execute(
+            f"SELECT COUNT(*) FROM review_queue rq{tenant_clause}", tenant_params
+        ).fetchone()[0]
+        counts = conn.execute(
+            f"""
+            SELECT qi.code, COUNT(*) AS n
+            FROM queue_issues qi JOIN review_queue rq ON rq.doc_id = qi.doc_id{tenant_clause}
+            GROUP BY qi.code
+            ORDER BY n DESC, MIN(rq.created_at), qi.code
+            """,
+            tenant_params,
+        ).fetchall()
+        sample_rows = conn.execute(
+            f"""
+            SELECT code, doc_id FROM (
+                SELECT qi.code, qi.doc_id,
+                       ROW_NUMBER() OVER (PARTITION BY qi.code ORDER BY rq.created_at, rq.rowid) AS pos
+                FROM queue_issues qi JOIN review_queue rq ON rq.doc_id = qi.doc_id{tenant_clause}
+            )
+            WHERE pos <= ?
+            ORDER BY code, pos
+            """,
+            [*tenant_params, int(limit_per_issue)],
+        ).fetchall()
+    samples: Dict[str, List[str]] = {}
+    for code, doc_id in sample_rows:
+        samples.setdefault(code, []).append(doc_id)
+    return {"counts": [(code, n) for code, n in counts], "samples": samples, "total": total}
 
 
 def fetch_matches_for_doc(doc_id: str) -> List[sqlite3.Row]:
@@ -827,12 +1148,12 @@ def list_jobs(only_enabled: Optional[bool] = None) -> List[sqlite3.Row]:
         query += " WHERE enabled = ?"
         params.append(1 if only_enabled else 0)
     query += " ORDER BY id"
-    with get_connection() as conn:
+    with get_reader() as conn:
         return conn.execute(query, params).fetchall()
 
 
 def get_job(job_id: int) -> Optional[sqlite3.Row]:
-    with get_connection() as conn:
+    with get_reader() as conn:
         return conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
 
 
@@ -880,6 +1201,16 @@ def mark_job_started(job_id: int, host: str) -> None:
     _update_job_fields(job_id, run_started_at=iso_now(), run_host=host)
 
 
+def mark_jobs_started(job_ids: Iterable[int], host: str) -> None:
+    """Reclama varios jobs de golpe: un único commit en lugar de uno por job."""
+    ts = iso_now()
+    with get_connection() as conn:
+        conn.executemany(
+            "UPDATE jobs SET run_started_at = ?, run_host = ?, updated_at = ? WHERE id = ?",
+            [(ts, host, ts, job_id) for job_id in job_ids],
+        )
+
+
 def clear_job_start(job_id: int) -> None:
     _update_job_fields(job_id, run_started_at=None, run_host=None)
 
@@ -988,37 +1319,48 @@ def _parse_daily_time(schedule: str) -> Optional[datetime_time]:
     return None
 
 
+@lru_cache(maxsize=256)
+def _compile_schedule(schedule: str) -> Optional[Tuple[str, Any, bool]]:
+    """Parsea el schedule una sola vez: ('daily_at', hora, jitter) o ('interval', timedelta, jitter)."""
+    lower = schedule.strip().lower()
+    if not lower:
+        return None
+    jitter = False
+    if lower.endswith("_jitter"):
+        jitter = True
+        lower = lower[: -len("_jitter")]
+    if lower.startswith("daily_"):
+        return "daily_at", _parse_daily_time(lower) or datetime_time(2, 0), jitter
+    if lower == "daily":
+        interval = timedelta(days=1)
+    else:
+        interval = _parse_schedule_interval(lower)
+    if interval is None:
+        return None
+    return "interval", interval, jitter
+
+
 def _job_is_due(job: sqlite3.Row, now: Optional[datetime] = None) -> bool:
     if not job["enabled"]:
         return False
     schedule = job["schedule"]
     if not schedule:
         return False
-    schedule = schedule.strip()
-    if not schedule:
+    compiled = _compile_schedule(schedule)
+    if compiled is None:
         return False
+    kind, value, jitter = compiled
     now = now or utcnow()
     last_run = _parse_iso_ts(job["last_run_at"])
-    lower = schedule.lower()
-    jitter = False
-    if lower.endswith("_jitter"):
-        jitter = True
-        lower = lower[: -len("_jitter")]
-    if lower.startswith("daily_"):
-        target_time = _parse_daily_time(lower) or datetime_time(2, 0)
+    if kind == "daily_at":
         if last_run is None:
-            return now.time() >= target_time
-        if now.date() > last_run.date() and now.time() >= target_time:
+            return now.time() >= value
+        if now.date() > last_run.date() and now.time() >= value:
             return True
         if (now - last_run) >= timedelta(days=2):
             return True
         return False
-    if lower == "daily":
-        interval = timedelta(days=1)
-    else:
-        interval = _parse_schedule_interval(lower)
-    if interval is None:
-        return False
+    interval = value
     if last_run is None:
         return True
     if jitter:
@@ -1062,13 +1404,23 @@ def fetch_review_queue(
     limit: Optional[int] = None,
     offset: int = 0,
     tenant: Optional[str] = None,
+    doc_type_prefix: Optional[str] = None,
 ) -> List[sqlite3.Row]:
-    query = "SELECT * FROM review_queue"
+    query = "SELECT rq.* FROM review_queue rq"
+    clauses: List[str] = []
     params: List[Any] = []
+    if doc_type_prefix:
+        # Sin doc_type en docs se asume "invoice", igual que en hitl_service.
+        prefix = doc_type_prefix.lower()
+        query += " LEFT JOIN docs d ON d.doc_id = rq.doc_id"
+        clauses.append("substr(lower(COALESCE(d.doc_type, 'invoice')), 1, ?) = ?")
+        params.extend([len(prefix), prefix])
     if tenant:
-        query += " WHERE tenant = ?"
+        clauses.append("rq.tenant = ?")
         params.append(tenant)
-    query += " ORDER BY created_at"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY rq.created_at"
     if limit:
         query += " LIMIT ? OFFSET ?"
         params.extend([int(limit), int(offset)])
@@ -1076,6 +1428,34 @@ def fetch_review_queue(
         cur = conn.execute(query, params)
         return cur.fetchall()
 
+def fetch_review_row(doc_id: str, tenant: Optional[str] = None) -> Optional[sqlite3.Row]:
+    query = "SELECT * FROM review_queue WHERE doc_id = ?"
+    params: List[Any] = [doc_id]
+    if tenant:
+        query += " AND tenant = ?"
+        params.append(tenant)
+    with get_connection() as conn:
+        return conn.execute(query, params).fetchone()
+
+
+def fetch_review_queue_by_nif(nif: str) -> List[sqlite3.Row]:
+    """
+    Filas de la cola cuyo documento tiene ese NIF de proveedor (docs.supplier_nif).
+    Incluye también las de documentos sin supplier_nif materializado (NULL, procesados
+    antes de existir la columna) para que el llamante las resuelva leyendo el JSON.
+    """
+    with get_connection() as conn:
+        return conn.execute(
+            """
+            SELECT q.*, d.supplier_nif AS supplier_nif
+            FROM review_queue q
+            LEFT JOIN docs d ON d.doc_id = q.doc_id
+            WHERE d.supplier_nif = ? OR d.supplier_nif IS NULL
+            ORDER BY q.created_at
+            """,
+            (nif.upper(),),
+        ).fetchall()
+
 def add_audit(doc_id: str, step: str, who: str, before: Optional[Dict[str, Any]], after: Optional[Dict[str, Any]]) -> None:
     with get_connection() as conn:
         conn.execute(
@@ -1092,6 +1472,30 @@ def add_audit(doc_id: str, step: str, who: str, before: Optional[Dict[str, Any]]
             ),
         )
 
+def add_audit_bulk(
+    rows: Iterable[Tuple[str, str, str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]],
+) -> None:
+    """Inserta varias filas (doc_id, step, who, before, after) de auditoría en una sola transacción."""
+    ts = iso_now()
+    payload = [
+        (
+            doc_id,
+            step,
+            who,
+            json.dumps(before, ensure_ascii=False) if before else None,
+            json.dumps(after, ensure_ascii=False) if after else None,
+            ts,
+        )
+        for doc_id, step, who, before, after in rows
+    ]
+    if not payload:
+        return
+    with get_connection() as conn:
+        conn.executemany(
+            "INSERT INTO audit(doc_id, step, who, before, after, ts) VALUES(?, ?, ?, ?, ?, ?)",
+            payload,
+        )
+
 def upsert_dedupe(doc_id: str, tenant: str, supplier_nif: str, inv_number: str, inv_date: str, gross: Any) -> None:
     iso_date = normalize_date(inv_date) or today_iso()
     gross_amount = quantize_amount(gross)
@@ -1134,6 +1538,20 @@ def get_doc(doc_id: str) -> Optional[sqlite3.Row]:
         cur = conn.execute("SELECT * FROM docs WHERE doc_id = ?", (doc_id,))
         return cur.fetchone()
 
+def get_docs_bulk(doc_ids: Iterable[str]) -> Dict[str, sqlite3.Row]:
+    """Devuelve {doc_id: fila} para varios documentos con una consulta por bloque de ids."""
+    ids = list(dict.fromkeys(doc_ids))
+    result: Dict[str, sqlite3.Row] = {}
+    if not ids:
+        return result
+    with get_connection() as conn:
+        for start in range(0, len(ids), SQLITE_IN_CHUNK):
+            chunk = ids[start : start + SQLITE_IN_CHUNK]
+            placeholders = ",".join("?" * len(chunk))
+            for row in conn.execute(f"SELECT * FROM docs WHERE doc_id IN ({placeholders})", chunk):
+                result[row["doc_id"]] = row
+    return result
+
 def list_docs_by_status(status: str) -> List[sqlite3.Row]:
     with get_connection() as conn:
         cur = conn.execute(
@@ -1149,6 +1567,13 @@ def store_error(doc_id: str, message: str) -> None:
         )
 
 def read_json(path: Path) -> Dict[str, Any]:
+    if orjson is not None:
+        raw = path.read_bytes()
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # json estándar acepta NaN/Infinity; si tampoco puede, propaga JSONDecodeError.
+            return json.loads(raw.decode("utf-8"))
     with path.open("r", encoding="utf-8") as fh:
         return json.load(fh)
 
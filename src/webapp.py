@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from contextlib import asynccontextmanager
 from datetime import date
 import secrets
 from typing import Any, Dict, List, Optional
@@ -30,7 +31,14 @@ from . import (
 from .config import BASE_DIR, settings
 from . import bank_matcher
 
-app = FastAPI(title="CERTIVA HITL")
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    health.warmup()
+    yield
+
+
+app = FastAPI(title="CERTIVA HITL", lifespan=lifespan)
 templates = Jinja2Templates(directory=str(BASE_DIR / "templates"))
 ALLOWED_ROLES = {"admin", "operator", "viewer"}
 
@@ -198,8 +206,10 @@ async def dashboard(request: Request, user=Depends(auth.require_user)):
         ),
     )
 
+# Las rutas que leen la cola son síncronas: FastAPI las ejecuta en su pool de hilos, así no
+# bloquean el bucle y las lecturas idénticas concurrentes se comparten (hitl_service._single_flight).
 @app.get("/review")
-async def review_list(request: Request, user=Depends(auth.require_user)):
+def review_list(request: Request, user=Depends(auth.require_user)):
     doc_type = request.query_params.get("doc_type")
     issue_filter = request.query_params.get("issue")
     tenant = auth.current_tenant(request, user)
@@ -261,7 +271,7 @@ async def review_summary(request: Request, user=Depends(auth.require_user)):
 
 
 @app.get("/review/quick")
-async def review_quick(request: Request, user=Depends(auth.require_user)):
+def review_quick(request: Request, user=Depends(auth.require_user)):
     tenant = auth.current_tenant(request, user)
     issue_filter = request.query_params.get("issue")
     items = hitl_service.fetch_review_items(limit=15, offset=0, tenant=tenant, sort_by_issues=True, issue_filter=issue_filter)
@@ -342,7 +352,7 @@ async def conciliacion_force(
 
 
 @app.post("/review/bulk")
-async def review_bulk_action(
+def review_bulk_action(
     request: Request,
     csrf_token: str = Form(..., alias="_csrf_token"),
     action: str = Form(...),
@@ -380,7 +390,7 @@ async def review_bulk_action(
 
 
 @app.get("/review/{doc_id}")
-async def review_detail(doc_id: str, request: Request, user=Depends(auth.require_user)):
+def review_detail(doc_id: str, request: Request, user=Depends(auth.require_user)):
     tenant = auth.current_tenant(request, user)
     try:
         detail = hitl_service.get_review_detail(doc_id, tenant=tenant)
@@ -394,7 +404,7 @@ async def review_detail(doc_id: str, request: Request, user=Depends(auth.require
 
 
 @app.post("/review/{doc_id}/accept")
-async def accept_doc(
+def accept_doc(
     doc_id: str,
     request: Request,
     csrf_token: str = Form(..., alias="_csrf_token"),
@@ -1021,9 +1031,9 @@ async def healthz():
 
 
 @app.get("/readyz")
-async def readyz():
+async def readyz(deep: bool = False):
     try:
-        details = health.check_readiness()
+        details = health.check_readiness(deep=deep)
         return {"status": "ready", "details": details}
     except health.ReadinessError as exc:
         raise HTTPException(status_code=503, detail=exc.details)
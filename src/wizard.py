@@ -11,7 +11,7 @@ from .config import BASE_DIR
 
 def _reset_state() -> None:
     with utils.get_connection() as conn:
-        for table in ("docs", "review_queue", "audit", "dedupe"):
+        for table in ("docs", "review_queue", "queue_issues", "audit", "dedupe"):
             conn.execute(f"DELETE FROM {table}")
 
 
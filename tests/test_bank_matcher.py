@@ -130,3 +130,19 @@ def test_gather_bank_stats_rows(temp_certiva_env):
     assert stats["tx_matched"] == 1
     assert len(stats.get("matches") or []) == 1
     assert len(stats.get("unmatched") or []) == 1
+
+
+def test_import_bank_csv_batches_inserts(temp_certiva_env, monkeypatch):
+    bank_matcher = temp_certiva_env["bank_matcher"]
+    base = temp_certiva_env["base"]
+    monkeypatch.setattr(bank_matcher, "IMPORT_BATCH_SIZE", 2)
+    csv_path = base / "extracto.csv"
+    rows = ["Date,Amount,Description,Currency"]
+    rows += [f"2025-01-{day:02d},{day}.50,Movimiento {day},EUR" for day in range(1, 6)]
+    rows.append("2025-01-07,,Sin importe,EUR")
+    csv_path.write_text("\n".join(rows) + "\n", encoding="utf-8")
+    assert bank_matcher.import_bank_csv(csv_path, "demo") == 5
+    with utils.get_connection() as conn:
+        stored = conn.execute("SELECT amount, direction FROM bank_tx WHERE tenant = 'demo' ORDER BY date").fetchall()
+    assert [row["amount"] for row in stored] == [1.5, 2.5, 3.5, 4.5, 5.5]
+    assert {row["direction"] for row in stored} == {"CREDIT"}
@@ -29,3 +29,14 @@ def test_dual_llm_threshold_without_premium_docs_returns_current() -> None:
     res = evaluate_threshold_policy(900.0, premium_ratio=0.0, premium_values=[])
     assert res["suggested_threshold"] == 900.0
     assert res["reason"] == "sin_datos_premium"
+
+
+def test_fetch_doc_rows_chunks_large_id_lists(temp_certiva_env, monkeypatch) -> None:
+    from src.experiments import dual_llm_tuning
+
+    utils = temp_certiva_env["utils"]
+    for idx in range(7):
+        utils.insert_or_get_doc(f"doc-{idx}", f"sha-{idx}", f"f{idx}.pdf", "demo")
+    monkeypatch.setattr(dual_llm_tuning, "DOC_IDS_CHUNK_SIZE", 3)
+    rows = dual_llm_tuning._fetch_doc_rows([f"doc-{idx}" for idx in range(7)] + ["missing"])
+    assert sorted(row["doc_id"] for row in rows) == [f"doc-{idx}" for idx in range(7)]
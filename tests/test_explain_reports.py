@@ -19,3 +19,20 @@ def test_explain_pnl_uses_llm(temp_certiva_env, monkeypatch):
     result = explain_reports.explain_pnl(report)
     assert result == "Análisis simulado"
     assert "Ingresos totales" in captured["context"]
+
+
+def test_serialize_vat_totals_and_breakdown():
+    report = {
+        "soportado": {
+            "21": {"base": 100.0, "vat": 21.0},
+            "10": {"base": 50.0, "vat": 5.0},
+        },
+        "repercutido": {"21": {"base": 200.0, "vat": 42.0}},
+    }
+    text = explain_reports._serialize_vat(report)
+    lines = text.split("\n")
+    assert lines[0] == "IVA soportado total: 26,00"
+    assert lines[1] == "IVA repercutido total: 42,00"
+    assert lines[2] == "Saldo (repercutido - soportado): 16,00"
+    assert lines[5:7] == ["- 10: base 50,00, IVA 5,00", "- 21: base 100,00, IVA 21,00"]
+    assert lines[-2:] == ["Desglose repercutido:", "- 21: base 200,00, IVA 42,00"]
@@ -23,3 +23,15 @@ def test_a3_csv_contains_expected_header(tmp_path, monkeypatch):
     content = csv_path.read_text(encoding="utf-8").splitlines()
     assert content[0].split(",") == exporter.A3_CSV_COLUMNS
     assert "INV-1" in content[1]
+
+
+def test_a3_last_line_gets_supplier_account_without_mutating_entry(tmp_path, monkeypatch):
+    monkeypatch.setattr(exporter.utils, "BASE_DIR", tmp_path, raising=False)
+    entry = _sample_entry()
+    del entry["lines"][-1]["account"]
+    adapter = exporter.A3InnuvaAdapter(settings.default_tenant, {"supplier_account": "400999"})
+    csv_path = adapter.export_entry("doc124", entry)
+    rows = csv_path.read_text(encoding="utf-8").splitlines()
+    assert rows[1].split(",")[3] == "600000"
+    assert rows[2].split(",")[3] == "400999"
+    assert "account" not in entry["lines"][-1]
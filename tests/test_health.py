@@ -38,3 +38,43 @@ def test_readyz_db_failure(temp_certiva_env, monkeypatch):
     resp = client.get("/readyz")
     assert resp.status_code == 503
     assert "db" in resp.json()["detail"]
+
+
+def test_check_readiness_caches_success(temp_certiva_env, monkeypatch):
+    monkeypatch.setattr(config.settings, "readiness_cache_ttl", 60.0)
+    health.invalidate_readiness_cache()
+    calls = []
+    monkeypatch.setattr(
+        health, "_check_db", lambda details: (calls.append(1), details.update(db="ok"))
+    )
+    assert health.check_readiness()["db"] == "ok"
+    assert health.check_readiness()["db"] == "ok"
+    assert len(calls) == 1
+    health.invalidate_readiness_cache()
+    health.check_readiness()
+    assert len(calls) == 2
+
+
+def test_check_directory_write_probe_once(tmp_path, monkeypatch):
+    created = []
+    real_tmp = health.tempfile.NamedTemporaryFile
+
+    def counting_tmp(*args, **kwargs):
+        created.append(kwargs.get("dir"))
+        return real_tmp(*args, **kwargs)
+
+    monkeypatch.setattr(health.tempfile, "NamedTemporaryFile", counting_tmp)
+    target = tmp_path / "nuevo"
+    health._check_directory(target)
+    health._check_directory(target)
+    assert target.is_dir()
+    assert created == [target]
+    health._check_directory(target, deep=True)
+    assert len(created) == 2
+
+
+def test_warmup_creates_check_dirs(tmp_path, monkeypatch):
+    dirs = [("a", tmp_path / "a"), ("b", tmp_path / "x" / "b")]
+    monkeypatch.setattr(health, "CHECK_DIRS", dirs)
+    health.warmup()
+    assert all(path.is_dir() for _, path in dirs)
@@ -0,0 +1,308 @@
+import pytest
+
+from src import hitl_service, utils
+
+
+def _seed_review_doc(
+    env, doc_id, *, tenant="demo", nif="B12345678", doc_type="invoice", issues=None
+):
+    base = env["base"]
+    utils.insert_or_get_doc(doc_id, doc_id, f"{doc_id}.pdf", tenant)
+    utils.update_doc_metadata(doc_id, doc_type=doc_type, global_conf=0.5)
+    normalized = {
+        "doc_id": doc_id,
+        "tenant": tenant,
+        "supplier": {"name": f"Proveedor {doc_id}", "nif": nif},
+        "invoice": {"number": f"F-{doc_id}", "date": "2025-01-10"},
+        "totals": {"base": 100.0, "vat": 21.0, "gross": 121.0},
+        "lines": [{"desc": "Servicio", "amount": 100.0, "vat_rate": 21.0}],
+        "metadata": {"doc_type": doc_type},
+    }
+    entry = {
+        "lines": [
+            {"account": "600000", "debit": 100.0},
+            {"account": "410000", "credit": 121.0},
+        ]
+    }
+    utils.json_dump(normalized, base / "OUT" / "json" / f"{doc_id}.json")
+    utils.json_dump(entry, base / "OUT" / "json" / f"{doc_id}.entry.json")
+    payload = {
+        "issues": issues if issues is not None else ["NO_RULE"],
+        "suggestion": {"account": "629000"},
+    }
+    utils.add_review_item(doc_id, ";".join(payload["issues"]), payload, tenant=tenant)
+
+
+def test_fetch_review_items_loads_rows_and_json(temp_certiva_env):
+    for idx in range(3):
+        _seed_review_doc(temp_certiva_env, f"doc-{idx}")
+    items = hitl_service.fetch_review_items()
+    assert sorted(item.doc_id for item in items) == ["doc-0", "doc-1", "doc-2"]
+    first = items[0]
+    assert first.supplier["name"] == f"Proveedor {first.doc_id}"
+    assert first.confidences["global"] == 0.5
+    assert first.issues == ["NO_RULE"]
+    assert first.suggestion == {"account": "629000"}
+
+
+def test_get_review_detail_reads_single_queue_row(temp_certiva_env):
+    _seed_review_doc(temp_certiva_env, "doc-a", issues=["NO_RULE", "LOW_CONFIDENCE"])
+    _seed_review_doc(temp_certiva_env, "doc-b")
+    detail = hitl_service.get_review_detail("doc-a", tenant="demo")
+    assert detail["issues"] == ["NO_RULE", "LOW_CONFIDENCE"]
+    assert detail["suggestion"] == {"account": "629000"}
+
+
+def test_apply_rule_to_similar_matches_by_supplier_nif(temp_certiva_env, monkeypatch):
+    _seed_review_doc(temp_certiva_env, "doc-src", nif="B11111111")
+    _seed_review_doc(temp_certiva_env, "doc-same", nif="b11111111")
+    _seed_review_doc(temp_certiva_env, "doc-legacy", nif="B11111111")
+    _seed_review_doc(temp_certiva_env, "doc-other", nif="B22222222")
+    utils.update_doc_metadata("doc-same", supplier_nif="B11111111")
+    utils.update_doc_metadata("doc-other", supplier_nif="B22222222")
+    reprocessed = []
+    monkeypatch.setattr(
+        hitl_service.pipeline, "reprocess_from_json", reprocessed.append
+    )
+    hitl_service._apply_rule_to_similar("B11111111", "doc-src", "tester")
+    assert sorted(reprocessed) == ["doc-legacy", "doc-same"]
+    with utils.get_connection() as conn:
+        audited = conn.execute(
+            "SELECT doc_id, who FROM audit WHERE step = 'HITL_AUTO_REPROCESS' ORDER BY doc_id"
+        ).fetchall()
+    assert [(row["doc_id"], row["who"]) for row in audited] == [
+        ("doc-legacy", "tester"),
+        ("doc-same", "tester"),
+    ]
+
+
+def test_apply_rule_to_similar_audits_successes_when_one_reprocess_fails(
+    temp_certiva_env, monkeypatch
+):
+    for doc_id in ("doc-src", "doc-ok-1", "doc-roto", "doc-ok-2"):
+        _seed_review_doc(temp_certiva_env, doc_id, nif="B11111111")
+        utils.update_doc_metadata(doc_id, supplier_nif="B11111111")
+    monkeypatch.setattr(hitl_service.settings, "pipeline_concurrency", 3)
+
+    def reprocess(doc_id):
+        if doc_id == "doc-roto":
+            raise RuntimeError("pipeline caído")
+
+    monkeypatch.setattr(hitl_service.pipeline, "reprocess_from_json", reprocess)
+    with pytest.raises(RuntimeError):
+        hitl_service._apply_rule_to_similar("B11111111", "doc-src", "tester")
+    with utils.get_connection() as conn:
+        audited = conn.execute(
+            "SELECT doc_id FROM audit WHERE step = 'HITL_AUTO_REPROCESS' ORDER BY doc_id"
+        ).fetchall()
+    assert [row["doc_id"] for row in audited] == ["doc-ok-1", "doc-ok-2"]
+
+
+def test_load_json_reuses_parse_until_file_changes(temp_certiva_env, monkeypatch):
+    _seed_review_doc(temp_certiva_env, "doc-cache")
+    hitl_service._read_json_cached.cache_clear()
+    first = hitl_service._load_json("doc-cache")
+    assert hitl_service._load_json("doc-cache") is first
+    path = temp_certiva_env["base"] / "OUT" / "json" / "doc-cache.json"
+    updated = dict(first, supplier={"name": "Otro proveedor", "nif": "B99999999"})
+    utils.json_dump(updated, path)
+    assert hitl_service._load_json("doc-cache")["supplier"]["name"] == "Otro proveedor"
+
+
+def test_fetch_review_items_issue_filter_skips_json_reads(
+    temp_certiva_env, monkeypatch
+):
+    _seed_review_doc(temp_certiva_env, "doc-rule", issues=["NO_RULE"])
+    _seed_review_doc(temp_certiva_env, "doc-dup", issues=["duplicate"])
+    loaded = []
+    original = hitl_service._load_json
+
+    def tracking_load(doc_id):
+        loaded.append(doc_id)
+        return original(doc_id)
+
+    monkeypatch.setattr(hitl_service, "_load_json", tracking_load)
+    items = hitl_service.fetch_review_items(issue_filter="Duplicate")
+    assert [item.doc_id for item in items] == ["doc-dup"]
+    assert loaded == ["doc-dup"]
+
+
+def test_summarize_review_queue_counts_and_samples(temp_certiva_env):
+    _seed_review_doc(temp_certiva_env, "doc-1", issues=["NO_RULE", "LOW_CONFIDENCE"])
+    _seed_review_doc(temp_certiva_env, "doc-2", issues=["NO_RULE"])
+    _seed_review_doc(temp_certiva_env, "doc-3", issues=[])
+    summary = hitl_service.summarize_review_queue(limit_per_issue=1)
+    assert summary["total"] == 3
+    assert summary["counts"][0] == ("NO_RULE", 2)
+    assert dict(summary["counts"]) == {"NO_RULE": 2, "LOW_CONFIDENCE": 1, "NO_ISSUE": 1}
+    assert summary["samples"]["NO_RULE"] == ["doc-1"]
+
+
+def test_concurrent_identical_reads_share_one_call(temp_certiva_env, monkeypatch):
+    import threading
+    import time
+
+    _seed_review_doc(temp_certiva_env, "doc-sf")
+    calls = []
+    started = threading.Event()
+    original = utils.fetch_review_queue
+
+    def slow_queue(*args, **kwargs):
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(hitl_service.utils, "fetch_review_queue", slow_queue)
+    results = []
+    first = threading.Thread(
+        target=lambda: results.append(hitl_service.fetch_review_items(tenant="demo"))
+    )
+    second = threading.Thread(
+        target=lambda: results.append(hitl_service.fetch_review_items(tenant="demo"))
+    )
+    first.start()
+    started.wait(1)
+    second.start()
+    first.join()
+    second.join()
+    assert len(calls) == 1
+    assert [[item.doc_id for item in res] for res in results] == [
+        ["doc-sf"],
+        ["doc-sf"],
+    ]
+    # Cada llamada recibe su copia: lo que cambie una no se ve en la otra.
+    results[0][0].supplier["name"] = "cambiado"
+    assert results[1][0].supplier["name"] == "Proveedor doc-sf"
+
+
+def test_edit_doc_rewrites_pair_and_audits_rule_before_reprocess(
+    temp_certiva_env, monkeypatch
+):
+    _seed_review_doc(temp_certiva_env, "doc-edit")
+    monkeypatch.setattr(
+        hitl_service.pipeline, "reprocess_from_json", lambda doc_id: None
+    )
+    hitl_service.edit_doc("doc-edit", "629000", 10.0, actor="tester")
+    out = temp_certiva_env["base"] / "OUT" / "json"
+    assert (
+        utils.read_json(out / "doc-edit.entry.json")["lines"][0]["account"] == "629000"
+    )
+    assert utils.read_json(out / "doc-edit.json")["lines"][0]["vat_rate"] == 10.0
+    assert not list(out.glob(".*.tmp"))
+    with utils.get_connection() as conn:
+        steps = conn.execute(
+            "SELECT step, ts FROM audit WHERE doc_id = 'doc-edit' ORDER BY rowid"
+        ).fetchall()
+    assert [row["step"] for row in steps] == ["LEARN_RULE", "HITL_EDIT"]
+
+    def failing_reprocess(doc_id):
+        raise RuntimeError("pipeline caído")
+
+    monkeypatch.setattr(hitl_service.pipeline, "reprocess_from_json", failing_reprocess)
+    _seed_review_doc(temp_certiva_env, "doc-accept")
+    with pytest.raises(RuntimeError):
+        hitl_service.accept_doc("doc-accept", actor="tester", learn_rule=True)
+    with utils.get_connection() as conn:
+        steps = conn.execute(
+            "SELECT step FROM audit WHERE doc_id = 'doc-accept' ORDER BY rowid"
+        ).fetchall()
+    # La regla ya está en el CSV: su auditoría no depende de que el reprocesado termine.
+    assert [row["step"] for row in steps] == ["LEARN_RULE"]
+
+
+def test_review_queue_never_returns_other_tenants(temp_certiva_env):
+    _seed_review_doc(temp_certiva_env, "doc-demo", tenant="demo")
+    _seed_review_doc(temp_certiva_env, "doc-acme", tenant="acme")
+    assert [row["doc_id"] for row in utils.fetch_review_queue(tenant="acme")] == [
+        "doc-acme"
+    ]
+    assert [item.doc_id for item in hitl_service.fetch_review_items(tenant="demo")] == [
+        "doc-demo"
+    ]
+    assert len(hitl_service.fetch_review_items()) == 2
+
+
+def test_review_doc_has_no_instance_dict(temp_certiva_env):
+    _seed_review_doc(temp_certiva_env, "doc-slots")
+    item = hitl_service.fetch_review_items()[0]
+    assert not hasattr(item, "__dict__")
+
+
+def test_doc_type_prefix_filtered_in_sql(temp_certiva_env, monkeypatch):
+    _seed_review_doc(temp_certiva_env, "doc-inv", doc_type="Invoice")
+    _seed_review_doc(temp_certiva_env, "doc-cn", doc_type="credit_note")
+    loaded = []
+    original = hitl_service._load_json_many
+
+    def tracking(doc_ids):
+        loaded.extend(doc_ids)
+        return original(doc_ids)
+
+    monkeypatch.setattr(hitl_service, "_load_json_many", tracking)
+    items = hitl_service.fetch_review_items(doc_type_prefix="inv")
+    assert [item.doc_id for item in items] == ["doc-inv"]
+    assert loaded == ["doc-inv"]
+    assert [
+        row["doc_id"] for row in utils.fetch_review_queue(doc_type_prefix="CREDIT")
+    ] == ["doc-cn"]
+
+
+def test_summarize_review_queue_tracks_requeue_and_removal(temp_certiva_env):
+    _seed_review_doc(temp_certiva_env, "doc-1", tenant="demo", issues=["NO_RULE"])
+    _seed_review_doc(temp_certiva_env, "doc-2", tenant="acme", issues=["NO_RULE"])
+    utils.add_review_item("doc-1", "", {"issues": ["LOW_CONFIDENCE"]})
+    summary = hitl_service.summarize_review_queue()
+    assert dict(summary["counts"]) == {"NO_RULE": 1, "LOW_CONFIDENCE": 1}
+    assert hitl_service.summarize_review_queue(tenant="acme")["samples"] == {
+        "NO_RULE": ["doc-2"]
+    }
+    utils.remove_review_item("doc-2")
+    summary = hitl_service.summarize_review_queue()
+    assert summary == {
+        "counts": [("LOW_CONFIDENCE", 1)],
+        "samples": {"LOW_CONFIDENCE": ["doc-1"]},
+        "total": 1,
+    }
+
+
+def test_import_backfills_queue_issues_of_existing_database(tmp_path):
+    import shutil
+    import sqlite3
+    import subprocess
+    import sys
+
+    shutil.copytree(
+        utils.BASE_DIR / "src",
+        tmp_path / "src",
+        ignore=shutil.ignore_patterns("__pycache__"),
+    )
+    (tmp_path / "db").mkdir()
+    conn = sqlite3.connect(tmp_path / "db" / "docs.sqlite")
+    conn.execute(
+        "CREATE TABLE review_queue (doc_id TEXT PRIMARY KEY, reason TEXT, suggested TEXT, tenant TEXT)"
+    )
+    conn.executemany(
+        "INSERT INTO review_queue VALUES (?, ?, ?, 'demo')",
+        [
+            ("doc-1", "NO_RULE", '{"issues": ["NO_RULE", "LOW_CONFIDENCE"]}'),
+            ("doc-2", "", "{}"),
+        ],
+    )
+    conn.commit()
+    conn.close()
+    subprocess.run(
+        [sys.executable, "-c", "import src.utils"],
+        cwd=tmp_path,
+        capture_output=True,
+        check=True,
+    )
+    with sqlite3.connect(tmp_path / "db" / "docs.sqlite") as conn:
+        rows = conn.execute(
+            "SELECT doc_id, code FROM queue_issues ORDER BY doc_id, code"
+        ).fetchall()
+    assert rows == [
+        ("doc-1", "LOW_CONFIDENCE"),
+        ("doc-1", "NO_RULE"),
+        ("doc-2", "NO_ISSUE"),
+    ]
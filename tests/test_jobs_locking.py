@@ -1,5 +1,9 @@
+import sqlite3
+import threading
 from datetime import datetime, timedelta, timezone
 
+import pytest
+
 from src import jobs, utils
 
 
@@ -35,3 +39,284 @@ def test_run_job_marks_skipped_on_jobskipped(temp_certiva_env):
     jobs.run_job(job)
     updated = utils.get_job(job_id)
     assert updated["last_status"] == "skipped"
+
+
+def test_job_connections_use_wal_and_busy_timeout(temp_certiva_env):
+    utils.create_job("pragmas", "run_preflight", tenant="demo", config={}, schedule="every_5m", enabled=True)
+    with utils.get_connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+        assert conn.execute("PRAGMA cache_size").fetchone()[0] == -64000
+
+
+def test_backup_db_copies_checkpointed_database(temp_certiva_env, tmp_path):
+    job_id = utils.create_job("backup", "backup_db", config={"dest_dir": str(tmp_path)}, enabled=True)
+    jobs.run_job(utils.get_job(job_id))
+    assert len(list(tmp_path.glob("docs_*.sqlite"))) == 1
+
+
+def test_job_queries_use_read_only_connection(temp_certiva_env):
+    job_id = utils.create_job("reader", "run_preflight", tenant="demo", config={}, schedule="every_5m", enabled=True)
+    assert utils.get_job(job_id)["name"] == "reader"
+    with utils.get_reader() as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("DELETE FROM jobs")
+    utils.set_job_enabled(job_id, False)
+    assert utils.get_job(job_id)["enabled"] == 0
+    with utils.get_connection():
+        utils.set_job_enabled(job_id, True)
+        # Dentro de la transacción del hilo se leen sus propios cambios.
+        assert utils.get_job(job_id)["enabled"] == 1
+
+
+def test_thread_connections_are_closed_when_thread_exits(temp_certiva_env):
+    utils.create_job("hilos", "run_preflight", tenant="demo", config={}, enabled=True)
+    before = len(utils._open_connections)
+
+    def touch_db():
+        utils.list_jobs()
+        with utils.get_connection() as conn:
+            conn.execute("SELECT 1")
+
+    for _ in range(20):
+        worker = threading.Thread(target=touch_db)
+        worker.start()
+        worker.join()
+    assert len(utils._open_connections) == before
+
+
+def test_run_due_claims_all_jobs_before_running(temp_certiva_env, monkeypatch):
+    first = utils.create_job("a", "run_preflight", tenant="demo", config={}, schedule="every_5m", enabled=True)
+    second = utils.create_job("b", "run_preflight", tenant="demo", config={}, schedule="every_5m", enabled=True)
+    seen = []
+
+    def fake_preflight(tenant=None):
+        seen.append(utils.get_job(second)["run_host"])
+        return ""
+
+    monkeypatch.setattr(jobs.metrics, "format_preflight", fake_preflight)
+    jobs.cmd_run_due(None)
+    # El segundo job ya está reclamado mientras corre el primero.
+    assert seen == [jobs.HOSTNAME, jobs.HOSTNAME]
+    for job_id in (first, second):
+        assert utils.get_job(job_id)["last_status"] == "success"
+        assert utils.get_job(job_id)["run_host"] is None
+
+
+def test_spawn_and_wait_reports_exit_code():
+    jobs._spawn_and_wait(["true"])
+    with pytest.raises(jobs.subprocess.CalledProcessError) as excinfo:
+        jobs._spawn_and_wait(["false"])
+    assert excinfo.value.returncode == 1
+
+
+def test_run_due_runs_job_types_in_parallel(temp_certiva_env, monkeypatch):
+    utils.create_job("pre", "run_preflight", tenant="demo", config={}, schedule="every_5m", enabled=True)
+    utils.create_job("alerts", "run_alerts", tenant="demo", config={}, schedule="every_5m", enabled=True)
+    barrier = threading.Barrier(2, timeout=5)
+
+    def no_alerts(tenant=None):
+        # Solo pasa la barrera si el preflight corre a la vez en otro hilo.
+        barrier.wait()
+        return []
+
+    monkeypatch.setattr(jobs.metrics, "format_preflight", lambda tenant=None: str(barrier.wait()))
+    monkeypatch.setattr(jobs.alerts, "evaluate_alerts", no_alerts)
+    jobs.cmd_run_due(None)
+    assert {job["last_status"] for job in utils.list_jobs()} == {"success"}
+
+
+def test_policy_job_reuses_cached_simulation_until_docs_change(temp_certiva_env, monkeypatch):
+    job_id = utils.create_job("policy", "run_policy_sim", config={"policy": "balanced"}, enabled=True)
+    calls = []
+    real_simulate = jobs.policy_sim.simulate_policy
+
+    def counting_simulate(*args, **kwargs):
+        calls.append(1)
+        return real_simulate(*args, **kwargs)
+
+    monkeypatch.setattr(jobs.policy_sim, "simulate_policy", counting_simulate)
+    jobs.run_job(utils.get_job(job_id))
+    jobs.run_job(utils.get_job(job_id))
+    assert len(calls) == 1
+    utils.insert_or_get_doc("doc-new", "sha", "doc-new.pdf", "demo")
+    jobs.run_job(utils.get_job(job_id))
+    assert len(calls) == 2
+
+
+def test_scan_folder_processes_documents_concurrently(temp_certiva_env, monkeypatch, tmp_path):
+    inbox = tmp_path / "inbox"
+    inbox.mkdir()
+    for idx in range(4):
+        (inbox / f"doc{idx}.pdf").write_bytes(f"%PDF-{idx}".encode())
+    monkeypatch.setattr(jobs.settings, "pipeline_concurrency", 2)
+    barrier = threading.Barrier(2, timeout=5)
+
+    def fake_process(path, tenant=None):
+        barrier.wait()
+        return path.stem
+
+    monkeypatch.setattr(jobs.pipeline, "process_file", fake_process)
+    archive = tmp_path / "archive"
+    job_id = utils.create_job("scan", "scan_folder", config={"path": str(inbox), "archive": str(archive)}, enabled=True)
+    jobs.run_job(utils.get_job(job_id))
+    assert sorted(p.name for p in archive.iterdir()) == [f"doc{idx}.pdf" for idx in range(4)]
+    assert utils.get_job(job_id)["last_status"] == "success"
+
+
+def test_process_source_archives_successes_when_one_document_fails(monkeypatch, tmp_path):
+    from types import SimpleNamespace
+
+    documents = [SimpleNamespace(path=tmp_path / f"doc{idx}.pdf", sha256=str(idx)) for idx in range(4)]
+    marked = []
+    source = SimpleNamespace(
+        tenant="demo",
+        list_new_documents=lambda: documents,
+        mark_processed=lambda document, doc_id: marked.append(doc_id),
+    )
+
+    def fake_process(path, tenant=None):
+        if path.stem == "doc1":
+            raise RuntimeError("OCR roto")
+        return path.stem
+
+    monkeypatch.setattr(jobs.settings, "pipeline_concurrency", 2)
+    monkeypatch.setattr(jobs.pipeline, "process_file", fake_process)
+    with pytest.raises(RuntimeError, match="OCR roto"):
+        jobs._process_source(source)
+    assert sorted(marked) == ["doc0", "doc2", "doc3"]
+
+
+def test_json_config_parses_once_and_returns_private_copy():
+    job = {"config": '{"tenant": "acme", "limit": 3}', "tenant": None}
+    first = jobs._json_config(job)
+    first["limit"] = 99
+    assert jobs._json_config(job) == {"tenant": "acme", "limit": 3}
+    assert jobs._parse_config.cache_info().hits >= 1
+    assert jobs._json_config({"config": "{roto"}) == {}
+    assert jobs._resolve_tenant(job, first) == "acme"
+
+
+def test_importing_jobs_defers_heavy_modules():
+    import subprocess
+    import sys
+
+    code = (
+        "import sys, src.jobs; "
+        "print(','.join(m for m in ('src.pipeline', 'src.metrics', 'src.bank_matcher') if m in sys.modules))"
+    )
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
+
+
+def test_run_job_retries_with_capped_decorrelated_jitter(temp_certiva_env, monkeypatch):
+    job_id = utils.create_job(
+        "flaky", "run_preflight", config={"max_retries": 3, "retry_delay": 40}, enabled=True
+    )
+    attempts = []
+
+    def flaky(tenant=None):
+        attempts.append(1)
+        if len(attempts) < 4:
+            raise RuntimeError("caído")
+        return ""
+
+    waits = []
+    monkeypatch.setattr(jobs.metrics, "format_preflight", flaky)
+    monkeypatch.setattr(jobs._SHUTDOWN, "wait", lambda timeout: waits.append(timeout) or False)
+    monkeypatch.setattr(jobs.random, "uniform", lambda low, high: high)
+    jobs.run_job(utils.get_job(job_id))
+    assert waits == [120.0, 300.0, 300.0]
+    assert utils.get_job(job_id)["last_status"] == "success"
+
+
+def test_backup_db_includes_uncheckpointed_rows(temp_certiva_env, tmp_path):
+    job_id = utils.create_job("backup-online", "backup_db", config={"dest_dir": str(tmp_path)}, enabled=True)
+    jobs.run_job(utils.get_job(job_id))
+    backup = next(tmp_path.glob("docs_*.sqlite"))
+    with sqlite3.connect(backup) as conn:
+        names = [row[0] for row in conn.execute("SELECT name FROM jobs")]
+        assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    assert "backup-online" in names
+
+
+def test_prepared_job_is_rebuilt_when_config_changes(temp_certiva_env):
+    job_id = utils.create_job("prep", "run_preflight", config={"max_retries": 1}, enabled=True)
+    first = jobs._prepare_job(utils.get_job(job_id))
+    assert jobs._prepare_job(utils.get_job(job_id)) is first
+    utils.update_job_config(job_id, {"max_retries": 2})
+    second = jobs._prepare_job(utils.get_job(job_id))
+    assert second is not first
+    assert second.max_retries == 2
+
+
+def test_enabled_jobs_query_uses_index_without_sort(temp_certiva_env):
+    with utils.get_connection() as conn:
+        plan = " ".join(
+            row[3] for row in conn.execute("EXPLAIN QUERY PLAN SELECT * FROM jobs WHERE enabled = ? ORDER BY id", (1,))
+        )
+    assert "idx_jobs_enabled_id" in plan
+    assert "TEMP B-TREE" not in plan
+
+
+def test_run_alerts_records_outcome_once(temp_certiva_env, monkeypatch):
+    job_id = utils.create_job("alerts-once", "run_alerts", config={}, enabled=True)
+    monkeypatch.setattr(jobs.alerts, "evaluate_alerts", lambda tenant=None: [])
+    recorded = []
+    real_record = utils.record_job_run
+    monkeypatch.setattr(utils, "record_job_run", lambda *args: recorded.append(args) or real_record(*args))
+    jobs.run_job(utils.get_job(job_id))
+    assert recorded == [(job_id, "success")]
+
+
+def test_build_parser_only_builds_requested_subcommand(temp_certiva_env):
+    parser = jobs.build_parser("run")
+    args = parser.parse_args(["run", "--id", "3"])
+    assert args.func is jobs.cmd_run and args.id == 3
+    with pytest.raises(SystemExit):
+        parser.parse_args(["list"])
+    full = jobs.build_parser()
+    for name in jobs._SUBCOMMANDS:
+        assert full.parse_known_args([name, "--id", "1", "--name", "x", "--path", "p"])[0].command == name
+
+
+def test_schedule_is_compiled_once(temp_certiva_env):
+    from datetime import datetime, time, timedelta
+
+    utils._compile_schedule.cache_clear()
+    assert utils._compile_schedule("daily_03:30") == ("daily_at", time(3, 30), False)
+    assert utils._compile_schedule("every_15m_jitter") == ("interval", timedelta(minutes=15), True)
+    assert utils._compile_schedule("nonsense") is None
+    job = {"enabled": 1, "schedule": "every_15m", "last_run_at": "2024-01-01T10:00:00"}
+    assert utils._job_is_due(job, datetime(2024, 1, 1, 10, 20))
+    assert not utils._job_is_due(job, datetime(2024, 1, 1, 10, 10))
+    utils._job_is_due(job, datetime(2024, 1, 1, 10, 30))
+    assert utils._compile_schedule.cache_info().hits >= 2
+
+
+def test_shutdown_interrupts_retry_wait_and_releases_pending_jobs(temp_certiva_env, monkeypatch):
+    failing = utils.create_job("flaky", "run_preflight", config={"max_retries": 5, "retry_delay": 60}, enabled=True)
+    pending = utils.create_job("pending", "run_preflight", config={}, enabled=True)
+
+    def broken(tenant=None):
+        jobs._SHUTDOWN.set()
+        raise RuntimeError("caído")
+
+    monkeypatch.setattr(jobs.metrics, "format_preflight", broken)
+    monkeypatch.setattr(jobs, "_SHUTDOWN", threading.Event())
+    utils.mark_jobs_started([failing, pending], jobs.HOSTNAME)
+    jobs._run_due_group([utils.get_job(failing), utils.get_job(pending)])
+    assert utils.get_job(failing)["last_status"] == "skipped"
+    assert utils.get_job(failing)["last_error"] == "shutdown"
+    assert utils.get_job(pending)["run_started_at"] is None
+    assert utils.get_job(pending)["last_status"] is None
+
+
+def test_cmd_list_prints_one_line_per_job(temp_certiva_env, capsys):
+    utils.create_job("uno", "run_preflight", schedule="hourly", enabled=True)
+    utils.create_job("dos", "purge_out", enabled=False)
+    jobs.cmd_list(None)
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 2
+    assert lines[0].startswith("[") and "uno (run_preflight)" in lines[0] and "schedule=hourly" in lines[0]
+    assert "schedule=manual enabled=0" in lines[1]
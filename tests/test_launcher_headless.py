@@ -2,11 +2,15 @@ from __future__ import annotations
 
 from pathlib import Path
 
-from src import launcher
+import pytest
+
+from src import batch_writer, launcher, pipeline
+from src.experiments import dual_llm_tuning
+from src.ocr_providers import DummyOCRProvider
 
 
 def test_headless_process_folder(monkeypatch, tmp_path, capsys):
-    def fake_process(path, tenant, force_dummy, quiet=False, skip_probe=False):  # noqa: ARG001
+    def fake_process(path, tenant, force_dummy, quiet=False, skip_probe=False, force_probe=False):  # noqa: ARG001
         return tmp_path, ["doc1"]
 
     monkeypatch.setattr(launcher, "process_folder_batch", fake_process)
@@ -34,10 +38,208 @@ def test_headless_experiment_dual_llm(monkeypatch, tmp_path, capsys):
         return {"batch_dir": tmp_path / "OUT" / tenant / "lote"}
 
     monkeypatch.setattr(launcher, "_ensure_experiment_samples", lambda: None)
-    monkeypatch.setattr(launcher, "run_dual_llm_experiment", fake_run)
+    monkeypatch.setattr(dual_llm_tuning, "run_dual_llm_experiment", fake_run)
     launcher.headless_main(
         ["experiment-dual-llm", "--path", str(tmp_path / "IN"), "--tenant", "acme"]
     )
     captured = capsys.readouterr()
     assert "OUT/acme/lote" in captured.out
     assert called["tenant"] == "acme"
+
+
+def test_process_folder_batch_parallel_keeps_file_order(monkeypatch, tmp_path):
+    import threading
+    import time
+
+    for name in ("a.pdf", "b.pdf", "c.pdf", "d.pdf"):
+        (tmp_path / name).write_bytes(b"%PDF-1.4")
+    active = []
+    peak = []
+    lock = threading.Lock()
+
+    def fake_process(path, tenant=None, ocr_provider=None):  # noqa: ARG001
+        with lock:
+            active.append(path)
+            peak.append(len(active))
+        time.sleep(0.05 if path.name == "a.pdf" else 0.01)
+        with lock:
+            active.remove(path)
+        if path.name == "c.pdf":
+            raise RuntimeError("pdf roto")
+        return f"doc-{path.stem}"
+
+    captured = {}
+
+    def fake_outputs(ids, tenant, name):  # noqa: ARG001
+        captured["ids"] = ids
+        return tmp_path
+
+    monkeypatch.setattr(launcher.settings, "pipeline_concurrency", 4)
+    monkeypatch.setattr(pipeline, "process_file", fake_process)
+    monkeypatch.setattr(batch_writer, "build_batch_outputs", fake_outputs)
+    _, doc_ids = launcher.process_folder_batch(tmp_path, "demo", force_dummy=True, quiet=True)
+    assert doc_ids == ["doc-a", "doc-b", "doc-d"]
+    assert captured["ids"] == doc_ids
+    assert max(peak) > 1
+
+
+def test_preflight_probe_is_cached_only_on_success(monkeypatch, tmp_path):
+    import sys
+    import types
+
+    results = [False, True, True]
+    calls = []
+
+    def fake_probe(folder, **kwargs):  # noqa: ARG001
+        calls.append(folder)
+        return "informe", results[len(calls) - 1]
+
+    import tools
+
+    fake_module = types.SimpleNamespace(probe=fake_probe)
+    monkeypatch.setitem(sys.modules, "tools.azure_probe", fake_module)
+    monkeypatch.setattr(tools, "azure_probe", fake_module, raising=False)
+    monkeypatch.setattr(launcher.settings, "ocr_provider_type", "azure")
+    monkeypatch.setattr(launcher.settings, "azure_probe_ttl_sec", 600)
+    monkeypatch.setattr(launcher, "_PROBE_CACHE", {})
+    try:
+        launcher._run_preflight_probe(tmp_path, 3, quiet=True)
+    except RuntimeError:
+        pass
+    launcher._run_preflight_probe(tmp_path, 3, quiet=True)
+    launcher._run_preflight_probe(tmp_path, 3, quiet=True)
+    assert len(calls) == 2
+    launcher._run_preflight_probe(tmp_path, 3, quiet=True, force=True)
+    assert len(calls) == 3
+
+
+def test_process_folder_batch_streams_nested_pdfs_in_path_order(monkeypatch, tmp_path):
+    for rel in ("z/1.pdf", "a/b/2.pdf", "a/3.pdf", "4.pdf", "notas.txt", "a/b/5.pdf", "c/6.pdf"):
+        target = tmp_path / rel
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(b"%PDF-1.4")
+    submitted = []
+    real_submit = launcher.ThreadPoolExecutor.submit
+
+    def tracking_submit(self, fn, *args, **kwargs):
+        if isinstance(args[0], Path):  # el otro submit es el de build_batch_outputs
+            submitted.append(args[0])
+        return real_submit(self, fn, *args, **kwargs)
+
+    monkeypatch.setattr(launcher.ThreadPoolExecutor, "submit", tracking_submit)
+    monkeypatch.setattr(launcher.settings, "pipeline_concurrency", 1)
+    monkeypatch.setattr(pipeline, "process_file", lambda path, tenant=None, ocr_provider=None: f"doc-{path.stem}")
+    monkeypatch.setattr(batch_writer, "build_batch_outputs", lambda ids, tenant, name: tmp_path)
+    _, doc_ids = launcher.process_folder_batch(tmp_path, "demo", force_dummy=True, quiet=True)
+    assert len(submitted) == 6
+    expected = sorted(p for p in tmp_path.rglob("*.pdf"))
+    assert doc_ids == [f"doc-{p.stem}" for p in expected]
+
+
+def test_experiment_samples_check_rescans_only_when_dir_changes(monkeypatch, tmp_path):
+    import os
+
+    exp_dir = tmp_path / "exp"
+    monkeypatch.setattr(launcher, "EXPERIMENT_DIR", exp_dir)
+    monkeypatch.setattr(launcher, "_samples_ready_mtime", None)
+    assert not launcher._experiment_samples_ready()
+    exp_dir.mkdir()
+    (exp_dir / "notas.txt").write_text("x")
+    assert not launcher._experiment_samples_ready()
+    (exp_dir / "a.pdf").write_bytes(b"%PDF")
+    os.utime(exp_dir, ns=(1, 10**9))
+    assert launcher._experiment_samples_ready()
+    scans = []
+    real_scandir = os.scandir
+    monkeypatch.setattr(launcher.os, "scandir", lambda path: scans.append(path) or real_scandir(path))
+    assert launcher._experiment_samples_ready()
+    assert scans == []
+    (exp_dir / "a.pdf").unlink()
+    os.utime(exp_dir, ns=(1, 2 * 10**9))
+    assert not launcher._experiment_samples_ready()
+    assert len(scans) == 1
+
+
+def test_headless_parser_is_built_once_and_hints_resolve():
+    import typing
+
+    assert typing.get_type_hints(launcher.headless_main)["argv"] == typing.Optional[typing.List[str]]
+    assert launcher._build_headless_parser() is launcher._build_headless_parser()
+
+
+def test_process_folder_batch_injects_ocr_and_clears_overrides_on_error(monkeypatch, tmp_path):
+    from src import config
+
+    for name in ("a.pdf", "b.pdf"):
+        (tmp_path / name).write_bytes(b"%PDF-1.4")
+    seen = []
+
+    def fake_process(path, tenant=None, ocr_provider=None):  # noqa: ARG001
+        seen.append(ocr_provider)
+        return f"doc-{path.stem}"
+
+    def broken_outputs(ids, tenant, name):  # noqa: ARG001
+        raise RuntimeError("disco lleno")
+
+    monkeypatch.setattr(launcher.settings, "pipeline_concurrency", 1)
+    monkeypatch.setattr(pipeline, "process_file", fake_process)
+    monkeypatch.setattr(batch_writer, "build_batch_outputs", broken_outputs)
+    with pytest.raises(RuntimeError):
+        launcher.process_folder_batch(tmp_path, "demo", force_dummy=True, quiet=True)
+    assert len(seen) == 2 and seen[0] is seen[1]
+    assert isinstance(seen[0], DummyOCRProvider)
+    assert config._provider_overrides == {"ocr": None, "llm": None}
+
+    with pytest.raises(ValueError):
+        with launcher.providers_context(force_dummy=True):
+            assert config._provider_overrides["ocr"] is not None
+            raise ValueError("corte")
+    assert config._provider_overrides == {"ocr": None, "llm": None}
+
+
+def test_option_process_real_defaults_to_last_inputs(monkeypatch, tmp_path):
+    monkeypatch.setattr(launcher, "LAST_INPUTS_PATH", tmp_path / "last.json")
+    calls = []
+    monkeypatch.setattr(launcher, "_process_folder", lambda path, tenant, force_dummy: calls.append((path, tenant)))
+    answers = iter([str(tmp_path / "lote"), "acme", "", ""])
+    monkeypatch.setattr("builtins.input", lambda prompt="": next(answers))
+    launcher.option_process_real()
+    launcher.option_process_real()
+    assert calls == [(tmp_path / "lote", "acme"), (tmp_path / "lote", "acme")]
+
+
+def test_path_completer_lists_matches_with_dir_suffix(tmp_path):
+    (tmp_path / "lote_a").mkdir()
+    (tmp_path / "lote_b.pdf").write_bytes(b"%PDF-1.4")
+    prefix = str(tmp_path / "lote")
+    assert launcher._path_completer(prefix, 0) == str(tmp_path / "lote_a") + "/"
+    assert launcher._path_completer(prefix, 1) == str(tmp_path / "lote_b.pdf")
+    assert launcher._path_completer(prefix, 2) is None
+
+
+def test_launcher_import_does_not_load_pipeline():
+    import subprocess
+    import sys
+
+    code = "import sys, src.launcher; print('src.pipeline' in sys.modules, 'src.metrics' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ["False", "False"]
+
+
+def test_start_folder_batch_builds_outputs_in_background(monkeypatch, tmp_path):
+    import threading
+
+    (tmp_path / "a.pdf").write_bytes(b"%PDF-1.4")
+    release = threading.Event()
+
+    def slow_outputs(ids, tenant, name):  # noqa: ARG001
+        release.wait(5)
+        return tmp_path / name
+
+    monkeypatch.setattr(pipeline, "process_file", lambda path, tenant=None, ocr_provider=None: "doc-a")
+    monkeypatch.setattr(batch_writer, "build_batch_outputs", slow_outputs)
+    doc_ids, outputs = launcher.start_folder_batch(tmp_path, "demo", force_dummy=True, quiet=True)
+    assert doc_ids == ["doc-a"]
+    assert not outputs.done()
+    release.set()
+    assert outputs.result(timeout=5).parent == tmp_path
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import pytest
+
+from src import learning, utils
+
+
+def _insert_doc(doc_id, tenant, status, issues=None):
+    with utils.get_connection() as conn:
+        conn.execute(
+            "INSERT INTO docs(doc_id, filename, tenant, status, issues) VALUES(?, ?, ?, ?, ?)",
+            (doc_id, f"{doc_id}.pdf", tenant, status, issues),
+        )
+
+
+def test_mapping_source_breakdown_and_no_rule_gaps(temp_certiva_env):
+    json_dir = temp_certiva_env["base"] / "OUT" / "json"
+    _insert_doc("d1", "demo", "POSTED", '["NO_RULE"]')
+    _insert_doc("d2", "demo", "POSTED", '["NO_RULE", "LOW_CONF"]')
+    _insert_doc("d3", "demo", "ENTRY_READY", '["LOW_CONF"]')
+    _insert_doc("d4", "demo", "POSTED")  # sin JSON en disco
+    _insert_doc("d5", "otro", "POSTED", '["NO_RULE"]')
+    for doc_id, source, supplier in (
+        ("d1", "rule", "Acme"),
+        ("d2", "llm", "Acme"),
+        ("d3", "rule", "Beta"),
+        ("d5", "rule", "Gamma"),
+    ):
+        utils.json_dump({"mapping_source": source}, json_dir / f"{doc_id}.entry.json")
+        utils.json_dump({"supplier": {"name": supplier}}, json_dir / f"{doc_id}.json")
+    utils.add_audit("d2", "HITL_ACCEPT", "tester", None, None)
+
+    stats = learning.mapping_source_breakdown(tenant="demo")
+    assert stats["totals"] == {"rule": 2, "llm": 1}
+    assert stats["auto_post"] == {"rule": 1}
+    assert learning.find_no_rule_gaps(tenant="demo") == {"Acme": 2}
+    assert learning.find_no_rule_gaps() == {"Acme": 2, "Gamma": 1}
+
+
+def test_load_vendor_rules_reparses_only_when_csv_changes(tmp_path, monkeypatch):
+    rules_path = tmp_path / "vendor_map.csv"
+    rules_path.write_text(
+        "tenant,supplier_name,nif,account\ndemo,ACME SL,B111,600000\n,Sin NIF,,629000\nacme,Corto\n",
+        encoding="utf-8",
+    )
+    monkeypatch.setattr(learning, "RULES_PATH", rules_path)
+    first = learning.load_vendor_rules()
+    assert set(first) == {("demo", "B111"), ("default", "Sin NIF"), ("acme", "Corto")}
+    assert first[("demo", "B111")]["account"] == "600000"
+    assert learning.load_vendor_rules() is first
+    with rules_path.open("a", encoding="utf-8") as fh:
+        fh.write("demo,Nuevo,B222,600000\n")
+    assert ("demo", "B222") in learning.load_vendor_rules()
+    assert learning.summarize_vendor_rules("demo") == {"demo": 2}
+
+
+def test_report_uses_one_connection_for_all_queries(
+    temp_certiva_env, monkeypatch, capsys
+):
+    from contextlib import contextmanager
+
+    json_dir = temp_certiva_env["base"] / "OUT" / "json"
+    _insert_doc("r1", "demo", "POSTED", '["NO_RULE"]')
+    utils.json_dump({"mapping_source": "rule"}, json_dir / "r1.entry.json")
+    utils.json_dump({"supplier": {"name": "Acme"}}, json_dir / "r1.json")
+    utils.add_audit("r1", "LEARN_RULE", "tester", None, None)
+    utils.add_audit("r2", "HITL_ACCEPT", "tester", None, None)
+    utils.add_audit("r3", "HITL_ACCEPT", "tester", None, None)
+    opened = []
+    real_reader = utils.get_reader
+
+    @contextmanager
+    def counting_reader():
+        opened.append(1)
+        with real_reader() as conn:
+            yield conn
+
+    monkeypatch.setattr(utils, "get_reader", counting_reader)
+    monkeypatch.setattr(
+        learning, "RULES_PATH", temp_certiva_env["base"] / "missing.csv"
+    )
+    learning.report(limit=3)
+    out = capsys.readouterr().out
+    assert opened == [1]
+    assert "LEARN_RULE: 1 | HITL_ACCEPT: 2" in out
+    assert "rule: 1 docs · 1 auto-post" in out
+    assert "Acme: 1 documentos" in out
+
+
+def test_summarize_vendor_rules_counts_unique_rules_without_loading_rows(
+    tmp_path, monkeypatch
+):
+    rules_path = tmp_path / "vendor_map.csv"
+    rules_path.write_text(
+        "tenant,supplier_name,nif,account\n"
+        "demo,ACME SL,B111,600000\n"
+        "demo,ACME SL,B111,601000\n"
+        "Demo,Otro,B222,600000\n"
+        ",Sin tenant,,629000\n",
+        encoding="utf-8",
+    )
+    monkeypatch.setattr(learning, "RULES_PATH", rules_path)
+    monkeypatch.setattr(
+        learning, "load_vendor_rules", lambda: pytest.fail("no debe cargar filas")
+    )
+    assert learning.summarize_vendor_rules() == {"demo": 1, "Demo": 1, "default": 1}
+    assert learning.summarize_vendor_rules("DEMO") == {"demo": 1, "Demo": 1}
+
+
+def test_no_rule_query_uses_partial_tenant_index(temp_certiva_env):
+    statements = []
+    with utils.get_connection() as conn:
+        conn.set_trace_callback(statements.append)
+        learning._no_rule_docs(conn, "demo")
+        conn.set_trace_callback(None)
+        query = next(sql for sql in statements if "NO_RULE" in sql)
+        plan = " ".join(row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}"))
+    assert "idx_docs_tenant_issues" in plan
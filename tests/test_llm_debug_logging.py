@@ -3,7 +3,7 @@ from __future__ import annotations
 import json
 from pathlib import Path
 
-from src import config, llm_suggest, utils
+from src import config, llm_debug, llm_suggest, utils
 from src.llm_providers import DummyLLMProvider
 from src.batch_writer import build_batch_outputs
 from src.exporter import A3_CSV_COLUMNS
@@ -28,6 +28,7 @@ def test_llm_debug_traces_are_created(temp_certiva_env, monkeypatch):
     invoice = _basic_invoice(doc_id)
     mapping = llm_suggest.suggest_mapping(invoice)
     assert mapping["account"]
+    llm_debug.flush()
     debug_root = Path(config.BASE_DIR / "OUT" / "debug" / doc_id)
     assert (debug_root / "prompt.json").exists()
     prompt_payload = json.loads((debug_root / "prompt.json").read_text())
@@ -41,3 +42,94 @@ def test_llm_debug_traces_are_created(temp_certiva_env, monkeypatch):
     batch_dir = build_batch_outputs([doc_id], "demo", "lote_debug")
     batch_prompt = batch_dir / doc_id / "debug" / "prompt.json"
     assert batch_prompt.exists()
+
+
+def test_sanitize_matches_per_leaf_scrub(monkeypatch):
+    from src.pii_scrub import scrub_pii
+
+    payload = {
+        "prompt": "NIF B12345678 y DNI 12345678Z",
+        "nested": [{"iban": "ES9121000418450200051332", "n": 3}, "pedido 123456789", None],
+        "ok": "sin datos",
+    }
+
+    def per_leaf(obj, strict):
+        if isinstance(obj, str):
+            return scrub_pii(obj, strict=strict)
+        if isinstance(obj, dict):
+            return {k: per_leaf(v, strict) for k, v in obj.items()}
+        if isinstance(obj, list):
+            return [per_leaf(v, strict) for v in obj]
+        return obj
+
+    monkeypatch.setattr(config.settings, "llm_debug_redact_pii", True)
+    for strict in (False, True):
+        monkeypatch.setattr(config.settings, "llm_pii_scrub_strict", strict)
+        assert llm_debug._sanitize(payload) == per_leaf(payload, strict)
+    monkeypatch.setattr(config.settings, "llm_pii_scrub_strict", True)
+    assert llm_debug._sanitize({"c": "cliente: Juan Perez"}) == {"c": "cliente: [NOMBRE]"}
+    monkeypatch.setattr(config.settings, "llm_debug_redact_pii", False)
+    assert llm_debug._sanitize(payload) is payload
+
+
+def test_record_writes_in_background_and_drops_oldest_when_full(monkeypatch, tmp_path):
+    import queue
+
+    monkeypatch.setattr(config.settings, "debug_llm", True)
+    monkeypatch.setattr(llm_debug, "_DEBUG_ROOT", tmp_path)
+    llm_debug.record("doc-a", "demo", {"prompt": {"text": "hola"}})
+    llm_debug.flush()
+    assert json.loads((tmp_path / "doc-a" / "prompt.json").read_text(encoding="utf-8")) == {"text": "hola"}
+
+    small = queue.Queue(maxsize=1)
+    monkeypatch.setattr(llm_debug, "_QUEUE", small)
+    small.put((tmp_path / "old", {"x": "{}"}))  # ocupa la cola sin consumidor
+    llm_debug.record("doc-b", "demo", {"prompt": "nuevo"})
+    target, files = small.get_nowait()
+    assert target == tmp_path / "doc-b" and files == {"prompt": b'"nuevo"'}
+
+
+def test_copy_into_batch_hardlinks_and_keeps_old_batches_intact(monkeypatch, tmp_path):
+    import os
+
+    monkeypatch.setattr(config.settings, "debug_llm", True)
+    monkeypatch.setattr(llm_debug, "_DEBUG_ROOT", tmp_path / "debug")
+    llm_debug.record("doc-h", "demo", {"prompt": "v1"})
+    llm_debug.copy_into_batch("doc-h", tmp_path / "lote1")
+    source = tmp_path / "debug" / "doc-h" / "prompt.json"
+    first = tmp_path / "lote1" / "doc-h" / "debug" / "prompt.json"
+    assert os.path.samefile(source, first)
+    llm_debug.record("doc-h", "demo", {"prompt": "v2"})
+    llm_debug.copy_into_batch("doc-h", tmp_path / "lote2")
+    assert json.loads(first.read_text(encoding="utf-8")) == "v1"
+    assert json.loads((tmp_path / "lote2" / "doc-h" / "debug" / "prompt.json").read_text(encoding="utf-8")) == "v2"
+
+
+def test_record_writes_compact_json_unless_pretty(monkeypatch, tmp_path):
+    monkeypatch.setattr(config.settings, "debug_llm", True)
+    monkeypatch.setattr(llm_debug, "_DEBUG_ROOT", tmp_path)
+    payload = {"response": {"account": "600000", "texto": "año"}}
+    llm_debug.record("doc-c", "demo", payload)
+    llm_debug.flush()
+    raw = (tmp_path / "doc-c" / "response.json").read_text(encoding="utf-8")
+    assert raw == '{"account":"600000","texto":"año"}'
+    monkeypatch.setattr(config.settings, "debug_llm_pretty", True)
+    llm_debug.record("doc-c", "demo", payload)
+    llm_debug.flush()
+    raw = (tmp_path / "doc-c" / "response.json").read_text(encoding="utf-8")
+    assert "\n" in raw and json.loads(raw) == payload["response"]
+
+
+def test_record_skips_scrub_for_structured_metadata(monkeypatch, tmp_path):
+    scrubbed = []
+    real_sanitize = llm_debug._sanitize
+    monkeypatch.setattr(config.settings, "debug_llm", True)
+    monkeypatch.setattr(llm_debug, "_DEBUG_ROOT", tmp_path)
+    monkeypatch.setattr(llm_debug, "_sanitize", lambda obj: scrubbed.append(obj) or real_sanitize(obj))
+    llm_debug.record(
+        "doc-m", "demo", {"prompt": "DNI 12345678Z", "metadata": {"tenant": "demo", "duration_ms": 12.5}}
+    )
+    llm_debug.flush()
+    assert scrubbed == ["DNI 12345678Z"]
+    assert json.loads((tmp_path / "doc-m" / "metadata.json").read_text(encoding="utf-8"))["duration_ms"] == 12.5
+    assert "12345678Z" not in (tmp_path / "doc-m" / "prompt.json").read_text(encoding="utf-8")
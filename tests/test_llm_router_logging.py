@@ -1,4 +1,4 @@
-from src import llm_router, utils
+from src import llm_router
 
 
 def test_llm_calls_are_logged(temp_certiva_env, monkeypatch):
@@ -17,3 +17,121 @@ def test_llm_calls_are_logged(temp_certiva_env, monkeypatch):
         row = conn.execute("SELECT task, provider FROM llm_calls ORDER BY id DESC LIMIT 1").fetchone()
         assert row is not None
         assert row["task"] == llm_router.LLMTask.RAG_NORMATIVO.value
+
+
+def test_llm_call_logs_api_usage_when_reported(temp_certiva_env, monkeypatch):
+    utils = temp_certiva_env["utils"]
+    monkeypatch.setattr(llm_router, "_resolve_provider", lambda provider: "openai")
+    monkeypatch.setattr(
+        llm_router, "_call_openai", lambda cfg, system, prompt: ("Respuesta", {"prompt_tokens": 321, "completion_tokens": 12})
+    )
+    llm_router.call_llm(llm_router.LLMTask.EXPLICAR_IVA, "Sistema", "Explica el IVA.")
+    with utils.get_connection() as conn:
+        row = conn.execute("SELECT prompt_tokens, completion_tokens FROM llm_calls ORDER BY id DESC LIMIT 1").fetchone()
+    assert (row["prompt_tokens"], row["completion_tokens"]) == (321, 12)
+    assert llm_router._estimate_tokens("x" * 40) == 10
+
+
+def test_scrub_text_memoizes_repeated_contexts(monkeypatch):
+    calls = []
+
+    def fake_scrub(text, strict=False, enabled=True):  # noqa: ARG001
+        calls.append(text)
+        return text.replace("12345678Z", "[DOC_ID]")
+
+    monkeypatch.setattr(llm_router, "scrub_pii", fake_scrub)
+    llm_router._scrub_text_cached.cache_clear()
+    monkeypatch.setattr(llm_router.settings, "llm_enable_pii", False)
+    context = "Cliente con DNI 12345678Z. " * 10
+    assert llm_router._scrub_text(context) == llm_router._scrub_text(context)
+    assert "12345678Z" not in llm_router._scrub_text(context)
+    assert len(calls) == 1
+    llm_router._scrub_text("corto")
+    llm_router._scrub_text("corto")
+    assert len(calls) == 3
+    llm_router._scrub_text_cached.cache_clear()
+
+
+def test_call_openai_reuses_v1_client(monkeypatch):
+    from types import SimpleNamespace
+
+    requests = []
+
+    def create(**kwargs):
+        requests.append(kwargs)
+        message = SimpleNamespace(content=" Hola ")
+        usage = SimpleNamespace(prompt_tokens=7, completion_tokens=2)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(llm_router.settings, "openai_api_key", "sk-test")
+    monkeypatch.setattr(llm_router, "_openai_client", lambda *args: fake)
+    cfg = llm_router.LLMConfig(provider="openai", model="gpt-test", temperature=0.1, max_tokens=50)
+    assert llm_router._call_openai(cfg, "Sistema", "Pregunta") == ("Hola", {"prompt_tokens": 7, "completion_tokens": 2})
+    assert requests[0]["model"] == "gpt-test" and requests[0]["messages"][1]["content"] == "Pregunta"
+
+    monkeypatch.undo()
+    llm_router._openai_client.cache_clear()
+    client = llm_router._openai_client("sk-test", "http://localhost", 5)
+    assert llm_router._openai_client("sk-test", "http://localhost", 5) is client
+    llm_router._openai_client.cache_clear()
+
+
+def test_stream_llm_yields_chunks_and_logs_usage(temp_certiva_env, monkeypatch):
+    from types import SimpleNamespace
+
+    utils = temp_certiva_env["utils"]
+
+    def chunk(text, usage=None):
+        choices = [SimpleNamespace(delta=SimpleNamespace(content=text))] if text is not None else []
+        return SimpleNamespace(choices=choices, usage=usage)
+
+    def create(**kwargs):
+        assert kwargs["stream"] is True
+        return iter([chunk("El resultado "), chunk(""), chunk("es positivo."), chunk(None, SimpleNamespace(prompt_tokens=50, completion_tokens=6))])
+
+    fake = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(llm_router, "_resolve_provider", lambda provider: "openai")
+    monkeypatch.setattr(llm_router, "_openai_client", lambda *args: fake)
+    stream = llm_router.stream_llm(llm_router.LLMTask.EXPLICAR_PNL, "Sistema", "Explica el P&L.")
+    assert next(stream) == "El resultado "
+    assert list(stream) == ["es positivo."]
+    with utils.get_connection() as conn:
+        row = conn.execute("SELECT task, prompt_tokens, completion_tokens FROM llm_calls ORDER BY id DESC LIMIT 1").fetchone()
+    assert row["task"] == llm_router.LLMTask.EXPLICAR_PNL.value
+    assert (row["prompt_tokens"], row["completion_tokens"]) == (50, 6)
+
+
+def test_task_config_table_is_read_only():
+    import dataclasses
+
+    import pytest
+
+    cfg = llm_router.TASK_CONFIG[llm_router.LLMTask.EXPLICAR_IVA]
+    assert str(llm_router.LLMTask.EXPLICAR_IVA) == "explicar_iva"
+    assert llm_router.TASK_CONFIG["explicar_iva"] is cfg
+    with pytest.raises(TypeError):
+        llm_router.TASK_CONFIG[llm_router.LLMTask.EXPLICAR_IVA] = cfg  # type: ignore[index]
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        cfg.max_tokens = 1  # type: ignore[misc]
+
+
+def test_truncate_uses_token_encoder_when_available(monkeypatch):
+    class FakeEncoder:
+        # Un "token" por palabra: permite comprobar el corte sin tiktoken.
+        def encode(self, text):
+            return text.split(" ")
+
+        def decode(self, ids):
+            return " ".join(ids)
+
+    long_context = " ".join(["palabra"] * (llm_router.MAX_CONTEXT_TOKENS + 5))
+    monkeypatch.setattr(llm_router, "_token_encoder", lambda: FakeEncoder())
+    truncated = llm_router._truncate(long_context)
+    assert truncated.endswith(llm_router.TRUNCATION_MARK)
+    assert truncated.count("palabra") == llm_router.MAX_CONTEXT_TOKENS
+    short = " ".join(["palabra"] * 10)
+    assert llm_router._truncate(short) is short
+
+    monkeypatch.setattr(llm_router, "_token_encoder", lambda: None)
+    assert llm_router._truncate(long_context) == long_context[: llm_router.MAX_CONTEXT_CHARS] + llm_router.TRUNCATION_MARK
@@ -0,0 +1,25 @@
+from src import llm_suggest
+
+
+def test_suggest_missing_fields_recovers_invoice_and_nif():
+    text = "ACME SL\nNIF: B12345678\nNÚMERO: F-2025/0042\nTotal 121,00"
+    suggestions = llm_suggest.suggest_missing_fields(text)
+    assert suggestions["invoice.number"]["value"] == "F-2025/0042"
+    assert suggestions["supplier.nif"]["value"] == "B12345678"
+    assert suggestions["supplier.nif"]["source"] == "regex"
+
+
+def test_suggest_missing_fields_without_matches():
+    assert llm_suggest.suggest_missing_fields("Ticket sin datos fiscales") == {}
+
+
+def test_suggest_missing_fields_keeps_first_occurrence_of_each_field():
+    text = "CIF: A87654321\nFactura: 2025-0001\nNIF B12345678\nInvoice: ZZZZ-9"
+    suggestions = llm_suggest.suggest_missing_fields(text)
+    assert suggestions["supplier.nif"] == {
+        "value": "A87654321",
+        "confidence_llm": 0.60,
+        "source": "regex",
+    }
+    assert suggestions["invoice.number"]["value"] == "2025-0001"
+    assert suggestions["invoice.number"]["confidence_llm"] == 0.65
@@ -0,0 +1,30 @@
+from tests.test_reports import _seed_reporting_docs
+
+from src import metrics
+
+
+def test_gather_stats_sections_skip_unrequested_blocks(temp_certiva_env, monkeypatch):
+    _seed_reporting_docs(temp_certiva_env)
+    full = metrics.gather_stats(tenant="demo")
+    called = []
+    for name in ("build_vat_report", "build_aging", "build_cashflow_forecast"):
+        monkeypatch.setattr(
+            metrics.reports, name, lambda *args, _n=name, **kwargs: called.append(_n)
+        )
+    monkeypatch.setattr(
+        metrics.utils, "list_jobs", lambda *args, **kwargs: called.append("jobs")
+    )
+    partial = metrics.gather_stats(tenant="demo", sections={"bank", "pnl", "llm"})
+    assert called == []
+    for key in (
+        "docs_total",
+        "posted",
+        "auto_post_pct",
+        "bank",
+        "pnl_summary",
+        "llm_stats",
+        "provider_breakdown",
+    ):
+        assert partial[key] == full[key]
+    assert partial["vat_summary"] == {} and partial["jobs"] == []
+    assert partial["ar_summary"]["total"] == 0
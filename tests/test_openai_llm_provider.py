@@ -20,3 +20,500 @@ def test_openai_provider_mapping(monkeypatch):
     assert "account" in result
     assert "iva_type" in result
     assert "issue_codes" in result
+
+
+class _FakeAsyncResponses:
+    def __init__(self):
+        self.active = 0
+        self.peak = 0
+
+    async def create(self, model, max_output_tokens, input):  # noqa: A002, ARG002
+        import asyncio
+        import json
+        from types import SimpleNamespace
+
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        payload = json.loads(input[1]["content"])
+        if payload["supplier"]["name"] == "ROTA":
+            raise ValueError("500")
+        text = json.dumps({"account": "629000", "iva_type": 21.0, "issue_codes": []})
+        block = SimpleNamespace(text=text)
+        usage = SimpleNamespace(prompt_tokens=1000, completion_tokens=10)
+        return SimpleNamespace(output=[SimpleNamespace(content=[block])], usage=usage)
+
+
+def test_propose_mapping_batch_runs_concurrently_and_isolates_errors(monkeypatch):
+    from types import SimpleNamespace
+
+    from src import llm_providers
+
+    monkeypatch.setattr(llm_providers._OpenAIResponder, "RETRY_ATTEMPTS", 1)
+    provider = OpenAILLMProvider(
+        "sk-test", "mini-model", "http://localhost", pricing={"mini": {"in": 1.0, "out": 0.0}}, batch_concurrency=3
+    )
+    responses = _FakeAsyncResponses()
+
+    async def _close():
+        return None
+
+    monkeypatch.setattr(
+        provider._responder, "_async_client", lambda: SimpleNamespace(responses=responses, close=_close)
+    )
+    invoices = [{"supplier": {"name": f"Proveedor {i}"}} for i in range(8)]
+    invoices[2] = {"supplier": {"name": "ROTA"}}
+    results = provider.propose_mapping_batch(invoices)
+    assert len(results) == 8
+    assert results[2]["issue_codes"] == ["LLM_ERROR"]
+    assert all(r["account"] == "629000" and r["cost_eur"] == 0.001 for i, r in enumerate(results) if i != 2)
+    assert 1 < responses.peak <= 3
+
+
+def test_propose_mapping_bulk_reconciles_batch_output_by_custom_id(monkeypatch):
+    import json
+    from types import SimpleNamespace
+
+    uploaded = {}
+    states = iter(["validating", "in_progress", "completed"])
+
+    def file_create(file, purpose):
+        uploaded["lines"] = [json.loads(line) for line in file[1].decode("utf-8").splitlines()]
+        uploaded["purpose"] = purpose
+        return SimpleNamespace(id="file-in")
+
+    def output_text():
+        body = {
+            "output": [{"content": [{"text": json.dumps({"account": "628000", "iva_type": 21.0, "issue_codes": []})}]}],
+            "usage": {"input_tokens": 2000, "output_tokens": 0},
+        }
+        lines = [
+            {"custom_id": "doc-b", "response": {"status_code": 500, "body": {"error": "boom"}}},
+            {"custom_id": "doc-a", "response": {"status_code": 200, "body": body}},
+        ]
+        return "\n".join(json.dumps(line) for line in lines)
+
+    client = SimpleNamespace(
+        files=SimpleNamespace(create=file_create, content=lambda file_id: SimpleNamespace(text=output_text())),
+        batches=SimpleNamespace(
+            create=lambda **kwargs: SimpleNamespace(id="batch-1"),
+            retrieve=lambda batch_id: SimpleNamespace(status=next(states), output_file_id="file-out"),
+        ),
+    )
+    provider = OpenAILLMProvider("sk-test", "mini-model", "http://localhost", pricing={"mini": {"in": 1.0, "out": 0.0}})
+    monkeypatch.setattr(provider._responder, "_client", client)
+    invoices = [{"doc_id": "doc-a", "supplier": {"name": "A"}}, {"doc_id": "doc-b"}, {"doc_id": "doc-c"}]
+    result = provider.propose_mapping_bulk(invoices, poll_interval=0)
+    assert uploaded["purpose"] == "batch"
+    assert [line["custom_id"] for line in uploaded["lines"]] == ["doc-a", "doc-b", "doc-c"]
+    assert uploaded["lines"][0]["url"] == "/v1/responses"
+    assert result["doc-a"]["account"] == "628000"
+    assert result["doc-a"]["cost_eur"] == 0.001
+    assert result["doc-b"]["issue_codes"] == ["LLM_ERROR"]
+    assert result["doc-c"]["issue_codes"] == ["LLM_ERROR"]
+
+
+def test_identical_payloads_hit_response_cache(monkeypatch):
+    import json
+    from types import SimpleNamespace
+
+    calls = []
+
+    def create(model, max_output_tokens, input):  # noqa: A002, ARG001
+        calls.append(model)
+        block = SimpleNamespace(text=json.dumps({"account": "621000", "iva_type": 21.0, "issue_codes": []}))
+        usage = SimpleNamespace(prompt_tokens=1000, completion_tokens=0)
+        return SimpleNamespace(output=[SimpleNamespace(content=[block])], usage=usage)
+
+    provider = OpenAILLMProvider("sk-test", "mini-model", "http://localhost", pricing={"mini": {"in": 1.0, "out": 0.0}})
+    monkeypatch.setattr(provider._responder, "_client", SimpleNamespace(responses=SimpleNamespace(create=create)))
+    invoice = {"supplier": {"name": "Arrendador SL"}, "lines": [{"desc": "Alquiler local"}], "doc_id": "a"}
+    first = provider.propose_mapping(invoice)
+    first["account"] = "mutado"
+    second = provider.propose_mapping({**invoice, "doc_id": "b"})
+    assert len(calls) == 1
+    assert second["account"] == "621000"
+    assert second["cost_eur"] == 0.0 and first["cost_eur"] == 0.001
+    provider.propose_mapping({**invoice, "lines": [{"desc": "Otra cosa"}]})
+    assert len(calls) == 2
+    assert provider._responder.cache_info()["hits"] == 1
+
+
+def test_semantic_cache_reuses_mapping_for_near_duplicate_invoice(monkeypatch):
+    import json
+    from types import SimpleNamespace
+
+    calls = []
+    vectors = {"Iberdrola SA": [1.0, 0.0, 0.0], "IBERDROLA S.A.": [0.99, 0.1, 0.0], "Amazon": [0.0, 1.0, 0.0]}
+
+    def create(model, max_output_tokens, input):  # noqa: A002, ARG001
+        calls.append(input[1]["content"])
+        block = SimpleNamespace(text=json.dumps({"account": "628000", "iva_type": 21.0, "issue_codes": []}))
+        return SimpleNamespace(output=[SimpleNamespace(content=[block])], usage=None)
+
+    def embed(model, input):  # noqa: A002, ARG001
+        name = json.loads(input)["supplier"]["name"]
+        return SimpleNamespace(data=[SimpleNamespace(embedding=vectors[name])])
+
+    provider = OpenAILLMProvider("sk-test", "mini-model", "http://localhost", semantic_threshold=0.95)
+    client = SimpleNamespace(responses=SimpleNamespace(create=create), embeddings=SimpleNamespace(create=embed))
+    monkeypatch.setattr(provider._responder, "_client", client)
+    provider.propose_mapping({"supplier": {"name": "Iberdrola SA"}})
+    near = provider.propose_mapping({"supplier": {"name": "IBERDROLA S.A."}})
+    assert len(calls) == 1
+    assert near["account"] == "628000" and near["cost_eur"] == 0.0
+    provider.propose_mapping({"supplier": {"name": "Amazon"}})
+    assert len(calls) == 2
+
+
+def test_semantic_cache_is_scoped_per_model_in_dual_provider(monkeypatch):
+    import json
+    from types import SimpleNamespace
+
+    from src.llm_providers import DualOpenAILLMProvider
+
+    calls = []
+
+    def create(model, max_output_tokens, input):  # noqa: A002, ARG001
+        calls.append(model)
+        block = SimpleNamespace(text=json.dumps({"account": model.upper(), "iva_type": 21.0, "issue_codes": []}))
+        return SimpleNamespace(output=[SimpleNamespace(content=[block])], usage=None)
+
+    def embed(model, input):  # noqa: A002, ARG001
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[1.0, 0.0, 0.0])])
+
+    provider = DualOpenAILLMProvider("sk-test", "http://localhost", "mini", "premium", 1000.0, semantic_threshold=0.95)
+    client = SimpleNamespace(responses=SimpleNamespace(create=create), embeddings=SimpleNamespace(create=embed))
+    monkeypatch.setattr(provider._responder, "_client", client)
+    result = provider.propose_mapping({"supplier": {"name": "Grande SA"}, "totals": {"gross": 5000.0}})
+    assert calls == ["mini", "premium"]
+    assert result["account"] == "PREMIUM" and result["model_used"] == "premium"
+    again = provider.propose_mapping({"supplier": {"name": "Grande S.A."}, "totals": {"gross": 5000.0}})
+    assert calls == ["mini", "premium"]
+    assert again["account"] == "PREMIUM"
+
+
+def test_system_prompt_is_a_stable_prefix_and_cached_tokens_are_reported():
+    from types import SimpleNamespace
+
+    from src.llm_providers import _OpenAIResponder
+
+    first = _OpenAIResponder("sk-test", "http://localhost")
+    second = _OpenAIResponder("sk-test", "http://localhost")
+    _, inputs_a = first._build_inputs({"supplier": {"name": "A"}})
+    _, inputs_b = second._build_inputs({"supplier": {"name": "B"}})
+    assert inputs_a[0] is inputs_b[0]
+    assert len(inputs_a[0]["content"]) > 4000
+    assert inputs_a[1]["role"] == "user" and '"A"' in inputs_a[1]["content"]
+    usage = SimpleNamespace(input_tokens=1500, output_tokens=20, input_tokens_details=SimpleNamespace(cached_tokens=1280))
+    assert _OpenAIResponder._usage_payload(usage) == {"prompt_tokens": 1500, "completion_tokens": 20, "cached_tokens": 1280}
+
+
+def test_call_retries_only_transient_errors_with_jittered_backoff(monkeypatch):
+    import json
+    from types import SimpleNamespace
+
+    import httpx
+    import openai
+
+    from src import llm_providers
+
+    sleeps = []
+    monkeypatch.setattr(llm_providers.time, "sleep", sleeps.append)
+    request = httpx.Request("POST", "http://localhost/responses")
+    errors = [openai.APITimeoutError(request=request), openai.APIConnectionError(request=request)]
+    calls = []
+
+    def create(model, max_output_tokens, input):  # noqa: A002, ARG001
+        calls.append(model)
+        if errors:
+            raise errors.pop(0)
+        block = SimpleNamespace(text=json.dumps({"account": "629000", "iva_type": 21.0, "issue_codes": []}))
+        return SimpleNamespace(output=[SimpleNamespace(content=[block])], usage=None)
+
+    provider = OpenAILLMProvider("sk-test", "mini-model", "http://localhost", cache_size=0)
+    monkeypatch.setattr(provider._responder, "_client", SimpleNamespace(responses=SimpleNamespace(create=create)))
+    assert provider.propose_mapping({"supplier": {"name": "X"}})["account"] == "629000"
+    assert len(calls) == 3 and len(sleeps) == 2
+    assert 0 <= sleeps[0] <= 1.0 and 0 <= sleeps[1] <= 2.0
+
+    response = httpx.Response(400, request=request)
+    errors[:] = [openai.BadRequestError("bad", response=response, body=None)]
+    calls.clear()
+    sleeps.clear()
+    result = provider.propose_mapping({"supplier": {"name": "Y"}})
+    assert result["issue_codes"] == ["LLM_ERROR"]
+    assert len(calls) == 1 and not sleeps
+
+
+def test_json_helpers_match_stdlib_fallback(monkeypatch):
+    from src import llm_providers
+
+    payload = {"supplier": {"name": "Señor Ñandú", "nif": None}, "totals": {"gross": 121.5}, "lines": [{"desc": "Café"}]}
+    fast = llm_providers._dumps(payload, sort_keys=True)
+    monkeypatch.setattr(llm_providers, "orjson", None)
+    assert llm_providers._dumps(payload, sort_keys=True) == fast
+    assert "Ñandú" in fast
+    assert llm_providers._loads(fast) == payload
+    assert llm_providers._loads("") == {}
+
+
+def test_propose_mapping_batch_sends_duplicate_payloads_once(monkeypatch):
+    from types import SimpleNamespace
+
+    from src import llm_providers
+
+    monkeypatch.setattr(llm_providers._OpenAIResponder, "RETRY_ATTEMPTS", 1)
+    provider = OpenAILLMProvider("sk-test", "mini-model", "http://localhost", pricing={"mini": {"in": 1.0, "out": 0.0}})
+    responses = _FakeAsyncResponses()
+    sent = []
+    real_create = responses.create
+
+    async def counting_create(model, max_output_tokens, input):  # noqa: A002
+        sent.append(input[1]["content"])
+        return await real_create(model, max_output_tokens, input)
+
+    responses.create = counting_create
+
+    async def _close():
+        return None
+
+    monkeypatch.setattr(
+        provider._responder, "_async_client", lambda: SimpleNamespace(responses=responses, close=_close)
+    )
+    invoices = [
+        {"doc_id": "1", "supplier": {"name": "Proveedor 1"}},
+        {"doc_id": "2", "supplier": {"name": "Proveedor 2"}},
+        {"doc_id": "3", "supplier": {"name": "Proveedor 1"}},
+        {"doc_id": "4", "supplier": {"name": "ROTA"}},
+        {"doc_id": "5", "supplier": {"name": "ROTA"}},
+    ]
+    results = provider.propose_mapping_batch(invoices)
+    assert len(sent) == 3
+    assert [r["account"] for r in results] == ["629000", "629000", "629000", "", ""]
+    assert results[0]["cost_eur"] == 0.001 and results[2]["cost_eur"] == 0.0
+    assert results[0] is not results[2]
+    assert results[3]["issue_codes"] == ["LLM_ERROR"] == results[4]["issue_codes"]
+
+
+def test_invoice_payload_keeps_only_classification_fields():
+    from src.llm_providers import _OpenAIResponder
+
+    invoice = {
+        "doc_id": "x",
+        "supplier": {"name": "Proveedor Demo", "nif": "B12345678", "vat": None, "address": {"city": "Madrid"}},
+        "totals": {"base": 100.004, "vat": 21.0009, "gross": 121.0049},
+        "invoice": {"number": "TEST-1", "date": "2025-03-01", "currency": "EUR"},
+        "lines": [{"desc": "x" * 300, "amount": 33.3333, "qty": 3, "vat_rate": 21}] * 7,
+        "metadata": {"doc_type": "invoice", "category": None, "ocr_text": "texto largo"},
+    }
+    payload = _OpenAIResponder._invoice_payload(invoice)
+    assert payload["supplier"] == {"name": "Proveedor Demo", "nif": "B12345678"}
+    assert payload["totals"] == {"base": 100.0, "vat": 21.0, "gross": 121.0}
+    assert payload["currency"] == "EUR" and payload["doc_type"] == "invoice"
+    assert "category" not in payload and "invoice" not in payload
+    assert len(payload["lines"]) == 5
+    assert payload["lines"][0] == {"desc": "x" * 120, "vat_rate": 21, "amount": 33.33}
+    other = {**invoice, "invoice": {"number": "TEST-2", "date": "2025-04-01", "currency": "EUR"}}
+    assert _OpenAIResponder._invoice_payload(other) == payload
+
+
+def test_persistent_response_cache_survives_new_provider(temp_certiva_env, monkeypatch):
+    import json
+    from types import SimpleNamespace
+
+    calls = []
+
+    def create(model, max_output_tokens, input):  # noqa: A002, ARG001
+        calls.append(model)
+        block = SimpleNamespace(text=json.dumps({"account": "621000", "iva_type": 21.0, "issue_codes": []}))
+        usage = SimpleNamespace(prompt_tokens=1000, completion_tokens=0)
+        return SimpleNamespace(output=[SimpleNamespace(content=[block])], usage=usage)
+
+    def build():
+        provider = OpenAILLMProvider(
+            "sk-test", "mini-model", "http://localhost", pricing={"mini": {"in": 1.0, "out": 0.0}}, persist_ttl=3600
+        )
+        monkeypatch.setattr(provider._responder, "_client", SimpleNamespace(responses=SimpleNamespace(create=create)))
+        return provider
+
+    invoice = {"supplier": {"name": "Arrendador SL", "nif": "12345678Z"}, "lines": [{"desc": "Alquiler local"}]}
+    assert build().propose_mapping(invoice)["cost_eur"] == 0.001
+    with temp_certiva_env["utils"].get_connection() as conn:
+        stored = conn.execute("SELECT value FROM llm_response_cache").fetchone()["value"]
+    assert "12345678Z" not in stored and "Arrendador" not in stored
+    restarted = build()
+    result = restarted.propose_mapping(invoice)
+    assert len(calls) == 1
+    assert result["account"] == "621000" and result["cost_eur"] == 0.0
+    assert restarted._responder.cache_info()["persistent_hits"] == 1
+    restarted.propose_mapping(invoice)
+    assert restarted._responder.cache_info()["persistent_hits"] == 1
+
+    utils = temp_certiva_env["utils"]
+    with utils.get_connection() as conn:
+        conn.execute("UPDATE llm_response_cache SET created_at = 0")
+    build()
+    with utils.get_connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM llm_response_cache").fetchone()[0] == 0
+
+
+def test_dual_should_escalate_conditions():
+    from src.llm_providers import DualOpenAILLMProvider
+
+    provider = DualOpenAILLMProvider("sk-test", "http://localhost", "mini", "premium", 1000.0, responder=object())
+    ok = {"issue_codes": []}
+    small = {"totals": {"gross": 50.0}}
+    assert not provider._should_escalate(ok, small)
+    assert provider._should_escalate(ok, {"totals": {"gross": 1000.0}})
+    assert provider._should_escalate({"issue_codes": ["MAPPING_AMBIGUOUS"]}, small)
+    assert provider._should_escalate(ok, {**small, "metadata": {"category": "Intracomunitaria"}})
+    assert provider._should_escalate(ok, {**small, "metadata": {"doc_type": "sales_credit_note"}})
+    assert provider._should_escalate(ok, {**small, "_llm_threshold_override": 40})
+    assert not provider._should_escalate(ok, {**small, "metadata": {"llm_threshold_override": "x"}})
+
+
+def test_dual_speculative_escalation_calls_both_models_concurrently(monkeypatch):
+    import asyncio
+    import json
+    import threading
+    from types import SimpleNamespace
+
+    from src.llm_providers import DualOpenAILLMProvider
+
+    pricing = {"mini": {"in": 1.0, "out": 0.0}, "premium": {"in": 10.0, "out": 0.0}}
+    provider = DualOpenAILLMProvider(
+        "sk-test", "http://localhost", "mini", "premium", 1000.0, pricing=pricing, speculative_escalation=True
+    )
+    models = []
+    # Solo se pasa la barrera si mini y premium están en vuelo a la vez.
+    barrier = threading.Barrier(2, timeout=5)
+
+    def create(model, max_output_tokens, input):  # noqa: A002, ARG001
+        models.append(model)
+        barrier.wait()
+        block = SimpleNamespace(text=json.dumps({"account": "629000", "iva_type": 21.0, "issue_codes": []}))
+        usage = SimpleNamespace(prompt_tokens=1000, completion_tokens=10)
+        return SimpleNamespace(output=[SimpleNamespace(content=[block])], usage=usage)
+
+    monkeypatch.setattr(provider._responder, "_client", SimpleNamespace(responses=SimpleNamespace(create=create)))
+    invoice = {"supplier": {"name": "Grande SA"}, "totals": {"gross": 5000.0}}
+    result = provider.propose_mapping(invoice)
+    assert sorted(models) == ["mini", "premium"]
+    assert result["model_used"] == "premium"
+    assert result["prompt_tokens"] == 2000
+    assert result["cost_eur"] == 0.011
+    assert not provider._definitely_escalates({"totals": {"gross": 1500.0}})
+
+    # Desde una ruta async de la webapp (bucle de eventos ya en marcha) también funciona.
+    async def from_route():
+        return provider.propose_mapping({**invoice, "supplier": {"name": "Otra Grande SA"}})
+
+    assert asyncio.run(from_route())["model_used"] == "premium"
+    assert len(models) == 4
+
+
+def test_persistent_response_cache_treats_corrupt_rows_as_miss(temp_certiva_env, monkeypatch):
+    import json
+    from types import SimpleNamespace
+
+    from src import llm_providers
+
+    calls = []
+
+    def create(model, max_output_tokens, input):  # noqa: A002, ARG001
+        calls.append(model)
+        block = SimpleNamespace(text=json.dumps({"account": "621000", "iva_type": 21.0, "issue_codes": []}))
+        return SimpleNamespace(output=[SimpleNamespace(content=[block])], usage=None)
+
+    provider = OpenAILLMProvider("sk-test", "mini-model", "http://localhost", persist_ttl=3600)
+    monkeypatch.setattr(provider._responder, "_client", SimpleNamespace(responses=SimpleNamespace(create=create)))
+    invoice = {"supplier": {"name": "Arrendador SL"}, "lines": [{"desc": "Alquiler local"}]}
+    provider.propose_mapping(invoice)
+    with temp_certiva_env["utils"].get_connection() as conn:
+        conn.execute("UPDATE llm_response_cache SET value = '{roto'")
+    provider._responder._response_cache = llm_providers._ResponseCache(10, 3600)
+    assert provider.propose_mapping(invoice)["account"] == "621000"
+    assert len(calls) == 2
+
+
+def test_persistent_response_cache_misses_after_prompt_change(temp_certiva_env, monkeypatch):
+    import json
+    from types import SimpleNamespace
+
+    from src import llm_providers
+
+    calls = []
+
+    def create(model, max_output_tokens, input):  # noqa: A002, ARG001
+        calls.append(input[0]["content"])
+        block = SimpleNamespace(text=json.dumps({"account": "621000", "iva_type": 21.0, "issue_codes": []}))
+        return SimpleNamespace(output=[SimpleNamespace(content=[block])], usage=None)
+
+    def new_provider():
+        provider = OpenAILLMProvider("sk-test", "mini-model", "http://localhost", persist_ttl=3600)
+        monkeypatch.setattr(provider._responder, "_client", SimpleNamespace(responses=SimpleNamespace(create=create)))
+        return provider
+
+    invoice = {"supplier": {"name": "Arrendador SL"}, "lines": [{"desc": "Arrendamiento local"}]}
+    new_provider().propose_mapping(invoice)
+    new_provider().propose_mapping(invoice)
+    assert len(calls) == 1
+    responder = new_provider()._responder
+    responder.call("mini-model", invoice, temperature=0.7)
+    assert len(calls) == 2
+    prompt = llm_providers._MAPPING_SYSTEM_PROMPT + "\n- Nuevo."
+    monkeypatch.setattr(llm_providers, "_MAPPING_SYSTEM_MESSAGE", {"role": "system", "content": prompt})
+    new_provider().propose_mapping(invoice)
+    assert len(calls) == 3
+    assert calls[-1].endswith("- Nuevo.")
+
+
+def test_system_prompt_only_teaches_known_issue_codes():
+    import re
+
+    from src import llm_providers
+    from src.rules_engine import ISSUE_MESSAGES
+
+    taught = {code for _, answer in llm_providers._FEW_SHOT_EXAMPLES for code in answer["issue_codes"]}
+    taught |= set(re.findall(r"\b[A-Z]+(?:_[A-Z0-9]+)+\b", llm_providers._MAPPING_SYSTEM_PROMPT))
+    assert taught <= set(ISSUE_MESSAGES)
+    # Pedirle códigos de HARD_ISSUE_CODES al modelo dispararía escaladas a premium.
+    assert not taught & llm_providers.DualOpenAILLMProvider.HARD_ISSUE_CODES
+
+
+def test_propose_mapping_bulk_rejects_colliding_keys(monkeypatch):
+    provider = OpenAILLMProvider("sk-test", "mini-model", "http://localhost")
+    monkeypatch.setattr(provider._responder, "submit_batch", lambda *args: pytest.fail("no debe enviar el batch"))
+    with pytest.raises(ValueError, match="1"):
+        provider.propose_mapping_bulk([{"doc_id": "1"}, {}])
+    with pytest.raises(ValueError, match="doc-a"):
+        provider.propose_mapping_bulk([{"doc_id": "doc-a"}, {"doc_id": "doc-a"}])
+
+
+def test_importing_llm_providers_defers_openai_and_numpy():
+    import subprocess
+    import sys
+
+    code = "import sys, src.llm_providers; print('openai' in sys.modules, 'numpy' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ["False", "False"]
+
+
+def test_semantic_cache_overwrites_oldest_row_in_place():
+    import numpy as np
+
+    from src.llm_providers import _SemanticCache
+
+    cache = _SemanticCache(0.99, maxsize=3)
+    basis = np.eye(4, dtype=np.float32)
+    cache.add("mini", basis[0], ({"account": "0"}, {}, {}))
+    matrix = cache._matrices["mini"]
+    assert cache.lookup("mini", basis[1]) is None
+    for i in range(1, 4):
+        cache.add("mini", basis[i], ({"account": str(i)}, {}, {}))
+    assert cache._matrices["mini"] is matrix and matrix.shape == (3, 4)
+    # La fila 0 (la más antigua) se ha pisado con la cuarta alta.
+    assert cache.lookup("mini", basis[0]) is None
+    assert [cache.lookup("mini", basis[i])[0]["account"] for i in range(1, 4)] == ["1", "2", "3"]
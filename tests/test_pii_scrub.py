@@ -0,0 +1,46 @@
+import re
+
+from src import pii_scrub
+from src.pii_scrub import scrub_pii, scrub_pii_batch
+
+
+def _sequential(text, strict):
+    """Implementación original: un re.sub por patrón, en orden."""
+    for pattern, replacement in pii_scrub.PII_PATTERNS_BASE:
+        text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
+    if strict:
+        for pattern, replacement in pii_scrub.PII_PATTERNS_STRICT:
+            text = re.sub(pattern, replacement, text, flags=re.IGNORECASE)
+        text = pii_scrub.NAME_TOKEN_PATTERN.sub(pii_scrub._name_repl, text)
+    return re.sub(r"\b\d{8,}\b", "[NUM]", text)
+
+
+SAMPLES = [
+    "cliente: Juan Perez con NIF 12345678Z y IBAN ES7620770024003102575766",
+    "CIF esb12345678, DNI x-1234567l, tarjeta 4111111111111111 y pedido 123456789",
+    "proveedor = Acme y Cia 98765432 ref A-1234567B/ES123456789-12345678",
+    "sin datos personales",
+    "cliente: ES 12345678 ",
+    "proveedor =Juan12345678 ",
+    "",
+]
+
+
+def test_combined_regex_matches_sequential_scrub():
+    for strict in (False, True):
+        expected = [_sequential(text, strict) for text in SAMPLES]
+        assert [scrub_pii(text, strict=strict) for text in SAMPLES] == expected
+        assert scrub_pii_batch(SAMPLES, strict=strict) == expected
+
+
+def test_scrub_pii_batch_disabled_and_none():
+    assert scrub_pii_batch(["12345678Z", None], enabled=False) == ["12345678Z", ""]
+    assert scrub_pii_batch([None, "12345678Z"]) == ["", "[DOC_ID]"]
+
+
+def test_strict_scrub_redacts_names_before_long_numbers():
+    assert scrub_pii("cliente: ES 12345678 ", strict=True) == "cliente: [NOMBRE][NUM] "
+    assert (
+        scrub_pii("proveedor =Juan12345678 ", strict=True)
+        == "proveedor =[NOMBRE][NUM] "
+    )
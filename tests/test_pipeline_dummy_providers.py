@@ -98,3 +98,53 @@ def test_azure_provider_requires_config(monkeypatch):
     assert isinstance(provider, DummyOCRProvider)
     assert getattr(provider, "fallback_issue_code", "") == "OCR_PROVIDER_FALLBACK"
     config._build_ocr_provider.cache_clear()
+
+
+def test_dummy_llm_heuristics_keep_list_priority():
+    provider = DummyLLMProvider()
+    # RENTA aparece antes en el texto pero ARREND tiene más prioridad en HEURISTICS.
+    invoice = {
+        "supplier": {"name": "Renta Gestión"},
+        "lines": [{"desc": "Arrendamiento nave"}],
+    }
+    assert (
+        provider.propose_mapping(invoice)["rationale"]
+        == "Servicios de alquiler detectados"
+    )
+    assert (
+        provider.propose_mapping({"supplier": {"name": "viajes iberia"}})["account"]
+        == "624000"
+    )
+    fallback = provider.propose_mapping(
+        {"supplier": {"name": "Otro"}, "lines": [{"desc": "varios"}]}
+    )
+    assert fallback["rationale"] == "Dummy fallback mapping"
+
+
+def test_dummy_llm_debug_payload_is_built_on_consume():
+    provider = DummyLLMProvider()
+    provider.propose_mapping(
+        {"supplier": {"name": "Endesa"}, "lines": [{"desc": "Luz"}, {"desc": "Peajes"}]}
+    )
+    debug = provider.consume_debug_payload()
+    assert debug["prompt"] == {
+        "supplier": "Endesa",
+        "blob": "Endesa Luz Peajes",
+        "token_match": "ENDESA",
+    }
+    assert provider.consume_debug_payload() is None
+
+
+def test_dummy_llm_tolerates_missing_supplier_name_and_desc():
+    provider = DummyLLMProvider()
+    result = provider.propose_mapping(
+        {
+            "supplier": {"name": None},
+            "lines": [{"desc": None}, {"desc": "Arrendamiento nave"}],
+        }
+    )
+    assert result["rationale"] == "Servicios de alquiler detectados"
+    assert (
+        provider.propose_mapping({"supplier": {"name": None}})["rationale"]
+        == "Dummy fallback mapping"
+    )
@@ -1,3 +1,7 @@
+from dataclasses import FrozenInstanceError
+
+import pytest
+
 from tests.test_reports import _seed_reporting_docs
 
 
@@ -8,3 +12,14 @@ def test_policy_simulation_outputs(temp_certiva_env):
     assert result["total_docs"] >= 2
     assert "auto_post" in result
     assert "sales_invoice" in result["by_doc_type"]
+
+
+def test_get_policy_is_memoized_and_immutable(temp_certiva_env):
+    policy_sim = temp_certiva_env["policy_sim"]
+    strict = policy_sim.get_policy("balanced", 0.95)
+    assert strict is policy_sim.get_policy("balanced", 0.95)
+    assert strict.min_conf_entry == 0.95
+    assert policy_sim.POLICIES["balanced"].min_conf_entry == 0.85
+    assert policy_sim.get_policy("balanced") is policy_sim.POLICIES["balanced"]
+    with pytest.raises(FrozenInstanceError):
+        strict.min_conf_entry = 0.5  # type: ignore[misc]
@@ -22,3 +22,19 @@ def test_delete_old_files(tmp_path):
     assert removed == 1
     assert not old_file.exists()
     assert new_file.exists()
+
+
+def test_delete_old_files_walks_nested_dirs_and_skips_missing(tmp_path):
+    nested = tmp_path / "a" / "b" / "c"
+    nested.mkdir(parents=True)
+    old_ts = time.time() - (10 * 24 * 3600)
+    for name in ("x.json", "y.json"):
+        target = nested / name
+        target.write_text("{}")
+        os.utime(target, (old_ts, old_ts))
+    keep = tmp_path / "a" / "keep.json"
+    keep.write_text("{}")
+    removed = utils.delete_old_files([tmp_path, tmp_path / "missing"], max_age_days=2)
+    assert removed == 2
+    assert keep.exists()
+    assert nested.is_dir()
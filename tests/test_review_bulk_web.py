@@ -170,3 +170,16 @@ def test_review_bulk_accept_triggers_reprocess(temp_certiva_env, web_client, mon
     )
     assert resp.status_code in (302, 303)
     assert called["count"] == 1
+
+
+def test_review_read_routes_run_in_threadpool(monkeypatch):
+    import inspect
+
+    from src import config
+
+    monkeypatch.setattr(config.settings, "web_session_secret", "test-secret", raising=False)
+    import src.webapp as webapp
+
+    # Síncronas: FastAPI las lanza en su pool y el single-flight de hitl_service puede coalescer.
+    routes = (webapp.review_list, webapp.review_quick, webapp.review_detail, webapp.accept_doc, webapp.review_bulk_action)
+    assert not any(inspect.iscoroutinefunction(route) for route in routes)
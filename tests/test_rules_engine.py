@@ -32,3 +32,12 @@ def test_generate_entry_ar_invoice(temp_certiva_env):
     assert any(acc.startswith("477") for acc in accounts)
     assert "430000" in accounts
     assert evaluation.entry["journal"] == "VENTAS"
+
+
+def test_issues_to_messages_keeps_order_and_returns_fresh_list(temp_certiva_env):
+    rules_engine = temp_certiva_env["rules_engine"]
+    code = next(iter(rules_engine.ISSUE_MESSAGES))
+    first = rules_engine.issues_to_messages(["DESCONOCIDO", code])
+    assert first == ["DESCONOCIDO", rules_engine.ISSUE_MESSAGES[code]]
+    first.append("mutado")
+    assert rules_engine.issues_to_messages(["DESCONOCIDO", code]) == first[:2]